@@ -0,0 +1,218 @@
+import time
+import numpy as np
+
+from math import ceil
+from scipy.ndimage import binary_dilation
+from scipy.sparse import csr_matrix
+
+import heat_transfer
+import tracer
+
+
+def find_material_class(cond_mat):
+    # 0: dielectric, 1: conductor (any network), 2: air / hole, the thermal k only depends on the class
+    return np.where(cond_mat > tracer.Cell.INSULATOR.value, 1, np.where(cond_mat == tracer.Cell.AIR.value, 2, 0))
+
+
+def build_quadtree(class_stack, refine_mask, max_block):
+    # square blocks of 1, 2, 4 .. max_block cells, a block is kept whole if no cell needs refining and every layer
+    # is one material across the block, returns the block (leaf) number of every cell and each leaf's [row, col, size]
+    [n_layers, n_rows, n_cols] = np.shape(class_stack)
+    pad_rows = int(ceil(n_rows / max_block)) * max_block
+    pad_cols = int(ceil(n_cols / max_block)) * max_block
+
+    # cells outside the board (padding) can't be part of a larger block
+    free = np.zeros([pad_rows, pad_cols], dtype=bool)
+    free[:n_rows, :n_cols] = np.logical_not(refine_mask)
+    class_pad = np.full([n_layers, pad_rows, pad_cols], -1)
+    class_pad[:, :n_rows, :n_cols] = class_stack
+
+    covered = np.zeros([pad_rows, pad_cols], dtype=bool)
+    leaf_label = np.full([pad_rows, pad_cols], -1)
+    leaves = list()
+
+    block = max_block
+    while block > 1:
+        shape_blocks = [pad_rows // block, block, pad_cols // block, block]
+        block_free = np.all(free.reshape(shape_blocks), axis=(1, 3))
+        block_covered = np.any(covered.reshape(shape_blocks), axis=(1, 3))
+        class_blocks = class_pad.reshape([n_layers] + shape_blocks)
+        block_uniform = np.all(np.max(class_blocks, axis=(2, 4)) == np.min(class_blocks, axis=(2, 4)), axis=0)
+
+        for [block_row, block_col] in np.argwhere(block_free & block_uniform & np.logical_not(block_covered)):
+            row = block_row * block
+            col = block_col * block
+            leaf_label[row:row + block, col:col + block] = len(leaves)
+            covered[row:row + block, col:col + block] = True
+            leaves.append([row, col, block])
+        block = block // 2
+
+    # everything else is a single cell
+    for [row, col] in np.argwhere(np.logical_not(covered[:n_rows, :n_cols])):
+        leaf_label[row, col] = len(leaves)
+        leaves.append([row, col, 1])
+
+    return [leaf_label[:n_rows, :n_cols], np.asarray(leaves, dtype=int)]
+
+
+class AdaptiveSimultaneous(heat_transfer.Simultaneous):
+    # same model as Simultaneous on a quadtree mesh, the in-plane blocks are shared by all layers so thru-plane
+    # neighbors stay one to one, copper edges, vias, component footprints and hot cells stay at full resolution
+    def __init__(self, board, solver=None, max_block=16, buffer_cells=2, hot_fraction=0.5, htc_model=None):
+        self.max_block = max_block
+        self.buffer_cells = buffer_cells
+        self.hot_fraction = hot_fraction
+        super().__init__(board, solver, htc_model)
+
+        self.leaf_label = None
+        self.leaves = None
+        self.n_leaves = 0
+        self.leaf_cells = None
+        self.build_mesh()
+
+    def find_refine_mask(self):
+        class_stack = find_material_class(np.asarray([layer.cond_mat for layer in self.board.layers]))
+        refine = np.zeros(np.shape(class_stack)[1:], dtype=bool)
+
+        # material edges in any layer (copper edges, vias / holes)
+        row_edge = np.any(class_stack[:, 1:, :] != class_stack[:, :-1, :], axis=0)
+        col_edge = np.any(class_stack[:, :, 1:] != class_stack[:, :, :-1], axis=0)
+        refine[1:, :] |= row_edge
+        refine[:-1, :] |= row_edge
+        refine[:, 1:] |= col_edge
+        refine[:, :-1] |= col_edge
+
+        # hot cells, lower losses are summed into the blocks
+        q_total = np.sum(np.asarray([layer.Q_mat for layer in self.board.layers]), axis=0)
+        if np.max(q_total) > 0:
+            refine |= q_total >= self.hot_fraction * np.max(q_total)
+
+        # component footprints
+        for component in self.board.components:
+            row_start = max(ceil((component.x - component.width / 2) / self.simulation.resolution), 0)
+            row_end = ceil((component.x + component.width / 2) / self.simulation.resolution)
+            col_start = max(ceil((component.y - component.length / 2) / self.simulation.resolution), 0)
+            col_end = ceil((component.y + component.length / 2) / self.simulation.resolution)
+            refine[row_start:row_end, col_start:col_end] = True
+
+        if self.buffer_cells > 0:
+            refine = binary_dilation(refine, iterations=self.buffer_cells)
+        return [class_stack, refine]
+
+    def build_mesh(self):
+        start_time = time.perf_counter()
+        [class_stack, refine] = self.find_refine_mask()
+        [self.leaf_label, self.leaves] = build_quadtree(class_stack, refine, self.max_block)
+        self.n_leaves = len(self.leaves)
+        self.leaf_cells = np.bincount(self.leaf_label.ravel(), minlength=self.n_leaves)
+        self.g_dim = self.grid_dims[0] * self.n_leaves
+        self.s_vec = np.zeros(self.g_dim)
+
+        if self.simulation.show_process:
+            print("Adaptive mesh: " + str(self.g_dim) + " unknowns, uniform grid: " +
+                  str(np.prod(self.grid_dims)) + ", time: " + str(time.perf_counter() - start_time))
+
+    def prepare_sparse_matrices(self):
+        start_time = time.perf_counter()
+        self.air_temp_grid = self.temp_mat
+        [self.g_mat, self.g_diag_cond, self.s_air] = self.assemble_g_matrix(self.air_temp_grid)
+        self.s_vec = self.s_air * self.simulation.ambient + self._sum_to_leaves(self.find_q_stack())
+
+        if self.simulation.show_process:
+            print("Matrix prep time: " + str(time.perf_counter() - start_time))
+
+    def assemble_g_matrix(self, air_temp_grid):
+        # block G, its conduction only diagonal and the block air 'C's at the given cell temperatures
+        n_layers = self.grid_dims[0]
+        half_c = self.find_half_conductances()
+        leaf_rows = self.leaves[:, 0]
+        leaf_cols = self.leaves[:, 1]
+        leaf_size = self.leaves[:, 2]
+
+        g_row = list()
+        g_col = list()
+        g_data = list()
+        g_diag_cond = np.zeros([n_layers, self.n_leaves])
+        layer_offsets = (np.arange(n_layers) * self.n_leaves).reshape(-1, 1)
+
+        # in-plane faces, a face between blocks of different size is the number of shared cell edges long
+        for axis in [1, 2]:
+            if axis == 1:
+                [leaf_a, leaf_b] = [self.leaf_label[:-1, :], self.leaf_label[1:, :]]
+            else:
+                [leaf_a, leaf_b] = [self.leaf_label[:, :-1], self.leaf_label[:, 1:]]
+            shared = leaf_a != leaf_b
+            [face_keys, face_len] = np.unique(leaf_a[shared] * self.n_leaves + leaf_b[shared], return_counts=True)
+            face_a = face_keys // self.n_leaves
+            face_b = face_keys % self.n_leaves
+
+            # conductance of a cell (half), scaled by face length and block size (distance to block center)
+            c_a = half_c[axis][:, leaf_rows[face_a], leaf_cols[face_a]] * face_len / leaf_size[face_a]
+            c_b = half_c[axis][:, leaf_rows[face_b], leaf_cols[face_b]] * face_len / leaf_size[face_b]
+            face_c = self.series_conductance(c_a, c_b)
+
+            self._add_faces(face_a + layer_offsets, face_b + layer_offsets, face_c, g_row, g_col, g_data)
+            for which_layer in range(0, n_layers):
+                g_diag_cond[which_layer] += np.bincount(face_a, face_c[which_layer], self.n_leaves)
+                g_diag_cond[which_layer] += np.bincount(face_b, face_c[which_layer], self.n_leaves)
+
+        # thru-plane, blocks are shared by all layers
+        c_k = half_c[0][:, leaf_rows, leaf_cols] * self.leaf_cells
+        face_c = self.series_conductance(c_k[:-1], c_k[1:])
+        leaf_ids = np.arange(self.n_leaves)
+        self._add_faces(leaf_ids + layer_offsets[:-1], leaf_ids + layer_offsets[1:], face_c, g_row, g_col, g_data)
+        g_diag_cond[:-1] += face_c
+        g_diag_cond[1:] += face_c
+
+        g_diag_cond = g_diag_cond.ravel()
+        s_air = self._sum_to_leaves(self.find_air_stack(air_temp_grid))
+        leaf_nodes = np.arange(self.g_dim)
+        g_row.append(leaf_nodes)
+        g_col.append(leaf_nodes)
+        g_data.append(g_diag_cond + s_air)
+
+        g_mat = csr_matrix((np.concatenate(g_data), (np.concatenate(g_row), np.concatenate(g_col))),
+                           shape=(self.g_dim, self.g_dim))
+        return [g_mat, g_diag_cond, s_air]
+
+    def find_system(self):
+        [g_mat, g_diag_cond, s_air] = self.assemble_g_matrix(self.air_temp_grid)
+        self.calc_component_heat(temp_grid=self.component_temp_grid)
+        return [g_mat, s_air * self.simulation.ambient + self._sum_to_leaves(self.find_q_stack())]
+
+    def update_air_conductances(self, temp_grid):
+        self.s_air = self._sum_to_leaves(self.find_air_stack(temp_grid))
+        self.air_temp_grid = temp_grid
+
+        self.g_mat = self.g_mat.copy()
+        self.g_mat.setdiag(self.g_diag_cond + self.s_air)
+        self.s_vec = self.s_air * self.simulation.ambient + self._sum_to_leaves(self.find_q_stack())
+
+    def update_sources(self, temp_grid=None):
+        self.calc_component_heat(temp_grid=temp_grid)
+        self.s_vec = self.s_air * self.simulation.ambient + self._sum_to_leaves(self.find_q_stack())
+
+    def _add_faces(self, node_a, node_b, face_c, g_row, g_col, g_data):
+        g_row.extend([node_a.ravel(), node_b.ravel()])
+        g_col.extend([node_b.ravel(), node_a.ravel()])
+        g_data.extend([-face_c.ravel(), -face_c.ravel()])
+
+    def _sum_to_leaves(self, grid):
+        # [layer, row, col] grid to one value per block (e.g. heat), in node order layer * n_leaves + leaf
+        return np.concatenate([np.bincount(self.leaf_label.ravel(), layer_grid.ravel(), self.n_leaves)
+                               for layer_grid in grid])
+
+    def _grid_to_vec(self, grid):
+        # block mean (e.g. temperature)
+        return self._sum_to_leaves(grid) / np.tile(self.leaf_cells, self.grid_dims[0])
+
+    def _vec_to_grid(self, vec):
+        return vec.reshape(self.grid_dims[0], self.n_leaves)[:, self.leaf_label]
+
+    def _weights_to_vec(self, weight_grid):
+        # every cell of a block is at the block temperature, so the block weight is the sum of its cell weights
+        return self._sum_to_leaves(weight_grid)
+
+    def _vec_to_temp_mat(self, t_vec):
+        # every cell of a block at the block temperature, same layout as the uniform grid temp_mat
+        return np.rot90(np.transpose(self._vec_to_grid(t_vec), (0, 2, 1)), k=3, axes=(1, 2))
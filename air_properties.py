@@ -0,0 +1,112 @@
+import numpy as np
+
+C_TO_K = 273.16
+# Stefan Boltzmann Constant converted to W / (in^2 K^4)
+SIGMA = 5.67 * 1e-8 / 1550
+# assumed for solder mask (close to epoxy paint)
+EPSILON = 0.8
+PRANDTL = 0.71
+# gravity in in/s^2
+GRAVITY = 386.09
+
+# air properties vs film temperature [C], tables are built once and looked up with np.interp
+TEMP_TABLE = np.asarray([0, 20, 40, 60, 80, 100, 200], dtype=float)
+# g / v^2 [1 / (in^3)]
+G_V2_TABLE = np.asarray([8.28e5, 6.54e5, 5.2e5, 4.27e5, 3.47e5, 2.89e5, 1.28e5])
+# thermal conductivity [W / (in C)]
+K_AIR_TABLE = np.asarray([6.02e-4, 6.375e-4, 6.731e-4, 7.087e-4, 7.442e-4, 7.798e-4, 9.398e-4])
+
+
+def table_lookup(temperature_c, table_vals):
+    temperature_c = np.asarray(temperature_c, dtype=float)
+    if np.any(temperature_c < TEMP_TABLE[0]) or np.any(temperature_c > TEMP_TABLE[-1]):
+        raise ValueError("Air temperature outside of property table: " + str(temperature_c))
+    return np.interp(temperature_c, TEMP_TABLE, table_vals)
+
+
+def lookup_g_v2(temperature_c):
+    return table_lookup(temperature_c, G_V2_TABLE)
+
+
+def lookup_k_air(temperature_c):
+    return table_lookup(temperature_c, K_AIR_TABLE)
+
+
+def lookup_nu_air(temperature_c):
+    # kinematic viscosity [in^2 / s] from g / v^2
+    return np.sqrt(GRAVITY / lookup_g_v2(temperature_c))
+
+
+def radiation_htc(temp_surf, temp_amb, rad_coef, rad_pow):
+    # linearized radiation to ambient, W / (in^2 K), works on arrays of surface temperatures
+    t_surf_k = np.asarray(temp_surf) + C_TO_K
+    t_amb_k = temp_amb + C_TO_K
+    rad_correction = rad_coef * (t_surf_k - t_amb_k) ** rad_pow
+
+    return EPSILON * SIGMA * (t_surf_k * t_surf_k + t_amb_k * t_amb_k) * (t_surf_k + t_amb_k) / rad_correction
+
+
+class NaturalConvection:
+    # free convection from a flat board, [top, side, bottom] coefficients in W / (in^2 K)
+    # board_dims is [L, W, H] in inches with H the vertical side, delta_temp may be an array
+    def __init__(self):
+        self.name = 'natural'
+
+    def find_htc(self, board_dims, delta_temp, temp_amb):
+        [L, W, H] = board_dims
+        delta_temp = np.asarray(delta_temp, dtype=float)
+        temp_film = temp_amb + delta_temp / 2
+        beta_a = 1 / (temp_amb + C_TO_K)
+
+        g_v2 = lookup_g_v2(temp_film)
+        k_air = lookup_k_air(temp_film)
+        Ra_less_P = g_v2 * beta_a * delta_temp * PRANDTL
+
+        P_top_btm = W * L / (2 * (W + L))
+        P_side = H
+
+        Ra_top_btm = Ra_less_P * P_top_btm ** 3
+        Ra_side = Ra_less_P * P_side ** 3
+
+        # laminar / turbulent correlations
+        C_top = np.where(Ra_top_btm < 8e6, 0.54, 0.15)
+        n_top = np.where(Ra_top_btm < 8e6, 1 / 4, 1 / 3)
+        C_side = np.where(Ra_side < 1e9, 0.59, 0.13)
+        n_side = np.where(Ra_side < 1e9, 1 / 4, 1 / 3)
+        C_btm = 0.27
+        n_btm = 1 / 4
+
+        h_top = C_top * k_air * Ra_top_btm ** n_top / P_top_btm
+        h_side = C_side * k_air * Ra_side ** n_side / P_side
+        h_btm = C_btm * k_air * Ra_top_btm ** n_btm / P_top_btm
+        return [h_top, h_side, h_btm]
+
+
+class ForcedConvection:
+    # air flowing along the board length L at velocity [m/s], flat plate laminar / turbulent correlations
+    def __init__(self, velocity):
+        self.name = 'forced'
+        self.velocity = velocity
+
+    def find_htc(self, board_dims, delta_temp, temp_amb):
+        [L, W, H] = board_dims
+        delta_temp = np.asarray(delta_temp, dtype=float)
+        temp_film = temp_amb + delta_temp / 2
+
+        k_air = lookup_k_air(temp_film)
+        nu_air = lookup_nu_air(temp_film)
+        # m/s to in/s
+        Re = self.velocity * 39.37 * L / nu_air
+
+        Nu = np.where(Re < 5e5, 0.664 * Re ** (1 / 2) * PRANDTL ** (1 / 3), 0.037 * Re ** 0.8 * PRANDTL ** (1 / 3))
+        h = Nu * k_air / L
+        return [h, h, h]
+
+
+def get_htc_model(name, **options):
+    if name == 'natural':
+        return NaturalConvection(**options)
+    elif name == 'forced':
+        return ForcedConvection(**options)
+
+    raise ValueError("Unknown heat transfer coefficient model: " + str(name))
@@ -6,6 +6,7 @@ import drill
 import heat_transfer
 import layer
 import pcb_board
+import quick_estimate
 import tracer
 
 
@@ -45,13 +46,19 @@ class ComponentSetup:
 
 
 class SimulationSetup:
-    def __init__(self, resolution, ambient, orientation, tuning, loads, component_heats):
+    def __init__(self, resolution, ambient, orientation, tuning, loads, component_heats, loss_model='path',
+                 smooth_radius=10, loss_workers=1, res_cache_dir=''):
         self.resolution = resolution
         self.ambient = ambient
         self.orientation = orientation
         self.tuning = tuning
         self.loads = loads
         self.component_heats = component_heats
+        # conduction loss settings, see tracer.Simulation, loss_workers 0 uses all cores, res_cache_dir '' for none
+        self.loss_model = loss_model
+        self.smooth_radius = smooth_radius
+        self.loss_workers = loss_workers
+        self.res_cache_dir = res_cache_dir
 
 
 class TuningSetup:
@@ -83,16 +90,51 @@ class ComponentHeatSetup:
         self.heat = heat
 
 
-def run_simulation(board_settings, sim_settings):
+def get_sim_orientation(orientation):
     this_sim_orientation = [0, 0]
-    if sim_settings.orientation == "X-axis -90":
+    if orientation == "X-axis -90":
         this_sim_orientation = [-1, 0]
-    elif sim_settings.orientation == "X-axis +90":
+    elif orientation == "X-axis +90":
         this_sim_orientation = [1, 0]
-    elif sim_settings.orientation == "Y-axis -90":
+    elif orientation == "Y-axis -90":
         this_sim_orientation = [0, -1]
-    elif sim_settings.orientation == "Y-axis +90":
+    elif orientation == "Y-axis +90":
         this_sim_orientation = [0, 1]
+    return this_sim_orientation
+
+
+def run_quick_estimate(board_settings, sim_settings, total_loss, htc_model=None):
+    # lumped board model from the keep-out outline, layer thicknesses and total losses [W], nothing is traced
+    # returns the mean board temperature and board level htc's (see quick_estimate.estimate_board_temp)
+    keepOutLines = Helpers.load_Gerber(board_settings.keepout_file)
+    board_dims = layer.get_board_dims(keepOutLines)
+    board_thickness = 0
+    for layer_setting in board_settings.layers:
+        board_thickness += float(layer_setting.thickness)
+
+    general_dims = quick_estimate.find_general_board_dims(board_dims[0], board_dims[1], board_thickness,
+                                                          get_sim_orientation(sim_settings.orientation))
+    return quick_estimate.estimate_board_temp(general_dims, float(total_loss), float(sim_settings.ambient),
+                                              float(sim_settings.tuning.conv_coef),
+                                              float(sim_settings.tuning.rad_coef),
+                                              float(sim_settings.tuning.rad_pow), htc_model)
+
+
+def get_loss_workers(loss_workers):
+    # 0 (or blank) is all cores
+    if loss_workers is None or str(loss_workers).strip() in ['', '0']:
+        return None
+    return int(loss_workers)
+
+
+def get_res_cache_dir(res_cache_dir):
+    if res_cache_dir is None or str(res_cache_dir).strip() == '':
+        return None
+    return str(res_cache_dir)
+
+
+def run_simulation(board_settings, sim_settings, solver=None):
+    this_sim_orientation = get_sim_orientation(sim_settings.orientation)
 
     simulation = tracer.Simulation(int(sim_settings.resolution), float(sim_settings.ambient), this_sim_orientation,
                                    True,
@@ -103,7 +145,11 @@ def run_simulation(board_settings, sim_settings):
                                    float(sim_settings.tuning.conv_coef),
                                    float(sim_settings.tuning.rad_coef),
                                    float(sim_settings.tuning.rad_pow),
-                                   float(sim_settings.tuning.component_htc))
+                                   float(sim_settings.tuning.component_htc),
+                                   str(sim_settings.loss_model),
+                                   int(sim_settings.smooth_radius),
+                                   get_loss_workers(sim_settings.loss_workers),
+                                   get_res_cache_dir(sim_settings.res_cache_dir))
     keepOutGerber = board_settings.keepout_file
     keepOutLines = Helpers.load_Gerber(keepOutGerber)
     board_dims = layer.get_board_dims(keepOutLines)
@@ -133,6 +179,7 @@ def run_simulation(board_settings, sim_settings):
                 break
 
     layer_list = []
+    loss_layers = []
     for layer_setting in board_settings.layers:
         thisLayerName = layer_setting.name
         thisLayerType = layer_setting.layer_type
@@ -164,22 +211,55 @@ def run_simulation(board_settings, sim_settings):
             if simulation.show_process:
                 print("Finding networks: " + layer_setting.name)
             thisLayer.find_networks()
+            loss_layers.append(thisLayer)
 
-            if simulation.show_process:
-                print("Calculating conduction losses: " + layer_setting.name)
-            thisLayer.find_cond_loss()
+        layer_list.append(thisLayer)
+
+    # the loads of all layers share one pool of workers, before any holes are drilled
+    if simulation.show_process:
+        print("Calculating conduction losses: " + ", ".join([this_layer.name for this_layer in loss_layers]))
+    layer.find_board_cond_loss(loss_layers, simulation.loss_workers, simulation.show_process,
+                               simulation.res_cache_dir)
 
+    for thisLayer in layer_list:
         # this happens to both conductor and insulating layers
         if not isinstance(drillFile, type(None)):
             if simulation.show_process:
-                print("Drilling holes: " + layer_setting.name)
+                print("Drilling holes: " + thisLayer.name)
             thisLayer.drill_holes(drillLayer)
 
-        layer_list.append(thisLayer)
-
     board = pcb_board.Board(layer_list, board_components, simulation, conductorMaterial, dielectricMaterial)
 
-    heat_transfer_analysis = heat_transfer.Simultaneous(board)
+    heat_transfer_analysis = heat_transfer.Simultaneous(board, solver)
     heat_transfer_analysis.solve()
 
     return heat_transfer_analysis
+
+
+def run_load_case(heat_transfer_analysis, sim_settings):
+    # re-solve an already simulated board for new load currents and component heats
+    # G (and its factorization) only depends on the layout, so only the heat sources are recalculated
+    board = heat_transfer_analysis.board
+
+    for this_layer in board.layers:
+        if len(this_layer.loads) == 0:
+            continue
+        for electric_load in this_layer.loads:
+            for load_setting in sim_settings.loads:
+                if load_setting.layer == this_layer.name and load_setting.name == electric_load.name:
+                    electric_load.current = float(load_setting.current)
+                    break
+        # the layers are already drilled, the resistance maps found before drilling are rescaled
+        if board.simulation.show_process:
+            print("Scaling conduction losses: " + this_layer.name)
+        this_layer.scale_cond_loss()
+
+    for board_component in board.components:
+        for component_heat in sim_settings.component_heats:
+            if board_component.name == component_heat.component_name:
+                board_component.heat = float(component_heat.heat)
+                break
+
+    heat_transfer_analysis.solve_sources()
+
+    return heat_transfer_analysis
@@ -0,0 +1,209 @@
+import numpy as np
+
+from scipy.sparse import csr_matrix
+
+import heat_transfer
+import tracer
+
+
+def find_footprint_cells(components, resolution, mat_shape):
+    # board cells under every component footprint, returns [component number, row, col] of each covered cell
+    n_components = len(components)
+    if n_components == 0:
+        return [np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0, dtype=int)]
+    comp_x = np.asarray([component.x for component in components], dtype=float)
+    comp_y = np.asarray([component.y for component in components], dtype=float)
+    comp_wid = np.asarray([component.width for component in components], dtype=float)
+    comp_len = np.asarray([component.length for component in components], dtype=float)
+
+    row_start = np.clip(np.ceil((comp_x - comp_wid / 2) / resolution).astype(int), 0, mat_shape[0])
+    row_end = np.clip(np.ceil((comp_x + comp_wid / 2) / resolution).astype(int), 0, mat_shape[0])
+    col_start = np.clip(np.ceil((comp_y - comp_len / 2) / resolution).astype(int), 0, mat_shape[1])
+    col_end = np.clip(np.ceil((comp_y + comp_len / 2) / resolution).astype(int), 0, mat_shape[1])
+    n_rows = np.maximum(row_end - row_start, 0)
+    n_cols = np.maximum(col_end - col_start, 0)
+    n_cells = n_rows * n_cols
+
+    # cell k of a footprint is at [k // n_cols, k % n_cols] from the footprint corner
+    comp_num = np.repeat(np.arange(n_components), n_cells)
+    local_cell = np.arange(np.sum(n_cells)) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+    rows = row_start[comp_num] + local_cell // n_cols[comp_num]
+    cols = col_start[comp_num] + local_cell % n_cols[comp_num]
+    return [comp_num, rows, cols]
+
+
+class ComponentNodeSimultaneous(heat_transfer.Simultaneous):
+    # every component is a junction node (its heat source) and a case node, junction -> case by r_jc, case -> the
+    # conductor cells of its footprint by r_cb (split evenly) and case -> air, all solved with the board in one
+    # sparse system, the board nodes come first then [junction, case] of every component
+    def __init__(self, board, solver=None, r_jc=1.0, r_cb=0.5, htc_model=None):
+        super().__init__(board, solver, htc_model)
+        self.board_dim = self.g_dim
+        self.n_components = len(self.board.components)
+        self.node_dim = self.board_dim + 2 * self.n_components
+        self.junction_nodes = self.board_dim + 2 * np.arange(self.n_components)
+        self.case_nodes = self.junction_nodes + 1
+
+        # component values override the defaults
+        self.r_jc = np.asarray([r_jc if component.r_jc is None else component.r_jc
+                                for component in self.board.components], dtype=float)
+        self.r_cb = np.asarray([r_cb if component.r_cb is None else component.r_cb
+                                for component in self.board.components], dtype=float)
+        self.component_q = np.zeros(self.n_components)
+
+        self.coupling = None
+        self.cell_case_c = np.zeros(self.board_dim)
+        self.comp_diag_cond = np.zeros(2 * self.n_components)
+        self.case_air_c = np.zeros(self.n_components)
+        # case temperatures the case air 'C's were last evaluated at
+        self.case_air_temps = None
+        self.find_component_couplings()
+
+    def find_component_couplings(self):
+        # case to footprint cell conductances, the cells are the conductor cells of the top / bottom layer under
+        # the component (all footprint cells if there is no exposed conductor)
+        [comp_num, rows, cols] = find_footprint_cells(self.board.components, self.simulation.resolution,
+                                                      self.grid_dims[1:])
+        comp_layer = np.asarray([0 if component.side == 'Top' else self.board.mat_dep - 1
+                                 for component in self.board.components], dtype=int)
+        cond_stack = np.asarray([layer.cond_mat for layer in self.board.layers])
+        cell_layer = comp_layer[comp_num]
+        is_cond = cond_stack[cell_layer, rows, cols] > tracer.Cell.INSULATOR.value
+
+        has_cond = np.bincount(comp_num[is_cond], minlength=self.n_components) > 0
+        use_cell = is_cond | np.logical_not(has_cond[comp_num])
+        [comp_num, rows, cols, cell_layer] = [comp_num[use_cell], rows[use_cell], cols[use_cell],
+                                              cell_layer[use_cell]]
+
+        n_cells = np.bincount(comp_num, minlength=self.n_components)
+        if np.any(n_cells == 0):
+            no_cells = [self.board.components[which].name for which in np.flatnonzero(n_cells == 0)]
+            raise ValueError("Components outside of the board: " + str(no_cells))
+        cell_c = 1 / (self.r_cb[comp_num] * n_cells[comp_num])
+        # board node number, same order as _grid_to_vec
+        cell_nodes = rows + cols * self.board.mat_wid + cell_layer * self.board.mat_wid * self.board.mat_ht
+
+        junction_c = 1 / self.r_jc
+        self.coupling = {'cell_nodes': cell_nodes, 'case_nodes': self.case_nodes[comp_num], 'cell_c': cell_c,
+                         'junction_c': junction_c}
+        self.cell_case_c = np.bincount(cell_nodes, cell_c, self.board_dim)
+        comp_diag = np.zeros([self.n_components, 2])
+        comp_diag[:, 0] = junction_c
+        comp_diag[:, 1] = junction_c + np.bincount(comp_num, cell_c, self.n_components)
+        self.comp_diag_cond = comp_diag.ravel()
+
+    def find_case_air_conductances(self, case_temps):
+        # convection and radiation from the top of every component, at its case temperature
+        case_air_c = np.zeros(self.n_components)
+        comp_area = np.asarray([component.width * component.length for component in self.board.components])
+        comp_top = np.asarray([component.side == 'Top' for component in self.board.components], dtype=bool)
+        for [side_comps, neighbor_dir] in [[comp_top, [-1, 0, 0]], [np.logical_not(comp_top), [1, 0, 0]]]:
+            if not np.any(side_comps):
+                continue
+            htc = self.get_htc(self.get_conv_dir(neighbor_dir), self.simulation.ambient, case_temps[side_comps])
+            case_air_c[side_comps] = htc * self.simulation.comp_htc_coef * comp_area[side_comps]
+        return case_air_c
+
+    def find_case_temps(self):
+        if self.t_vec is not None:
+            return self.t_vec[self.case_nodes]
+        return np.ones(self.n_components) * np.mean(self.temp_mat)
+
+    def calc_component_heat(self, component_heats=None, temp_grid=None):
+        # component heat is the junction node source, nothing is added to the board cells directly
+        self.q_components = np.zeros(np.append(2, np.shape(self.board.layers[0].Q_mat)))
+        if component_heats is None:
+            component_heats = [component.heat for component in self.board.components]
+        self.component_q = np.asarray(component_heats, dtype=float)
+
+    def prepare_sparse_matrices(self):
+        # board G from Simultaneous, then the component nodes and their couplings
+        super().prepare_sparse_matrices()
+        self.case_air_temps = self.find_case_temps()
+        self.case_air_c = self.find_case_air_conductances(self.case_air_temps)
+        self.g_mat = self.add_component_nodes(self.g_mat, self.case_air_c)
+        self.s_vec = self.find_sources()
+
+    def add_component_nodes(self, g_board, case_air_c):
+        # board G with the junction and case nodes and their couplings appended
+        g_board = g_board.tocoo()
+        off_diag = g_board.row != g_board.col
+        cell_nodes = self.coupling['cell_nodes']
+        case_nodes = self.coupling['case_nodes']
+        junction_c = self.coupling['junction_c']
+        all_nodes = np.arange(self.node_dim)
+        comp_air = np.zeros([self.n_components, 2])
+        comp_air[:, 1] = case_air_c
+        g_diag = np.concatenate([g_board.diagonal() + self.cell_case_c, self.comp_diag_cond + comp_air.ravel()])
+        g_row = np.concatenate([g_board.row[off_diag], cell_nodes, case_nodes, self.junction_nodes, self.case_nodes,
+                                all_nodes])
+        g_col = np.concatenate([g_board.col[off_diag], case_nodes, cell_nodes, self.case_nodes, self.junction_nodes,
+                                all_nodes])
+        g_data = np.concatenate([g_board.data[off_diag], -self.coupling['cell_c'], -self.coupling['cell_c'],
+                                 -junction_c, -junction_c, g_diag])
+        return csr_matrix((g_data, (g_row, g_col)), shape=(self.node_dim, self.node_dim))
+
+    def find_system(self):
+        # board G and S from Simultaneous (no component heat on the board cells), then the component nodes, the
+        # case air 'C's at the case temperatures of the last solve
+        [g_board, s_board] = super().find_system()
+        case_air_c = self.find_case_air_conductances(self.case_air_temps)
+        return [self.add_component_nodes(g_board, case_air_c), self.add_component_sources(s_board, case_air_c)]
+
+    def find_g_diag(self):
+        comp_air = np.zeros([self.n_components, 2])
+        comp_air[:, 1] = self.case_air_c
+        return np.concatenate([self._grid_to_vec(self.g_diag_cond + self.s_air) + self.cell_case_c,
+                               self.comp_diag_cond + comp_air.ravel()])
+
+    def find_sources(self):
+        return self.add_component_sources(self._grid_to_vec(self.s_air * self.simulation.ambient +
+                                                            self.find_q_stack()), self.case_air_c)
+
+    def add_component_sources(self, s_board, case_air_c):
+        comp_s = np.zeros([self.n_components, 2])
+        comp_s[:, 0] = self.component_q
+        comp_s[:, 1] = case_air_c * self.simulation.ambient
+        return np.concatenate([s_board, comp_s.ravel()])
+
+    def update_air_conductances(self, temp_grid):
+        self.s_air = self.find_air_stack(temp_grid)
+        self.case_air_temps = self.find_case_temps()
+        self.case_air_c = self.find_case_air_conductances(self.case_air_temps)
+
+        self.g_mat = self.g_mat.copy()
+        self.g_mat.setdiag(self.find_g_diag())
+        self.s_vec = self.find_sources()
+
+    def update_sources(self, temp_grid=None):
+        self.calc_component_heat(temp_grid=temp_grid)
+        self.s_vec = self.find_sources()
+
+    def initial_guess(self):
+        return np.concatenate([super().initial_guess(), np.ones(2 * self.n_components) * np.mean(self.temp_mat)])
+
+    def _vec_to_grid(self, vec):
+        return super()._vec_to_grid(vec[:self.board_dim])
+
+    def _vec_to_temp_mat(self, t_vec):
+        return super()._vec_to_temp_mat(t_vec[:self.board_dim])
+
+    def _weights_to_vec(self, weight_grid):
+        # the target is on the board cells, no weight on the component nodes
+        return np.concatenate([super()._weights_to_vec(weight_grid), np.zeros(2 * self.n_components)])
+
+    def find_component_sensitivities(self, adjoint_vec, adjoint_grid):
+        # component heat is the junction node source
+        component_sens = dict()
+        for which_component, component in enumerate(self.board.components):
+            d_heat = adjoint_vec[self.junction_nodes[which_component]]
+            component_sens[component.name] = {'d_heat': d_heat, 'contribution': d_heat * component.heat}
+        return component_sens
+
+    def find_component_temps(self):
+        # solved [junction, case] temperature of every component by name
+        component_temps = dict()
+        for which_component, component in enumerate(self.board.components):
+            component_temps[component.name] = [self.t_vec[self.junction_nodes[which_component]],
+                                               self.t_vec[self.case_nodes[which_component]]]
+        return component_temps
@@ -0,0 +1,102 @@
+import numpy as np
+
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+import current_tracing
+
+# [row step, col step, conductance scale] of the cell to cell conductances, diagonal ones (length sqrt(2), one
+# cell wide like a diagonal path step) join corner touching cells only, as find_networks connects them
+POTENTIAL_STEPS = [[0, 1, 1.0], [1, 0, 1.0], [1, 1, 1 / np.sqrt(2)], [1, -1, 1 / np.sqrt(2)]]
+
+
+def find_terminal_cells(terminal, mat_walk, terminal_radius):
+    # network cells within terminal_radius cells of the terminal cell, the terminal is one equipotential pad
+    [n_rows, n_cols] = np.shape(mat_walk)
+    [rows, cols] = np.ogrid[0:n_rows, 0:n_cols]
+    in_pad = (rows - terminal[0]) ** 2 + (cols - terminal[1]) ** 2 <= terminal_radius ** 2
+    return in_pad & mat_walk
+
+
+def find_potential_res_map(path_start, path_end, mat_network, cell_thickness, material, terminal_radius=1):
+    # loss of every network cell per current squared [ohm] like set_res_values, from the 2D electric potential of
+    # the network with the start and end pads held at fixed potentials, every cell to cell conductance is t / rho,
+    # the |J|^2 rho loss of each conductance is split evenly between its two cells
+    res_mat = np.zeros(np.shape(mat_network), dtype=float)
+    walk_cells = np.argwhere(np.asarray(mat_network) > 0)
+    if len(walk_cells) == 0:
+        return res_mat
+    [row_min, col_min] = np.min(walk_cells, axis=0)
+    [row_max, col_max] = np.max(walk_cells, axis=0) + 1
+    mat_walk = np.asarray(mat_network)[row_min:row_max, col_min:col_max] > 0
+    start = [path_start[0] - row_min, path_start[1] - col_min]
+    end = [path_end[0] - row_min, path_end[1] - col_min]
+    [n_rows, n_cols] = np.shape(mat_walk)
+    node_ids = np.arange(n_rows * n_cols).reshape(n_rows, n_cols)
+
+    # network cells padded by one non network cell, so every step of a cell stays in the padded map
+    pad_walk = np.pad(mat_walk, 1)
+    [walk_rows, walk_cols] = np.nonzero(mat_walk)
+    edge_from = list()
+    edge_to = list()
+    edge_scale = list()
+    for [row_step, col_step, cond_scale] in POTENTIAL_STEPS:
+        is_edge = pad_walk[walk_rows + row_step + 1, walk_cols + col_step + 1]
+        if row_step != 0 and col_step != 0:
+            # a diagonal joint only where neither edge sharing cell between the two cells is network
+            is_edge = is_edge & np.logical_not(pad_walk[walk_rows + 1, walk_cols + col_step + 1] |
+                                               pad_walk[walk_rows + row_step + 1, walk_cols + 1])
+        edge_from.append(node_ids[walk_rows[is_edge], walk_cols[is_edge]])
+        edge_to.append(node_ids[walk_rows[is_edge] + row_step, walk_cols[is_edge] + col_step])
+        edge_scale.append(np.full(np.count_nonzero(is_edge), cond_scale))
+    edge_from = np.concatenate(edge_from)
+    edge_to = np.concatenate(edge_to)
+    edge_scale = np.concatenate(edge_scale)
+
+    # only the cells connected to the start terminal carry current
+    edge_graph = csr_matrix((np.ones(len(edge_from)), (edge_from, edge_to)), shape=(n_rows * n_cols, n_rows * n_cols))
+    [n_parts, part_ids] = connected_components(edge_graph, directed=False)
+    start_part = part_ids[node_ids[start[0], start[1]]]
+    is_part = (part_ids == start_part) & mat_walk.ravel()
+    start_pad = find_terminal_cells(start, mat_walk, terminal_radius).ravel() & is_part
+    end_pad = find_terminal_cells(end, mat_walk, terminal_radius).ravel() & is_part & np.logical_not(start_pad)
+    if not np.any(end_pad):
+        return res_mat
+
+    # potential is 1 on the start pad and 0 on the end pad, solved for the free cells of the network
+    volt = np.zeros(n_rows * n_cols)
+    volt[start_pad] = 1
+    is_free = is_part & np.logical_not(start_pad | end_pad)
+    free_ids = np.full(n_rows * n_cols, -1)
+    free_ids[is_free] = np.arange(np.count_nonzero(is_free))
+    use_edge = is_part[edge_from]
+    [edge_from, edge_to, edge_scale] = [edge_from[use_edge], edge_to[use_edge], edge_scale[use_edge]]
+
+    n_free = np.count_nonzero(is_free)
+    if n_free > 0:
+        [from_free, to_free] = [is_free[edge_from], is_free[edge_to]]
+        lap_diag = np.bincount(free_ids[edge_from[from_free]], edge_scale[from_free], n_free) + \
+            np.bincount(free_ids[edge_to[to_free]], edge_scale[to_free], n_free)
+        both_free = from_free & to_free
+        lap_row = np.concatenate([free_ids[edge_from[both_free]], free_ids[edge_to[both_free]], np.arange(n_free)])
+        lap_col = np.concatenate([free_ids[edge_to[both_free]], free_ids[edge_from[both_free]], np.arange(n_free)])
+        lap_data = np.concatenate([-edge_scale[both_free], -edge_scale[both_free], lap_diag])
+        lap_mat = csr_matrix((lap_data, (lap_row, lap_col)), shape=(n_free, n_free))
+        # fixed potential neighbors of the free cells
+        rhs = np.bincount(free_ids[edge_from[from_free]], edge_scale[from_free] * volt[edge_to[from_free]], n_free) + \
+            np.bincount(free_ids[edge_to[to_free]], edge_scale[to_free] * volt[edge_from[to_free]], n_free)
+        volt[is_free] = splu(lap_mat.tocsc()).solve(rhs)
+
+    # with conductance g s per edge (s the step scale), the edge loss is g s dV^2 and the pad to pad current is
+    # the total loss (1 V), so the loss at 1 A is g s dV^2 / (g sum(s dV^2))^2
+    edge_volt_sq = edge_scale * (volt[edge_from] - volt[edge_to]) ** 2
+    total_volt_sq = np.sum(edge_volt_sq)
+    if total_volt_sq <= 0:
+        return res_mat
+    edge_cond = cell_thickness / current_tracing.material_rho_lookup(material)
+    edge_res = edge_volt_sq / (edge_cond * total_volt_sq * total_volt_sq)
+    cell_res = (np.bincount(edge_from, edge_res, n_rows * n_cols) +
+                np.bincount(edge_to, edge_res, n_rows * n_cols)) / 2
+    res_mat[row_min:row_max, col_min:col_max] = cell_res.reshape(n_rows, n_cols)
+    return res_mat
@@ -1,8 +1,13 @@
-from pathfinding.core.grid import Grid
-from pathfinding.finder.a_star import AStarFinder
-from pathfinding.core.diagonal_movement import DiagonalMovement
 import numpy as np
 
+from math import sqrt
+from scipy.ndimage import distance_transform_edt
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# [row step, col step, length] of the grid graph edges, diagonal moves are always allowed
+GRID_STEPS = [[0, 1, 1.0], [1, 0, 1.0], [1, 1, sqrt(2)], [1, -1, sqrt(2)]]
+
 
 class ElectricLoad:
     def __init__(self, name, current, path_start, path_end):
@@ -13,32 +18,86 @@ class ElectricLoad:
 
 
 def find_current_path(path_start, path_end, mat_network):
-    map_grid = Grid(matrix=np.transpose(mat_network))
-    start = map_grid.node(path_start[0], path_start[1])
-    end = map_grid.node(path_end[0], path_end[1])
-
-    finder = AStarFinder(diagonal_movement=DiagonalMovement.always)
-
-    [path, runs] = finder.find_path(start, end, map_grid)
-    return path
+    return find_current_paths([[path_start, path_end]], mat_network)[0]
+
+
+def find_current_paths(path_ends, mat_network):
+    # shortest path on the network cells for every [start, end] pair, each path is a list of (row, col) from start
+    # to end (empty if the end can't be reached), one search per distinct start over the network's bounding box
+    walk_cells = np.argwhere(np.asarray(mat_network) > 0)
+    if len(walk_cells) == 0:
+        return [list() for _ in path_ends]
+    [row_min, col_min] = np.min(walk_cells, axis=0)
+    [row_max, col_max] = np.max(walk_cells, axis=0) + 1
+    mat_walk = np.asarray(mat_network)[row_min:row_max, col_min:col_max] > 0
+    n_cols = col_max - col_min
+    grid_graph = build_grid_graph(mat_walk)
+
+    def node_id(cell):
+        row = int(cell[0]) - row_min
+        col = int(cell[1]) - col_min
+        if row < 0 or col < 0 or row >= row_max - row_min or col >= n_cols or not mat_walk[row, col]:
+            return None
+        return row * n_cols + col
+
+    start_ids = sorted(set(node_id(path_start) for [path_start, path_end] in path_ends) - {None})
+    predecessors = dict()
+    if len(start_ids) > 0:
+        [dist, start_predecessors] = dijkstra(grid_graph, directed=False, indices=start_ids, return_predecessors=True)
+        for which_start, start_id in enumerate(start_ids):
+            predecessors[start_id] = start_predecessors[which_start]
+
+    paths = list()
+    for [path_start, path_end] in path_ends:
+        start_id = node_id(path_start)
+        end_id = node_id(path_end)
+        path = list()
+        if start_id is not None and end_id is not None and \
+                (start_id == end_id or predecessors[start_id][end_id] >= 0):
+            cursor_id = end_id
+            while cursor_id != start_id:
+                path.append((int(cursor_id // n_cols + row_min), int(cursor_id % n_cols + col_min)))
+                cursor_id = predecessors[start_id][cursor_id]
+            path.append((int(path_start[0]), int(path_start[1])))
+            path.reverse()
+        paths.append(path)
+    return paths
+
+
+def build_grid_graph(mat_walk):
+    # undirected graph of neighboring walkable cells (8 neighbors), node number is row * n_cols + col
+    [n_rows, n_cols] = np.shape(mat_walk)
+    node_ids = np.arange(n_rows * n_cols).reshape(n_rows, n_cols)
+    edge_from = list()
+    edge_to = list()
+    edge_len = list()
+    for [row_step, col_step, step_len] in GRID_STEPS:
+        from_rows = slice(0, n_rows - row_step)
+        to_rows = slice(row_step, n_rows)
+        from_cols = slice(max(-col_step, 0), n_cols - max(col_step, 0))
+        to_cols = slice(max(col_step, 0), n_cols - max(-col_step, 0))
+        both_walk = mat_walk[from_rows, from_cols] & mat_walk[to_rows, to_cols]
+        edge_from.append(node_ids[from_rows, from_cols][both_walk])
+        edge_to.append(node_ids[to_rows, to_cols][both_walk])
+        edge_len.append(np.full(np.count_nonzero(both_walk), step_len))
+    return csr_matrix((np.concatenate(edge_len), (np.concatenate(edge_from), np.concatenate(edge_to))),
+                      shape=(n_rows * n_cols, n_rows * n_cols))
 
 
 def find_straight_path(path_start, path_end):
-    path = []
-    cursor_loc = np.asarray(path_start)
-    path.append([cursor_loc[0], cursor_loc[1]])
-    this_step = np.zeros([2], dtype=int)
-
-    while not (path_end[0] == cursor_loc[0] and path_end[1] == cursor_loc[1]):
-        this_step[0] = np.sign(path_end[0] - cursor_loc[0])
-        this_step[1] = np.sign(path_end[1] - cursor_loc[1])
-        cursor_loc = cursor_loc + this_step
-        path.append([cursor_loc[0], cursor_loc[1]])
-
-    return path
-
-
-def find_middle_path(path_start, mat_network, short_path):
+    # diagonal steps until the start is in line with the end, then straight steps
+    path_start = np.asarray(path_start)
+    delta = np.asarray(path_end) - path_start
+    n_steps = int(np.max(np.abs(delta)))
+    step_nos = np.arange(n_steps + 1)
+    rows = path_start[0] + np.sign(delta[0]) * np.minimum(step_nos, abs(delta[0]))
+    cols = path_start[1] + np.sign(delta[1]) * np.minimum(step_nos, abs(delta[1]))
+    return np.transpose([rows, cols]).tolist()
+
+
+def find_middle_path(path_start, mat_network, short_path, width_field=None):
+    if width_field is None:
+        width_field = WidthField(mat_network)
     steps = np.diff(np.transpose(np.asarray(short_path)))
     steps_trans = np.transpose(steps)
     p_orth = np.transpose([steps[1], -1 * steps[0]])
@@ -49,7 +108,7 @@ def find_middle_path(path_start, mat_network, short_path):
 
     cursor_loc = path_start
     for step in range(0, int(np.size(steps) / 2)):
-        center_cell = cell_at_width_center(cursor_loc, mat_network, steps_trans[step], p_orth[step])
+        center_cell = cell_at_width_center(cursor_loc, width_field, steps_trans[step], p_orth[step])
         way_points.append(center_cell)
         cursor_loc = cursor_loc + steps_trans[step]
     way_points.append(np.array(short_path[-1]))
@@ -80,32 +139,28 @@ def find_middle_path(path_start, mat_network, short_path):
     return [tuple(x) for x in concat_path]  # concat_path
 
 
-def cell_at_width_center(start_loc, mat_network, step, p_orth):
-    # move from the current location in the path orthogonally until out of trace
-    cursor_loc = start_loc
+def cell_at_width_center(start_loc, width_field, step, p_orth):
+    # from the edge of the trace, move back orthogonally by half the trace width
+    trace_width = find_trace_width(start_loc, width_field, step, p_orth)
+    cursor_loc = cell_at_edge_of_width(start_loc, width_field, p_orth)
 
-    trace_width = find_trace_width(cursor_loc, mat_network, step, p_orth)
-    cursor_loc = cell_at_edge_of_width(start_loc, mat_network, p_orth)
+    n_moves = width_field.count_moves(np.linalg.norm(step), trace_width / 2)
+    return cursor_loc - n_moves * np.asarray(p_orth)
 
-    step_size = np.linalg.norm(step)
-    step_progress = step_size
 
-    while step_progress <= (trace_width / 2):
-        cursor_loc = cursor_loc - p_orth
-        step_progress = step_progress + step_size
-
-    return cursor_loc
-
-
-def set_res_values(start, end, mat_network, cell_thickness, material):
-    short_path = find_current_path(start, end, mat_network)
-    middle_path = find_middle_path(start, mat_network, short_path)
+def set_res_values(start, end, mat_network, cell_thickness, material, short_path=None, smooth_radius=10):
+    # short_path may be given when it was already found, e.g. by find_current_paths for all loads of a network
+    if short_path is None:
+        short_path = find_current_path(start, end, mat_network)
+    width_field = WidthField(mat_network)
+    middle_path = find_middle_path(start, mat_network, short_path, width_field)
     acceptable_gap = np.linalg.norm(np.asarray(short_path[0]) - np.asarray(middle_path[0])) * 5
     if np.linalg.norm(np.asarray(short_path[-1]) - np.asarray(middle_path[-1])) <= acceptable_gap:
         path_taken = middle_path
     else:
         path_taken = short_path
-    res_mat = calc_resistances(path_taken, start, end, material, cell_thickness, mat_network)
+    res_mat = calc_resistances(path_taken, start, end, material, cell_thickness, mat_network, smooth_radius,
+                               width_field)
     return res_mat
 
 
@@ -120,7 +175,9 @@ def show_path(start, path, matrix):
         matrix[cursor_loc[0], cursor_loc[1]] = -matrix[cursor_loc[0], cursor_loc[1]]
 
 
-def calc_resistances(path, path_start, path_end, material, cell_ht, mat_network):
+def calc_resistances(path, path_start, path_end, material, cell_ht, mat_network, smooth_radius=10, width_field=None):
+    if width_field is None:
+        width_field = WidthField(mat_network)
     steps = np.diff(np.transpose(np.asarray(path)))
     steps_trans = np.transpose(steps)
     p_orth = np.transpose([steps[1], -1 * steps[0]])
@@ -131,69 +188,124 @@ def calc_resistances(path, path_start, path_end, material, cell_ht, mat_network)
     path_loc = path_start
     for step in range(0, int(np.size(steps)/2)):
         cursor_loc = path_loc
-        trace_width = find_trace_width(cursor_loc, mat_network, steps_trans[step], p_orth[step])
+        trace_width = find_trace_width(cursor_loc, width_field, steps_trans[step], p_orth[step])
 
         # with width calculated, assign all cells along path to this width or resistance
         this_resistance = rho / (trace_width * trace_width * cell_ht)
-        set_res_for_trace_width(cursor_loc, this_resistance, mat_resistance, mat_network, p_orth[step])
+        set_res_for_trace_width(cursor_loc, this_resistance, mat_resistance, width_field, p_orth[step])
 
         # move to next step
         path_loc = path_loc + steps_trans[step]
 
     # for each cell in network that doesn't have a resistance, find the closest cell that does and set equal to that
-    no_res_cells1 = mat_resistance == 0
-    no_res_cells2 = mat_network == 1
-    no_res_cells = np.argwhere(no_res_cells1 * no_res_cells2)
-    res_cells = np.argwhere(mat_resistance != 0)
+    fill_nearest_resistance(mat_resistance, mat_network)
 
-    for no_res_cell in no_res_cells:
-        idx = np.linalg.norm((res_cells-no_res_cell), axis=1).argmin()
-        this_res_loc = res_cells[idx]
-        mat_resistance[no_res_cell[0], no_res_cell[1]] = mat_resistance[this_res_loc[0], this_res_loc[1]]
-
-    clipped_res_mat = clip_res_matrix(mat_resistance, mat_network, path_start, path_end, steps)
-    smoothed_res_mat = smooth_matrix_non_zero(clipped_res_mat, 10)
+    clipped_res_mat = clip_res_matrix(mat_resistance, mat_network, path_start, path_end, steps, width_field)
+    smoothed_res_mat = smooth_matrix_non_zero(clipped_res_mat, smooth_radius)
 
     return smoothed_res_mat
 
 
-def find_trace_width(path_loc, mat_network, step, p_orth):
-    trace_width = 1
-    cursor_loc = cell_at_edge_of_width(path_loc, mat_network, p_orth)
-
-    # move in opposite direction until out of trace counting to find width
-    while mat_network[cursor_loc[0], cursor_loc[1]] == 1:
-        cursor_loc = cursor_loc - p_orth
-        # if step is diagonal, add diagonal distance to trace width
-        if np.linalg.norm(step) > 1:
-            trace_width = trace_width + np.sqrt(2)
-        else:
-            trace_width = trace_width + 1
-    return trace_width
-
-
-def set_res_for_trace_width(this_location, this_resistance, mat_resistance, mat_network, p_orth):
-    edge_cell = cell_at_edge_of_width(this_location, mat_network, p_orth)
-    cursor_loc = edge_cell
-
-    # with width calculated, assign all cells along path to this width or resistance
-    while mat_network[cursor_loc[0], cursor_loc[1]] == 1:
-        mat_resistance[cursor_loc[0], cursor_loc[1]] = this_resistance
-        cursor_loc = cursor_loc - p_orth
+def fill_nearest_resistance(mat_resistance, mat_network):
+    # nearest cell with a resistance of every network cell without one, in one Euclidean distance transform over
+    # the network's bounding box (the resistances are all on network cells)
+    res_cells = np.argwhere(mat_resistance != 0)
+    network_cells = np.argwhere(mat_network == 1)
+    if len(res_cells) == 0 or len(network_cells) == 0:
+        return mat_resistance
+    [row_min, col_min] = np.min(network_cells, axis=0)
+    [row_max, col_max] = np.max(network_cells, axis=0) + 1
+    res_region = mat_resistance[row_min:row_max, col_min:col_max]
+    no_res_region = (res_region == 0) & (mat_network[row_min:row_max, col_min:col_max] == 1)
 
+    [near_rows, near_cols] = distance_transform_edt(res_region == 0, return_distances=False, return_indices=True)
+    res_region[no_res_region] = res_region[near_rows[no_res_region], near_cols[no_res_region]]
+    return mat_resistance
 
-def cell_at_edge_of_width(start_loc, mat_network, p_orth):
-    # move from the current location in the path orthogonally until out of trace
-    cursor_loc = start_loc
-    while mat_network[cursor_loc[0], cursor_loc[1]] == 1:
-        cursor_loc = cursor_loc + p_orth
 
-    # move back one location, start trace width count
-    cursor_loc = cursor_loc - p_orth
-    return cursor_loc
+def find_trace_width(path_loc, width_field, step, p_orth):
+    # count the cells across the trace from its edge, diagonal steps add the diagonal distance
+    edge_cell = cell_at_edge_of_width(path_loc, width_field, p_orth)
+    n_cells = width_field.find_run(edge_cell, -1 * np.asarray(p_orth))
+    return width_field.find_width(n_cells, np.linalg.norm(step) > 1)
 
 
-def clip_res_matrix(in_matrix, mat_network, path_start, path_end, steps):
+def set_res_for_trace_width(this_location, this_resistance, mat_resistance, width_field, p_orth):
+    # with width calculated, assign all cells along path to this width or resistance
+    [rows, cols] = width_field.find_width_cells(this_location, p_orth)
+    mat_resistance[rows, cols] = this_resistance
+
+
+def cell_at_edge_of_width(start_loc, width_field, p_orth):
+    # last trace cell moving orthogonally from the current location (one step back if not on the trace)
+    n_cells = width_field.find_run(start_loc, p_orth)
+    return np.asarray(start_loc) + (n_cells - 1) * np.asarray(p_orth)
+
+
+class WidthField:
+    # run lengths of network cells from every cell in each of the 8 grid directions, so the edge, width and
+    # centre of the trace across a path cell are array lookups instead of walks, found per direction when first used
+    def __init__(self, mat_network):
+        self.is_network = np.asarray(mat_network) == 1
+        self.runs = dict()
+        self.max_run = max(np.shape(self.is_network)) + 1
+        self.widths = dict()
+        self.progress = dict()
+
+    def find_run(self, loc, direction):
+        # number of consecutive network cells starting at loc going in direction, 0 off the network or board
+        direction = (int(direction[0]), int(direction[1]))
+        if direction not in self.runs:
+            self.runs[direction] = find_run_lengths(self.is_network, direction)
+        [n_rows, n_cols] = np.shape(self.is_network)
+        if loc[0] < 0 or loc[1] < 0 or loc[0] >= n_rows or loc[1] >= n_cols:
+            return 0
+        return int(self.runs[direction][loc[0], loc[1]])
+
+    def find_width(self, n_cells, is_diagonal):
+        # 1 plus the cell count in cell or diagonal distances, summed in the same order as a walk would
+        if is_diagonal not in self.widths:
+            self.widths[is_diagonal] = np.cumsum(np.append(1.0, np.full(self.max_run, np.sqrt(2) if is_diagonal
+                                                                        else 1.0)))
+        return self.widths[is_diagonal][n_cells]
+
+    def count_moves(self, step_size, max_progress):
+        # moves of step_size while the progress (starting at one step) is within max_progress
+        if step_size not in self.progress:
+            self.progress[step_size] = np.cumsum(np.full(self.max_run + 1, step_size))
+        return int(np.searchsorted(self.progress[step_size], max_progress, side='right'))
+
+    def find_width_cells(self, loc, p_orth):
+        # [rows, cols] of the trace cells across loc, from the edge in the p_orth direction back
+        edge_cell = cell_at_edge_of_width(loc, self, p_orth)
+        back_dir = -1 * np.asarray(p_orth)
+        n_cells = self.find_run(edge_cell, back_dir)
+        cell_steps = np.arange(n_cells)
+        return [edge_cell[0] + cell_steps * back_dir[0], edge_cell[1] + cell_steps * back_dir[1]]
+
+
+def find_run_lengths(is_network, direction):
+    # consecutive network cells from every cell going in direction, filled a row (or column) at a time from the far
+    # side of the board
+    [row_step, col_step] = direction
+    if row_step == 0:
+        return np.transpose(find_run_lengths(np.transpose(is_network), [col_step, row_step]))
+    [n_rows, n_cols] = np.shape(is_network)
+    runs = np.zeros([n_rows, n_cols], dtype=int)
+    rows = range(n_rows - 1, -1, -1) if row_step > 0 else range(0, n_rows)
+    from_cols = slice(max(-col_step, 0), n_cols - max(col_step, 0))
+    to_cols = slice(max(col_step, 0), n_cols - max(-col_step, 0))
+    for row in rows:
+        next_row = row + row_step
+        runs[row] = is_network[row]
+        if 0 <= next_row < n_rows:
+            runs[row, from_cols] += is_network[row, from_cols] * runs[next_row, to_cols]
+    return runs
+
+
+def clip_res_matrix(in_matrix, mat_network, path_start, path_end, steps, width_field=None):
+    if width_field is None:
+        width_field = WidthField(mat_network)
     steps_trans = np.transpose(steps)
 
     out_matrix = in_matrix
@@ -211,13 +323,13 @@ def clip_res_matrix(in_matrix, mat_network, path_start, path_end, steps):
         half_step_1 = [start_step[0], 0]
         half_step_2 = [0, start_step[1]]
         while mat_network[cursor_loc[0], cursor_loc[1]] == 1:
-            set_res_for_trace_width(cursor_loc, 0, out_matrix, mat_network, p_orth)
+            set_res_for_trace_width(cursor_loc, 0, out_matrix, width_field, p_orth)
             cursor_loc = cursor_loc - half_step_1
-            set_res_for_trace_width(cursor_loc, 0, out_matrix, mat_network, p_orth)
+            set_res_for_trace_width(cursor_loc, 0, out_matrix, width_field, p_orth)
             cursor_loc = cursor_loc - half_step_2
     else:
         while mat_network[cursor_loc[0], cursor_loc[1]] == 1:
-            set_res_for_trace_width(cursor_loc, 0, out_matrix, mat_network, p_orth)
+            set_res_for_trace_width(cursor_loc, 0, out_matrix, width_field, p_orth)
             cursor_loc = cursor_loc - start_step
 
     # end location
@@ -233,36 +345,43 @@ def clip_res_matrix(in_matrix, mat_network, path_start, path_end, steps):
         half_step_1 = [end_step[0], 0]
         half_step_2 = [0, end_step[1]]
         while mat_network[cursor_loc[0], cursor_loc[1]] == 1:
-            set_res_for_trace_width(cursor_loc, 0, out_matrix, mat_network, p_orth)
+            set_res_for_trace_width(cursor_loc, 0, out_matrix, width_field, p_orth)
             cursor_loc = cursor_loc + half_step_1
-            set_res_for_trace_width(cursor_loc, 0, out_matrix, mat_network, p_orth)
+            set_res_for_trace_width(cursor_loc, 0, out_matrix, width_field, p_orth)
             cursor_loc = cursor_loc + half_step_2
     else:
         while mat_network[cursor_loc[0], cursor_loc[1]] == 1:
-            set_res_for_trace_width(cursor_loc, 0, out_matrix, mat_network, p_orth)
+            set_res_for_trace_width(cursor_loc, 0, out_matrix, width_field, p_orth)
             cursor_loc = cursor_loc + end_step
 
     return out_matrix
 
 
 def smooth_matrix_non_zero(in_matrix, radius):
+    # average of the non-zero cells in the window [row - radius, row + radius) x [col - radius, col + radius) of
+    # every non-zero cell, window sums and counts are differences of summed-area tables of the values and the mask
     [nrow, ncol] = in_matrix.shape
     out_matrix = np.zeros_like(in_matrix)
-
-    for row in range(0, nrow):
-        for col in range(0, ncol):
-            mat_val = in_matrix[row, col]
-            if in_matrix[row, col] > 0:
-                nei_row_start = max(row - radius, 0)
-                nei_col_start = max(col - radius, 0)
-                nei_vals = [in_matrix[row, col]]
-                for nei_row in range(nei_row_start, min(row + radius, nrow)):
-                    for nei_col in range(nei_col_start, min(col + radius, ncol)):
-                        if not (nei_row == row and nei_col == col):
-                            if in_matrix[nei_row, nei_col] > 0:
-                                nei_vals.append(in_matrix[nei_row, nei_col])
-                ave_val = np.average(np.asarray(nei_vals))
-                out_matrix[row, col] = ave_val
+    is_non_zero = in_matrix > 0
+    if radius <= 0:
+        out_matrix[is_non_zero] = in_matrix[is_non_zero]
+        return out_matrix
+
+    row_start = np.maximum(np.arange(nrow) - radius, 0)
+    row_end = np.minimum(np.arange(nrow) + radius, nrow)
+    col_start = np.maximum(np.arange(ncol) - radius, 0)
+    col_end = np.minimum(np.arange(ncol) + radius, ncol)
+
+    def window_sums(vals):
+        area_table = np.zeros([nrow + 1, ncol + 1])
+        area_table[1:, 1:] = np.cumsum(np.cumsum(vals, axis=0), axis=1)
+        return area_table[np.ix_(row_end, col_end)] - area_table[np.ix_(row_start, col_end)] - \
+            area_table[np.ix_(row_end, col_start)] + area_table[np.ix_(row_start, col_start)]
+
+    non_zero_vals = np.where(is_non_zero, in_matrix, 0).astype(float)
+    val_sums = window_sums(non_zero_vals)
+    val_counts = window_sums(is_non_zero.astype(float))
+    out_matrix[is_non_zero] = val_sums[is_non_zero] / val_counts[is_non_zero]
 
     return out_matrix
 
@@ -280,3 +399,25 @@ def material_rho_lookup(material):
     return switch.get(material)
 
 
+# resistivities above are at this temperature [C]
+RHO_REF_TEMP = 20.0
+
+
+def material_alpha_lookup(material):
+    # temperature coefficient of resistivity at 20 C
+    switch = {
+        'Copper': 0.00393,
+        'Aluminum': 0.00429,
+        'Gold': 0.0034,
+        'Silver': 0.0038,
+        'Nickel': 0.006
+    }
+    # units: 1 / C
+    return switch.get(material)
+
+
+def find_rho_scale(temp_mat, material):
+    # resistivity at each cell temperature relative to the looked up (reference temperature) resistivity
+    return 1 + material_alpha_lookup(material) * (np.asarray(temp_mat) - RHO_REF_TEMP)
+
+
@@ -732,6 +732,51 @@ class App(customtkinter.CTk):
                                                *sim_board_orient_options, command=self.update_sim_settings)
         self.opt_sim_board_orient.grid(row=2, column=1, pady=5, padx=5, sticky="we")
 
+        self.lbl_sim_loss_model = customtkinter.CTkLabel(master=self.sim_settings_frame,
+                                                         text="Conduction Loss Model:",
+                                                         text_font=(
+                                                             "Roboto Medium", -16))  # font name and size in px
+        self.lbl_sim_loss_model.grid(row=3, column=0, padx=5, pady=5, sticky="we")
+
+        sim_loss_model_options = [
+            "path",
+            "potential"
+        ]
+        self.sim_loss_model_clicked = StringVar()
+        self.sim_loss_model_clicked.set(sim_loss_model_options[0])
+        self.opt_sim_loss_model = OptionMenu(self.sim_settings_frame, self.sim_loss_model_clicked,
+                                             *sim_loss_model_options, command=self.update_sim_settings)
+        self.opt_sim_loss_model.grid(row=3, column=1, pady=5, padx=5, sticky="we")
+
+        self.lbl_sim_smooth_radius = customtkinter.CTkLabel(master=self.sim_settings_frame,
+                                                            text="Loss Smoothing Radius [cells]:",
+                                                            text_font=(
+                                                                "Roboto Medium", -16))  # font name and size in px
+        self.lbl_sim_smooth_radius.grid(row=4, column=0, padx=5, pady=5, sticky="we")
+
+        self.ent_sim_smooth_radius = customtkinter.CTkEntry(master=self.sim_settings_frame, width=120)
+        self.ent_sim_smooth_radius.grid(row=4, column=1, padx=5, pady=5, sticky="we")
+        self.ent_sim_smooth_radius.insert(0, '10')
+
+        self.lbl_sim_loss_workers = customtkinter.CTkLabel(master=self.sim_settings_frame,
+                                                           text="Loss Workers (0 = all cores):",
+                                                           text_font=(
+                                                               "Roboto Medium", -16))  # font name and size in px
+        self.lbl_sim_loss_workers.grid(row=5, column=0, padx=5, pady=5, sticky="we")
+
+        self.ent_sim_loss_workers = customtkinter.CTkEntry(master=self.sim_settings_frame, width=120)
+        self.ent_sim_loss_workers.grid(row=5, column=1, padx=5, pady=5, sticky="we")
+        self.ent_sim_loss_workers.insert(0, '1')
+
+        self.lbl_sim_res_cache_dir = customtkinter.CTkLabel(master=self.sim_settings_frame,
+                                                            text="Resistance Cache Folder:",
+                                                            text_font=(
+                                                                "Roboto Medium", -16))  # font name and size in px
+        self.lbl_sim_res_cache_dir.grid(row=6, column=0, padx=5, pady=5, sticky="we")
+
+        self.ent_sim_res_cache_dir = customtkinter.CTkEntry(master=self.sim_settings_frame, width=120)
+        self.ent_sim_res_cache_dir.grid(row=6, column=1, padx=5, pady=5, sticky="we")
+
     def create_sim_tuning_frame(self):
         self.sim_tuning_frame = customtkinter.CTkFrame(master=self.sim_edit)
 
@@ -1090,6 +1135,14 @@ class App(customtkinter.CTk):
             self.ent_sim_ambient.delete(0, END)
             self.ent_sim_ambient.insert(0, sim_settings.get('ambient'))
             self.sim_board_orient_clicked.set(sim_settings.get('orientation'))
+            # setup files saved before these settings get the defaults
+            self.sim_loss_model_clicked.set(sim_settings.get('loss_model', 'path'))
+            self.ent_sim_smooth_radius.delete(0, END)
+            self.ent_sim_smooth_radius.insert(0, sim_settings.get('smooth_radius', 10))
+            self.ent_sim_loss_workers.delete(0, END)
+            self.ent_sim_loss_workers.insert(0, sim_settings.get('loss_workers', 1))
+            self.ent_sim_res_cache_dir.delete(0, END)
+            self.ent_sim_res_cache_dir.insert(0, sim_settings.get('res_cache_dir', ''))
 
             self.ent_sim_cond_k_in_plane.delete(0, END)
             self.ent_sim_cond_k_in_plane.insert(0, tuning_settings.get('cond_k_inplane'))
@@ -1169,7 +1222,11 @@ class App(customtkinter.CTk):
                                                    self.sim_board_orient_clicked.get(),
                                                    tuning_setup,
                                                    loads_setup,
-                                                   component_heats_setup)
+                                                   component_heats_setup,
+                                                   self.sim_loss_model_clicked.get(),
+                                                   self.ent_sim_smooth_radius.get(),
+                                                   self.ent_sim_loss_workers.get(),
+                                                   self.ent_sim_res_cache_dir.get())
 
         return sim_settings
 
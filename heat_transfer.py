@@ -1,49 +1,48 @@
+import copy
 import time
 import numpy as np
 
-from scipy.interpolate import interp1d
-from scipy.sparse import csr_matrix
-from scipy.sparse.linalg import spsolve
+from scipy.sparse import csr_matrix, diags
 from math import ceil
 
+import air_properties
+import quick_estimate
+import thermal_solvers
 import tracer
 
-
-def lookup_g_v2(temperature_c):
-    temp_vec = np.asarray([0, 20, 40, 60, 80, 100, 200])
-    g_v2_vec = np.asarray([8.28e5, 6.54e5, 5.2e5, 4.27e5, 3.47e5, 2.89e5, 1.28e5])
-
-    g_v2_interp = interp1d(temp_vec, g_v2_vec)
-
-    return g_v2_interp(temperature_c)
-
-
-def lookup_k_air(temperature_c):
-    temp_vec = np.asarray([0, 20, 40, 60, 80, 100, 200])
-    k_vec = np.asarray([6.02e-4, 6.375e-4, 6.731e-4, 7.087e-4, 7.442e-4, 7.798e-4, 9.398e-4])
-
-    k_interp = interp1d(temp_vec, k_vec)
-
-    return k_interp(temperature_c)
+# neighbor directions [k, i, j] in the order their 'C's are summed into the G matrix
+NEIGHBOR_DIRS = [[0, -1, 0], [0, 1, 0], [0, 0, -1], [0, 0, 1], [-1, 0, 0], [1, 0, 0]]
+# TuningSetup coefficients, see find_tuning_sensitivities
+TUNING_COEFS = ['cond_k_inplane', 'cond_k_thruplane', 'diel_k_inplane', 'diel_k_thruplane', 'conv_coef', 'rad_coef',
+                'rad_pow', 'component_htc']
 
 
 class Simultaneous:
-    def __init__(self, board):
+    def __init__(self, board, solver=None, htc_model=None):
 
         self.board = board
         self.simulation = self.board.simulation
+        # free convection unless another air side model is given (see air_properties)
+        if htc_model is None:
+            htc_model = air_properties.NaturalConvection()
+        self.htc_model = htc_model
+        # sparse solver backend, direct LU unless another one is given (see thermal_solvers)
+        if solver is None:
+            solver = thermal_solvers.DirectSolver()
+        self.solver = solver
         # build 'G' tensor matrix, and 'S' boundary conditions vector
-        self.g_row = list()
-        self.g_col = list()
-        self.g_data = list()
-        self.neighbor_c_list = list()
-        self.s_list = list()
-
-        # build G matrix and S vector
         self.grid_dims = np.append(np.size(self.board.layers), np.shape(self.board.layers[0].Q_mat))
         self.g_dim = np.prod(self.grid_dims)
-        self.s_vec = list()  # np.zeros([self.g_dim, 1])
-        self.skipped_cells = list()
+        self.g_mat = None
+        self.s_vec = np.zeros(self.g_dim)
+        self.t_vec = None
+        self.g_diag_cond = None
+        self.s_air = None
+        self.nonlinear_report = list()
+        self.electrothermal_report = list()
+        # cell temperatures the air 'C's and the component heat split were last evaluated at
+        self.air_temp_grid = None
+        self.component_temp_grid = None
 
         # calculate reusable values
         self.cell_wid = self.simulation.resolution
@@ -54,6 +53,9 @@ class Simultaneous:
         if self.simulation.show_process:
             print("Creating simultaneous simulation")
         self.htc = list()
+        # convection 'C's from the board level htc's (False), or from the htc model at the temperature rise of each
+        # surface cell, set once the temperatures are solved (see solve_nonlinear)
+        self.local_htc = False
         self.temp_mat = self.calc_initial_board_temps()
 
         self.q_components = np.zeros(np.append(2, np.shape(self.board.layers[0].Q_mat)))
@@ -73,14 +75,14 @@ class Simultaneous:
 
     def calc_ave_board_temp(self):
         # find total heat generated in board from cond loss and component (70%)
+        # fixed step search, the simulation tuning coefficients are fit with this mean temperature, see
+        # quick_estimate.estimate_board_temp for the converged root of the same balance
         q_tot = self.find_total_board_q()
         iter_limit = 10000
         iter = 0
 
-        [L, W, H] = self.get_general_board_dims()
-        c_2_k = 273.16
+        general_dims = self.get_general_board_dims()
         Ta = self.simulation.ambient
-        beta_a = 1/(Ta+c_2_k)
 
         # guess dt = 20 deg C
         dt = 20
@@ -90,57 +92,9 @@ class Simultaneous:
         while abs(temp_delta) > temp_thresh:
             iter += 1
 
-            Ts = Ta + dt
-            Tf = (Ts + Ta) / 2
-
-            g_v2 = lookup_g_v2(Tf)
-            k_air = lookup_k_air(Tf)
-            Pr = 0.71
-
-            Ra_less_P = g_v2*beta_a*dt*Pr
-
-            P_top_btm = W * L / (2 * (W + L))
-            P_side = H
-
-            Ra_top_btm = Ra_less_P * P_top_btm ** 3
-            Ra_side = Ra_less_P * P_side ** 3
-
-            if Ra_top_btm < 8e6:
-                C_top = 0.54
-                n_top = 1/4
-            else:
-                C_top = 0.15
-                n_top = 1 / 3
-
-            if Ra_side < 1e9:
-                C_side = 0.59
-                n_side = 1 / 4
-            else:
-                C_side = 0.13
-                n_side = 1 / 3
-
-            C_btm = 0.27
-            n_btm = 1/4
-
-            epsilon = 0.8
-            sigma = 5.67 * 1e-8 / 1550
-
-            # convection
-            h_top = (C_top * k_air * Ra_top_btm ** n_top / P_top_btm) / self.simulation.conv_coef
-            h_side = (C_side * k_air * Ra_side ** n_side / P_side) / self.simulation.conv_coef
-            h_btm = (C_btm * k_air * Ra_top_btm ** n_btm / P_top_btm) / self.simulation.conv_coef
-            q_conv = h_top * (L * W) * dt + \
-                     h_side * (2 * W * H) * dt + \
-                     h_side * (2 * L * H) * dt + \
-                     h_btm * (L * W) * dt
-
-            # radiation
-            Tsk = Ts + c_2_k
-            Tak = Ta + c_2_k
-            rad_correction = self.simulation.rad_coef * (Tsk - Tak) ** self.simulation.rad_pow
-            Cr = 2 * epsilon * sigma * (W * L + H * L + H * W) / rad_correction
-            q_rad = Cr * (Tsk ** 4 - Tak ** 4)
-
+            [q_conv, q_rad, htc] = quick_estimate.find_board_heat_out(general_dims, dt, Ta, self.simulation.conv_coef,
+                                                                      self.simulation.rad_coef,
+                                                                      self.simulation.rad_pow, self.htc_model)
             q_out = q_conv + q_rad
             q_error = q_tot - q_out
 
@@ -155,33 +109,18 @@ class Simultaneous:
                     print("Iteration limit on finding board temp")
                 break
 
-        self.htc = [h_top, h_side, h_btm]
+        self.htc = htc
         Ts = Ta + dt
         return Ts
 
     def get_general_board_dims(self):
-        board_L = self.board.mat_ht * self.simulation.resolution
-        board_W = self.board.mat_wid * self.simulation.resolution
         board_H = 0
         for layer in range(0, self.board.mat_dep):
             board_H += self.board.layers[layer].thickness
 
-        if self.simulation.board_orientation == [0, 0]:
-            L = board_L / 1000
-            W = board_W / 1000
-            H = board_H / 1000
-
-        elif self.simulation.board_orientation == [1, 0] or self.simulation.board_orientation == [-1, 0]:
-            L = board_H / 1000
-            W = board_W / 1000
-            H = board_L / 1000
-
-        elif self.simulation.board_orientation == [0, 1] or self.simulation.board_orientation == [0, -1]:
-            L = board_L / 1000
-            W = board_H / 1000
-            H = board_W / 1000
-
-        return [L, W, H]
+        return quick_estimate.find_general_board_dims(self.board.mat_wid * self.simulation.resolution,
+                                                      self.board.mat_ht * self.simulation.resolution, board_H,
+                                                      self.simulation.board_orientation)
 
     def find_total_board_q(self):
         q_cond = 0
@@ -198,55 +137,197 @@ class Simultaneous:
 
     def prepare_sparse_matrices(self):
         start_time = time.perf_counter()
-        self.s_vec = list()
-        for layer in range(0, self.grid_dims[0]):  # k direction
-            self.cell_dep = self.board.layers[layer].thickness
-            for col in range(0, self.grid_dims[2]):  # j direction
-                for row in range(0, self.grid_dims[1]):  # i direction
-                    this_board_coord = [layer, row, col]
-                    # empty list for neighboring cells - used to build matrix cell for self (sum of neighbor 'C's)
-                    self.neighbor_c_list = list()
-                    self.s_list = list()
-                    this_q = self._find_this_q(this_board_coord)
-
-                    self._handle_neighbors(this_board_coord)
-
-                    # handle self location in G matrix
-                    this_c = sum(self.neighbor_c_list)
-                    g_row_ind = row + col * self.board.mat_wid + layer * (self.board.mat_wid * self.board.mat_ht)
-                    self.g_row.append(g_row_ind)
-                    self.g_col.append(g_row_ind)
-                    self.g_data.append(this_c)
-                    this_s = sum(self.s_list) * self.simulation.ambient + this_q
-                    self.s_vec.append(this_s)
+
+        # conductance of every shared face, each face is only computed once
+        faces = self.find_face_conductances()
+        # conductance of every board edge / surface cell thru air, [direction][cell on that edge]
+        self.air_temp_grid = self.temp_mat
+        air_c = self.find_air_conductances(self.air_temp_grid)
+
+        # self location in G matrix is the sum of the neighbor 'C's, summed in neighbor direction order
+        g_diag = np.zeros(self.grid_dims)
+        s_air = np.zeros(self.grid_dims)
+        # conduction only part of the diagonal, kept for updating the air 'C's
+        self.g_diag_cond = np.zeros(self.grid_dims)
+        for which_dir, neighbor_dir in enumerate(NEIGHBOR_DIRS):
+            g_diag[self._interior_slice(neighbor_dir)] += faces[self._dir_axis(neighbor_dir)]
+            self.g_diag_cond[self._interior_slice(neighbor_dir)] += faces[self._dir_axis(neighbor_dir)]
+            g_diag[self._boundary_slice(neighbor_dir)] += air_c[which_dir]
+            s_air[self._boundary_slice(neighbor_dir)] += air_c[which_dir]
+
+        self.g_mat = self.build_g_matrix(g_diag, faces)
+        self.s_air = s_air
+        self.s_vec = self._grid_to_vec(s_air * self.simulation.ambient + self.find_q_stack())
 
         if self.simulation.show_process:
             print("Matrix prep time: " + str(time.perf_counter() - start_time))
 
-    def calc_component_heat(self):
+    def update_air_conductances(self, temp_grid):
+        # re-evaluate the convection/radiation 'C's at the given cell temperatures, only the G diagonal and the S
+        # entries of the board surface cells change, the conduction structure of G is reused
+        s_air = self.find_air_stack(temp_grid)
+        self.air_temp_grid = temp_grid
+
+        # copy so a solver holding the previous G keeps it unchanged
+        self.g_mat = self.g_mat.copy()
+        self.g_mat.setdiag(self._grid_to_vec(self.g_diag_cond + s_air))
+        self.s_air = s_air
+        self.s_vec = self._grid_to_vec(s_air * self.simulation.ambient + self.find_q_stack())
+
+    def update_sources(self, temp_grid=None):
+        # only the heat sources changed (layer Q_mat, component heats), G is unchanged so only S is rebuilt,
+        # temp_grid is the [layer, row, col] field the component heat split is found at (default the solution)
+        self.calc_component_heat(temp_grid=temp_grid)
+        self.s_vec = self._grid_to_vec(self.s_air * self.simulation.ambient + self.find_q_stack())
+
+    def build_g_matrix(self, g_diag, faces):
+        # node number is row + col * mat_wid + layer * (mat_wid * mat_ht), so each neighbor direction is one
+        # diagonal band of G, build the CSR arrays directly from the bands in column order
+        band_offsets = np.asarray([-self.board.mat_wid * self.board.mat_ht, -self.board.mat_wid, -1, 0,
+                                   1, self.board.mat_wid, self.board.mat_wid * self.board.mat_ht])
+        band_dirs = [[-1, 0, 0], [0, 0, -1], [0, -1, 0], None, [0, 1, 0], [0, 0, 1], [1, 0, 0]]
+
+        band_data = np.zeros(np.append(len(band_dirs), self.grid_dims))
+        band_used = np.zeros(np.shape(band_data), dtype=bool)
+        for band, neighbor_dir in enumerate(band_dirs):
+            if neighbor_dir is None:
+                band_data[band] = g_diag
+                band_used[band] = True
+            else:
+                band_data[band][self._interior_slice(neighbor_dir)] = -faces[self._dir_axis(neighbor_dir)]
+                band_used[band][self._interior_slice(neighbor_dir)] = True
+
+        band_data = np.transpose(band_data, (0, 1, 3, 2)).reshape(len(band_dirs), self.g_dim).T
+        band_used = np.transpose(band_used, (0, 1, 3, 2)).reshape(len(band_dirs), self.g_dim).T
+        band_cols = np.arange(self.g_dim).reshape(-1, 1) + band_offsets
+
+        g_indptr = np.append(0, np.cumsum(np.sum(band_used, axis=1)))
+        return csr_matrix((band_data[band_used], band_cols[band_used], g_indptr), shape=(self.g_dim, self.g_dim))
+
+    def find_q_stack(self):
+        # heat into each cell from conduction losses and component sources (q_cond = q_tot - q_conv - q_rad)
+        q_stack = np.asarray([layer.Q_mat for layer in self.board.layers], dtype=float)
+        q_stack[0] += self.q_components[0]
+        if self.board.mat_dep > 1:
+            q_stack[-1] += self.q_components[1]
+        return q_stack
+
+    def find_k_stack(self, axis):
+        # thermal conductivity of every cell along one axis (0: k, 1: i, 2: j) from its material
+        cond_stack = np.asarray([layer.cond_mat for layer in self.board.layers])
+        cond_k = np.asarray(self.board.cond_k) / self.simulation.cond_k_coef
+        sold_k = np.asarray(self.board.sold_k)
+        diel_k = np.asarray(self.board.diel_k) / self.simulation.diel_k_coef
+
+        return np.where(cond_stack > tracer.Cell.INSULATOR.value, cond_k[axis],
+                        np.where(cond_stack == tracer.Cell.AIR.value, sold_k[axis], diel_k[axis]))
+
+    def find_half_conductances(self):
+        # conductance from each cell center to its face, per axis, depth is half due to grid format
+        cell_deps = np.asarray([layer.thickness for layer in self.board.layers]).reshape(-1, 1, 1)
+        half_c = list()
+        for axis in range(0, 3):
+            if axis == 0:
+                area = self.cell_wid * self.cell_ht
+                depth = self.cell_wid / 2
+            else:
+                area = self.cell_wid * cell_deps
+                depth = cell_deps / 2
+            half_c.append(self.find_k_stack(axis) * area / depth)
+        return half_c
+
+    def find_face_conductances(self):
+        # series conductance across every shared face, [k faces, i faces, j faces]
+        half_c = self.find_half_conductances()
+        return [self.series_conductance(half_c[0][:-1, :, :], half_c[0][1:, :, :]),
+                self.series_conductance(half_c[1][:, :-1, :], half_c[1][:, 1:, :]),
+                self.series_conductance(half_c[2][:, :, :-1], half_c[2][:, :, 1:])]
+
+    def find_air_conductances(self, temp_grid):
+        # edge of board -> conv and rad thru air, one array of cells per direction in NEIGHBOR_DIRS
+        half_c = self.find_half_conductances()
+        cell_deps = np.asarray([layer.thickness for layer in self.board.layers]).reshape(-1, 1)
+        air_c = list()
+        for neighbor_dir in NEIGHBOR_DIRS:
+            edge = self._boundary_slice(neighbor_dir)
+            if neighbor_dir[0] != 0:
+                area = self.cell_wid * self.cell_ht
+            else:
+                area = self.cell_wid * cell_deps
+            conv_dir = self.get_conv_dir(neighbor_dir)
+            htc = self.get_htc(conv_dir, self.simulation.ambient, temp_grid[edge])
+            air_c.append(self.series_conductance(half_c[self._dir_axis(neighbor_dir)][edge], htc * area))
+        return air_c
+
+    def find_air_stack(self, temp_grid):
+        # sum of the air 'C's of every cell, zero for cells inside the board
+        air_c = self.find_air_conductances(temp_grid)
+        s_air = np.zeros(self.grid_dims)
+        for which_dir, neighbor_dir in enumerate(NEIGHBOR_DIRS):
+            s_air[self._boundary_slice(neighbor_dir)] += air_c[which_dir]
+        return s_air
+
+    def _dir_axis(self, neighbor_dir):
+        return int(np.flatnonzero(neighbor_dir)[0])
+
+    def _boundary_slice(self, neighbor_dir):
+        # cells which have air (no board cell) as their neighbor in this direction
+        edge = [slice(None), slice(None), slice(None)]
+        axis = self._dir_axis(neighbor_dir)
+        edge[axis] = 0 if neighbor_dir[axis] < 0 else -1
+        return tuple(edge)
+
+    def _interior_slice(self, neighbor_dir):
+        # cells which have a board cell as their neighbor in this direction
+        inside = [slice(None), slice(None), slice(None)]
+        axis = self._dir_axis(neighbor_dir)
+        inside[axis] = slice(1, None) if neighbor_dir[axis] < 0 else slice(None, -1)
+        return tuple(inside)
+
+    def close(self):
+        # stops the worker processes of the solver, if it has any (e.g. DomainDecompositionSolver)
+        close_solver = getattr(self.solver, 'close', None)
+        if close_solver is not None:
+            close_solver()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def initial_guess(self):
+        return self._grid_to_vec(self.temp_mat)
+
+    def _grid_to_vec(self, grid):
+        # [layer, row, col] grid to G matrix node order
+        return np.transpose(grid, (0, 2, 1)).ravel()
+
+    def _vec_to_grid(self, vec):
+        # G matrix node order to [layer, row, col] grid
+        return np.transpose(vec.reshape(self.grid_dims[0], self.grid_dims[2], self.grid_dims[1]), (0, 2, 1))
+
+    def _vec_to_temp_mat(self, t_vec):
+        return np.rot90(t_vec.reshape(self.grid_dims[0], self.grid_dims[2], self.grid_dims[1]), k=3, axes=(1, 2))
+
+    def calc_component_heat(self, component_heats=None, temp_grid=None):
+        # component_heats overrides component.heat, one value per board component (e.g. a transient load step)
         # total_components_heat = np.zeros_like(self.layers[0].Q_mat)
         self.q_components = np.zeros(np.append(2, np.shape(self.board.layers[0].Q_mat)))
-        for component in self.board.components:
+        # temp_mat is rotated after a solve, use the solution in [layer, row, col] order
+        if temp_grid is None and self.t_vec is not None:
+            temp_grid = self._vec_to_grid(self.t_vec)
+        elif temp_grid is None:
+            temp_grid = self.temp_mat
+        self.component_temp_grid = temp_grid
+        for which_component, component in enumerate(self.board.components):
             component_heat = np.zeros_like(self.board.layers[0].Q_mat)
-            # determine if top or bottom layer component
-            if component.side == 'Top':
-                related_layer = 0
-                conv_dir = self.get_conv_dir([-1, 0, 0])
+            if component_heats is None:
+                total_heat = component.heat
             else:
-                related_layer = len(self.board.layers) - 1
-                conv_dir = self.get_conv_dir([1, 0, 0])
-            # Find related layer cells which are conductor material (set)
-            related_cells = list()
-            cells_temps = list()
-            for row in range(ceil((component.x - component.width / 2) / self.simulation.resolution),
-                             ceil((component.x + component.width / 2) / self.simulation.resolution)):
-                for col in range(ceil((component.y - component.length / 2) / self.simulation.resolution),
-                                 ceil((component.y + component.length / 2) / self.simulation.resolution)):
-
-                    # assumes nearly all conduction is transferred through exposed conductor
-                    if self.board.layers[related_layer].cond_mat[row, col] > tracer.Cell.INSULATOR.value:
-                        related_cells.append([row, col])
-                        cells_temps.append(self.temp_mat[related_layer, row, col])
+                total_heat = component_heats[which_component]
+            [related_layer, conv_dir, related_cells] = self.find_component_cells(component)
+            cells_temps = [temp_grid[related_layer, row, col] for [row, col] in related_cells]
 
             # Find mean temperature of cells -> dT = T_mean - T_ambient
             temp_mean = np.average(np.asarray(cells_temps))
@@ -256,35 +337,51 @@ class Simultaneous:
             htc = self.get_htc(conv_dir, self.simulation.ambient, temp_mean) * self.simulation.comp_htc_coef
             heat_conv_rad = htc * component.width * component.length * delta_temp
             # the remaining heat is conductive heat into board, its heat is distributed to the set of layer cells
-            heat_cond = (component.heat - heat_conv_rad)
+            heat_cond = (total_heat - heat_conv_rad)
             heat_per_cell = heat_cond / len(related_cells)
 
             for related_cell in related_cells:
                 component_heat[related_cell[0], related_cell[1]] = heat_per_cell
             self.q_components[np.sign(related_layer)] += component_heat
 
+    def find_component_cells(self, component):
+        # top or bottom layer of the component, its convection direction and the conductor cells (set) under it
+        if component.side == 'Top':
+            related_layer = 0
+            conv_dir = self.get_conv_dir([-1, 0, 0])
+        else:
+            related_layer = len(self.board.layers) - 1
+            conv_dir = self.get_conv_dir([1, 0, 0])
+        related_cells = list()
+        for row in range(ceil((component.x - component.width / 2) / self.simulation.resolution),
+                         ceil((component.x + component.width / 2) / self.simulation.resolution)):
+            for col in range(ceil((component.y - component.length / 2) / self.simulation.resolution),
+                             ceil((component.y + component.length / 2) / self.simulation.resolution)):
+
+                # assumes nearly all conduction is transferred through exposed conductor
+                if self.board.layers[related_layer].cond_mat[row, col] > tracer.Cell.INSULATOR.value:
+                    related_cells.append([row, col])
+        return [related_layer, conv_dir, related_cells]
+
     def get_htc(self, orientation, temp_amb, temp_surf):
         htc_conv = 0
-        C2K = 273.16
 
-        # free convection
+        # convection, from the board level heat balance or at the surface temperature rise (works on arrays)
+        board_htc = self.htc
+        if self.local_htc:
+            delta_temp = np.maximum(np.asarray(temp_surf, dtype=float) - temp_amb, 0)
+            board_htc = [htc / self.simulation.conv_coef for htc in
+                         self.htc_model.find_htc(self.get_general_board_dims(), delta_temp, temp_amb)]
         if orientation == 'vertical':
-            htc_conv = self.htc[1]
+            htc_conv = board_htc[1]
         elif orientation == 'horizontal top':
-            htc_conv = self.htc[0]
+            htc_conv = board_htc[0]
         elif orientation == 'horizontal bottom':
-            htc_conv = self.htc[2]
+            htc_conv = board_htc[2]
 
         # radiation
-        Tsk = temp_surf + C2K
-        Tak = temp_amb + C2K
-        rad_correction = self.simulation.rad_coef * (Tsk - Tak) ** self.simulation.rad_pow
-
-        epsilon = 0.8  # assumed for solder mask (close to epoxy paint)
-        # Stefan Boltzmann Constant converted to W / (in^2 K^4)
-        sigma = 5.67 * 1e-8 / 1550
-        htc_rad = epsilon * sigma * ((Tsk) * (Tsk) + (Tak) * (Tak)) * (
-                (Tsk) + (Tak)) / rad_correction
+        htc_rad = air_properties.radiation_htc(temp_surf, temp_amb, self.simulation.rad_coef,
+                                               self.simulation.rad_pow)
         # unit of W / (mil^2 C), from W / (in^2 K)
         htc = (htc_conv + htc_rad) * 1e-6
 
@@ -294,75 +391,262 @@ class Simultaneous:
         if self.simulation.show_process:
             print("Solving simultaneous solution")
 
+        # the first solve uses the board level htc's
+        self.local_htc = False
         self.calc_component_heat()
 
         self.prepare_sparse_matrices()
-        g_mat = csr_matrix((np.asarray(self.g_data), (np.asarray(self.g_row), np.asarray(self.g_col))),
-                           shape=(len(self.s_vec), len(self.s_vec)))
 
         solve_start = time.perf_counter()
-        t_vec = np.transpose(spsolve(g_mat, np.asarray(self.s_vec)))
+        self.solver.prepare(self.g_mat)
+        # warm start from the last solution, or the initial board temperatures
+        if self.t_vec is not None:
+            t_guess = self.t_vec
+        else:
+            t_guess = self.initial_guess()
+        self.t_vec = self.solver.solve(self.s_vec, t_guess)
         if self.simulation.show_process:
             print("Matrix solve time: " + str(time.perf_counter() - solve_start))
+            print("Solver info: " + str(self.solver.info))
+        self.report_solver_convergence()
 
-        self.temp_mat = np.rot90(t_vec.reshape(self.grid_dims[0], self.grid_dims[2], self.grid_dims[1]),
-                                 k=3,  axes=(1, 2))
+        self.temp_mat = self._vec_to_temp_mat(self.t_vec)
         if self.simulation.show_process:
             print("Final mean temp:" + str(np.mean(self.temp_mat)))
 
-    def _handle_neighbors(self, board_coord):
-        # look in i-1 dir
-        neighbor_dir = [0, -1, 0]
-        self._neighbor_ij(board_coord, neighbor_dir)
-
-        # look in i+1 dir
-        neighbor_dir = [0, 1, 0]
-        self._neighbor_ij(board_coord, neighbor_dir)
-
-        # look in j-1 dir
-        neighbor_dir = [0, 0, -1]
-        self._neighbor_ij(board_coord, neighbor_dir)
+    def report_solver_convergence(self):
+        # iterative solvers only report convergence in their info
+        if self.simulation.show_process and self.solver.info.get('converged') is False:
+            print("Iterative solve did not converge, relative residual: " + str(self.solver.info.get('residual')))
 
-        # look in j+1 dir
-        neighbor_dir = [0, 0, 1]
-        self._neighbor_ij(board_coord, neighbor_dir)
+    def solve_sources(self):
+        # re-solve after a source only change (load currents, component heats), the prepared factorization or
+        # preconditioner of G is reused so this is a back-substitution (or a warm started CG)
+        if self.g_mat is None:
+            self.solve()
+            return
 
-        # look in k-1 dir
-        neighbor_dir = [-1, 0, 0]
-        self._neighbor_k(board_coord, neighbor_dir)
+        solve_start = time.perf_counter()
+        self.update_sources()
+        self.t_vec = self.solver.solve(self.s_vec, self.t_vec)
+        if self.simulation.show_process:
+            print("Matrix re-solve time: " + str(time.perf_counter() - solve_start))
+        self.report_solver_convergence()
 
-        # look in k+1 dir
-        neighbor_dir = [1, 0, 0]
-        self._neighbor_k(board_coord, neighbor_dir)
+        self.temp_mat = self._vec_to_temp_mat(self.t_vec)
+        if self.simulation.show_process:
+            print("Final mean temp:" + str(np.mean(self.temp_mat)))
 
-    def _find_this_q(self, coord):
+    def solve_nonlinear(self, max_iter=20, temp_tol=0.01, relaxation=1.0):
+        # Picard iteration: the air 'C's are evaluated at the initial mean board temperature by solve(), then
+        # re-evaluated from the latest cell temperatures until the temperatures stop changing, convection as well
+        # as radiation follows the temperature rise of every surface cell
+        self.solve()
+        self.local_htc = True
+
+        self.nonlinear_report = list()
+        converged = False
+        for iteration in range(1, max_iter + 1):
+            t_prev = self.t_vec
+            self.update_air_conductances(self._vec_to_grid(t_prev))
+
+            # reuses the factorization / preconditioner from solve()
+            t_new = self.solver.solve_modified(self.g_mat, self.s_vec, t_prev)
+            self.t_vec = t_prev + relaxation * (t_new - t_prev)
+
+            max_change = np.max(np.abs(self.t_vec - t_prev))
+            converged = max_change <= temp_tol
+            self.nonlinear_report.append({'iteration': iteration, 'max_change': max_change,
+                                          'max_temp': np.max(self.t_vec), 'mean_temp': np.mean(self.t_vec),
+                                          'solver_iterations': self.solver.info.get('iterations')})
+            if self.simulation.show_process:
+                print("Nonlinear iteration " + str(iteration) + ", max temp change: " + str(max_change))
+            if converged:
+                break
 
-        # find q from conduction losses
-        q_cond = self.board.layers[coord[0]].Q_mat[coord[1], coord[2]]
+        if not converged and self.simulation.show_process:
+            print("Iteration limit on nonlinear boundary update")
 
-        # find q from component source (q_cond = q_tot - q_conv - q_rad)
-        if coord[0] == 0:
-            q_component = self.q_components[0, coord[1], coord[2]]
-        elif coord[0] == self.board.mat_dep - 1:
-            q_component = self.q_components[1, coord[1], coord[2]]
-        else:
-            q_component = 0
+        self.temp_mat = self._vec_to_temp_mat(self.t_vec)
+        if self.simulation.show_process:
+            print("Final mean temp:" + str(np.mean(self.temp_mat)))
+        return self.nonlinear_report
+
+    def solve_electrothermal(self, max_iter=20, temp_tol=0.01, relaxation=1.0, update_air=False):
+        # coupled conduction losses: the copper resistivity of every cell follows its solved temperature, the
+        # losses are rescaled from the kept resistance maps (no path finding) and re-solved with the same G
+        # (a back-substitution), update_air also re-evaluates the air 'C's from the latest temperatures
+        self.solve()
+        self.local_htc = update_air
+
+        self.electrothermal_report = list()
+        converged = False
+        for iteration in range(1, max_iter + 1):
+            t_prev = self.t_vec
+            temp_grid = self._vec_to_grid(t_prev)
+            for which_layer, this_layer in enumerate(self.board.layers):
+                if len(this_layer.load_res_maps) > 0:
+                    this_layer.find_temp_cond_loss(temp_grid[which_layer])
+
+            if update_air:
+                self.update_air_conductances(temp_grid)
+                self.calc_component_heat(temp_grid=temp_grid)
+                self.s_vec = self._grid_to_vec(self.s_air * self.simulation.ambient + self.find_q_stack())
+                t_new = self.solver.solve_modified(self.g_mat, self.s_vec, t_prev)
+            else:
+                self.update_sources()
+                t_new = self.solver.solve(self.s_vec, t_prev)
+            self.t_vec = t_prev + relaxation * (t_new - t_prev)
+
+            max_change = np.max(np.abs(self.t_vec - t_prev))
+            converged = max_change <= temp_tol
+            self.electrothermal_report.append({'iteration': iteration, 'max_change': max_change,
+                                               'max_temp': np.max(self.t_vec),
+                                               'cond_loss': sum(np.sum(this_layer.Q_mat)
+                                                                for this_layer in self.board.layers)})
+            if self.simulation.show_process:
+                print("Electro-thermal iteration " + str(iteration) + ", max temp change: " + str(max_change))
+            if converged:
+                break
 
-        return q_cond + q_component
+        if not converged and self.simulation.show_process:
+            print("Iteration limit on electro-thermal coupling")
 
-    def get_area(self, neighbor_dir):
-        if neighbor_dir[0] != 0:
-            area = self.cell_wid * self.cell_ht
+        self.temp_mat = self._vec_to_temp_mat(self.t_vec)
+        if self.simulation.show_process:
+            print("Final mean temp:" + str(np.mean(self.temp_mat)))
+        return self.electrothermal_report
+
+    def find_target_weights(self, probe=None, region_delta=0.0):
+        # target temperature as weights on the cells, a probe [layer, x, y] in mil, or the mean of the cells within
+        # region_delta of the peak temperature (the hottest cell if 0)
+        temp_grid = self._vec_to_grid(self.t_vec)
+        weight_grid = np.zeros(self.grid_dims)
+        if probe is not None:
+            [probe_layer, probe_x, probe_y] = probe
+            weight_grid[probe_layer, int(probe_x / self.simulation.resolution),
+                        int(probe_y / self.simulation.resolution)] = 1
         else:
-            area = self.cell_wid * self.cell_dep
-        return area
-
-    def get_depth(self, neighbor_dir):
-        if neighbor_dir[0] == 0:
-            depth = self.cell_dep
+            region = temp_grid >= np.max(temp_grid) - region_delta
+            weight_grid[region] = 1 / np.count_nonzero(region)
+        return weight_grid
+
+    def find_sensitivities(self, probe=None, region_delta=0.0, coef_step=1e-3):
+        # adjoint sensitivities of a target temperature (see find_target_weights) at the last solution, one extra
+        # solve of G^T lambda = w with the prepared solver (G is symmetric), then dT_target / dq = lambda for every
+        # source, the air 'C's and component heat split are held at the temperatures they were evaluated at
+        if self.t_vec is None:
+            self.solve()
+        weight_grid = self.find_target_weights(probe, region_delta)
+        adjoint_vec = self.solve_adjoint(self._weights_to_vec(weight_grid))
+        adjoint_grid = self._adjoint_to_grid(adjoint_vec)
+
+        # electric loads, Q = I^2 * res_map
+        load_sens = dict()
+        for which_layer, this_layer in enumerate(self.board.layers):
+            for electric_load in this_layer.loads:
+                if electric_load.name not in this_layer.load_res_maps:
+                    continue
+                [network_region, region_res_mat] = this_layer.load_res_maps[electric_load.name]
+                lambda_res = np.sum(adjoint_grid[which_layer][network_region] * region_res_mat)
+                load_sens.setdefault(this_layer.name, dict())[electric_load.name] = \
+                    {'d_current': 2 * electric_load.current * lambda_res,
+                     'contribution': electric_load.current * electric_load.current * lambda_res}
+
+        return {'target_temp': np.sum(weight_grid * self._vec_to_grid(self.t_vec)), 'q_cells': adjoint_grid,
+                'loads': load_sens, 'components': self.find_component_sensitivities(adjoint_vec, adjoint_grid),
+                'tuning': self.find_tuning_sensitivities(adjoint_vec, coef_step)}
+
+    def find_component_sensitivities(self, adjoint_vec, adjoint_grid):
+        # component heat is spread evenly over its conductor cells
+        component_sens = dict()
+        for component in self.board.components:
+            [related_layer, conv_dir, related_cells] = self.find_component_cells(component)
+            d_heat = np.mean([adjoint_grid[related_layer, row, col] for [row, col] in related_cells])
+            component_sens[component.name] = {'d_heat': d_heat, 'contribution': d_heat * component.heat}
+        return component_sens
+
+    def solve_adjoint(self, weight_vec):
+        # G^T lambda = w with the prepared solver, in the node space of find_system
+        return self.solver.solve_modified(self.g_mat, weight_vec, None)
+
+    def _weights_to_vec(self, weight_grid):
+        # cell weights of a target temperature to node weights, the transpose of _vec_to_grid
+        return self._grid_to_vec(weight_grid)
+
+    def _adjoint_to_grid(self, adjoint_vec):
+        return self._vec_to_grid(adjoint_vec)
+
+    def _system_t_vec(self):
+        # solution in the node space of find_system
+        return self.t_vec
+
+    def find_tuning_sensitivities(self, adjoint_vec, coef_step=1e-3):
+        # dT_target / dp = -lambda^T (dG/dp T - dS/dp), the residual derivative by central differences of the
+        # (vectorized) assembly, the initial mean board temperature is held fixed, coef_step is relative and not too
+        # small since G is close to singular and round-off in T is amplified
+        tuning_sens = dict()
+        t_vec = self._system_t_vec()
+        for coef_name in TUNING_COEFS:
+            coef_val = self._get_tuning_coef(coef_name)
+            step = coef_step * max(abs(coef_val), 1)
+            self._set_tuning_coef(coef_name, coef_val + step)
+            [g_up, s_up] = self.find_system()
+            self._set_tuning_coef(coef_name, coef_val - step)
+            [g_down, s_down] = self.find_system()
+            self._set_tuning_coef(coef_name, coef_val)
+            # difference G before multiplying by T, G T alone is mostly cancellation
+            resid_diff = (g_up - g_down) @ t_vec - (s_up - s_down)
+            tuning_sens[coef_name] = -np.dot(adjoint_vec, resid_diff) / (2 * step)
+
+        # back to the solved component heat split
+        self.calc_component_heat(temp_grid=self.component_temp_grid)
+        return tuning_sens
+
+    def find_system(self):
+        # G and S assembled at the current coefficients, air 'C's and component heat split at the temperatures of
+        # the last solve, models with their own node space assemble their own
+        faces = self.find_face_conductances()
+        s_air = self.find_air_stack(self.air_temp_grid)
+        g_diag = np.copy(s_air)
+        for neighbor_dir in NEIGHBOR_DIRS:
+            g_diag[self._interior_slice(neighbor_dir)] += faces[self._dir_axis(neighbor_dir)]
+        g_mat = self.build_g_matrix(g_diag, faces)
+
+        self.calc_component_heat(temp_grid=self.component_temp_grid)
+        s_vec = self._grid_to_vec(s_air * self.simulation.ambient + self.find_q_stack())
+        return [g_mat, s_vec]
+
+    def _get_tuning_coef(self, coef_name):
+        if coef_name == 'cond_k_inplane':
+            return self.simulation.cond_k_coef[1]
+        elif coef_name == 'cond_k_thruplane':
+            return self.simulation.cond_k_coef[0]
+        elif coef_name == 'diel_k_inplane':
+            return self.simulation.diel_k_coef[1]
+        elif coef_name == 'diel_k_thruplane':
+            return self.simulation.diel_k_coef[0]
+        elif coef_name == 'component_htc':
+            return self.simulation.comp_htc_coef
+        return getattr(self.simulation, coef_name)
+
+    def _set_tuning_coef(self, coef_name, coef_val):
+        if coef_name == 'cond_k_inplane':
+            self.simulation.cond_k_coef = [self.simulation.cond_k_coef[0], coef_val, coef_val]
+        elif coef_name == 'cond_k_thruplane':
+            self.simulation.cond_k_coef = [coef_val] + list(self.simulation.cond_k_coef[1:])
+        elif coef_name == 'diel_k_inplane':
+            self.simulation.diel_k_coef = [self.simulation.diel_k_coef[0], coef_val, coef_val]
+        elif coef_name == 'diel_k_thruplane':
+            self.simulation.diel_k_coef = [coef_val] + list(self.simulation.diel_k_coef[1:])
+        elif coef_name == 'component_htc':
+            self.simulation.comp_htc_coef = coef_val
+        elif coef_name == 'conv_coef':
+            # the board level convection htc's are divided by conv_coef
+            self.htc = [htc * self.simulation.conv_coef / coef_val for htc in self.htc]
+            self.simulation.conv_coef = coef_val
         else:
-            depth = self.cell_wid
-        return depth
+            setattr(self.simulation, coef_name, coef_val)
 
     def get_conv_dir(self, neighbor_dir):
         conv_dir = 'vertical'
@@ -398,96 +682,141 @@ class Simultaneous:
 
         return conv_dir
 
-    def neighbor_c_air(self, coord, neighbor_dir):
-        area = self.get_area(neighbor_dir)
-        conv_dir = self.get_conv_dir(neighbor_dir)
-        htc = self.get_htc(conv_dir, self.simulation.ambient, self.temp_mat[coord[0], coord[1], coord[2]])
-        return htc * area
-
-    def neighbor_c_cond(self, coord, neighbor_dir):
-        k_coord = [coord[0] + neighbor_dir[0], coord[1] + neighbor_dir[1], coord[2] + neighbor_dir[2]]
 
-        neighbor_c = self.find_c_cond(k_coord, neighbor_dir)
-
-        return neighbor_c
-
-    def self_c_cond(self, coord, neighbor_dir):
-        k_coord = coord
-
-        self_c = self.find_c_cond(k_coord, neighbor_dir)
-
-        return self_c
-
-    def find_c_cond(self, coord, neighbor_dir):
-        this_k_cell_material = self.board.layers[coord[0]].cond_mat[coord[1], coord[2]]
-        if this_k_cell_material > tracer.Cell.INSULATOR.value:
-            this_k = np.sum(
-                np.fabs(np.asarray(neighbor_dir)) * np.asarray(self.board.cond_k) / self.simulation.cond_k_coef)
-        elif this_k_cell_material == tracer.Cell.AIR.value:
-            this_k = np.sum(np.fabs(np.asarray(neighbor_dir)) * np.asarray(self.board.sold_k))
+class Transient(Simultaneous):
+    # time stepping of C dT/dt + G T = S, theta = 1 is backward Euler, theta = 0.5 is Crank-Nicolson
+    # G (incl. air 'C's at the initial mean board temperature) is assembled the same way as the steady solution
+    def __init__(self, board, method='backward_euler', solver=None, htc_model=None):
+        super().__init__(board, solver, htc_model)
+        if method == 'backward_euler':
+            self.theta = 1.0
+        elif method == 'crank_nicolson':
+            self.theta = 0.5
         else:
-            this_k = np.sum(
-                np.fabs(np.asarray(neighbor_dir)) * np.asarray(self.board.diel_k) / self.simulation.diel_k_coef)
-        area = self.get_area(neighbor_dir)
-        # depth is half due to grid format
-        depth = self.get_depth(neighbor_dir) / 2
-
-        return this_k * area / depth
-
-    def _neighbor_ij(self, coord, neighbor_dir):
-        if neighbor_dir[1] != 0:
-            which_coord = 1
-            self_dir = [0, 1, 0]
-
-        else:
-            which_coord = 2
-            self_dir = [0, 0, 1]
-
-        # find self C
-        self_c = self.self_c_cond(coord, self_dir)
-
-        # if neighbor is air on border, add to S vector and G matrix
-        # edge of board -> conv and rad thru air
-        if (coord[which_coord] == 0 and neighbor_dir[which_coord] == -1) or (
-                coord[1] == (self.board.mat_wid - 1) and neighbor_dir[1] == 1) or (
-                coord[2] == (self.board.mat_ht - 1) and neighbor_dir[2] == 1):
-            neighbor_c = self.neighbor_c_air(coord, neighbor_dir)
-            dir_c = self.series_conductance(self_c, neighbor_c)
-            self.s_list.append(dir_c)
-            self.neighbor_c_list.append(dir_c)
-        else:
-            neighbor_c = self.neighbor_c_cond(coord, neighbor_dir)
-            dir_c = self.series_conductance(self_c, neighbor_c)
-            self.neighbor_c_list.append(dir_c)
-
-            g_row_ind = coord[1] + coord[2] * self.board.mat_wid + coord[0] * (self.board.mat_wid * self.board.mat_ht)
-            g_col_ind = g_row_ind + neighbor_dir[1] + neighbor_dir[2] * self.board.mat_wid
-            self.g_row.append(g_row_ind)
-            self.g_col.append(g_col_ind)
-            self.g_data.append(-dir_c)
-
-    def _neighbor_k(self, coord, neighbor_dir):
-        which_coord = 0
-        self_c = self.self_c_cond(coord, [1, 0, 0])
-
-        # if neighbor is air, add to S vector and G matrix
-        # edge of board -> conv and rad thru air
-        if (coord[which_coord] == 0 and neighbor_dir[which_coord] == -1) or (
-                coord[which_coord] == (self.board.mat_dep - 1) and neighbor_dir[which_coord] == 1):
-            neighbor_c = self.neighbor_c_air(coord, neighbor_dir)
-            dir_c = self.series_conductance(self_c, neighbor_c)
-            self.s_list.append(dir_c)
-            self.neighbor_c_list.append(dir_c)
-        # conduction thru board
-        # find neighbor C, then add to G matrix and nei_Cs
-        # assumes that holes are made is k direction so if this isn't an air cell, it's neighbor in k won't be either
-        else:
-            neighbor_c = self.neighbor_c_cond(coord, neighbor_dir)
-            dir_c = self.series_conductance(self_c, neighbor_c)
-            self.neighbor_c_list.append(dir_c)
-
-            g_row_ind = coord[1] + coord[2] * self.board.mat_wid + coord[0] * (self.board.mat_wid * self.board.mat_ht)
-            g_col_ind = g_row_ind + neighbor_dir[0] * (self.board.mat_wid * self.board.mat_ht)
-            self.g_row.append(g_row_ind)
-            self.g_col.append(g_col_ind)
-            self.g_data.append(-dir_c)
+            raise ValueError("Unknown time stepping method: " + str(method))
+        self.method = method
+
+        self.c_vec = None
+        # prepared solver of (C/dt + theta G) for every step size used
+        self.step_solvers = dict()
+
+    def find_capacity_stack(self):
+        # heat capacity of every cell [J/C] from its material, cell volume converted from mil^3 to in^3
+        cond_stack = np.asarray([layer.cond_mat for layer in self.board.layers])
+        cp_stack = np.where(cond_stack > tracer.Cell.INSULATOR.value, self.board.cond_cp,
+                            np.where(cond_stack == tracer.Cell.AIR.value, self.board.sold_cp, self.board.diel_cp))
+        cell_deps = np.asarray([layer.thickness for layer in self.board.layers]).reshape(-1, 1, 1)
+        return cp_stack * self.cell_wid * self.cell_ht * cell_deps * 1e-9
+
+    def prepare_transient(self):
+        self.calc_component_heat()
+        self.prepare_sparse_matrices()
+        self.c_vec = self._grid_to_vec(self.find_capacity_stack())
+        self.step_solvers = dict()
+
+    def get_step_solver(self, dt):
+        # factorize / precondition the stepping operator once per step size
+        if dt not in self.step_solvers:
+            step_solver = copy.copy(self.solver)
+            step_solver.prepare((diags(self.c_vec / dt) + self.theta * self.g_mat).tocsr())
+            self.step_solvers[dt] = step_solver
+        return self.step_solvers[dt]
+
+    def find_step_sources(self, time_s, current_profiles, heat_profiles, temp_grid):
+        # S vector at a time, load currents and component heats from their profiles (constant if not given)
+        q_stack = np.asarray([layer.Q_mat for layer in self.board.layers], dtype=float)
+        for which_layer, layer in enumerate(self.board.layers):
+            for electric_load in layer.loads:
+                if electric_load.name in current_profiles and electric_load.name in layer.load_res_maps:
+                    this_current = current_profiles[electric_load.name](time_s)
+                    # Q_mat holds the losses at the set current, replace them with the losses at this current
+                    [network_region, region_res_mat] = layer.load_res_maps[electric_load.name]
+                    q_stack[which_layer][network_region] += (this_current * this_current - electric_load.current *
+                                                             electric_load.current) * region_res_mat
+
+        component_heats = list()
+        for component in self.board.components:
+            if component.name in heat_profiles:
+                component_heats.append(heat_profiles[component.name](time_s))
+            else:
+                component_heats.append(component.heat)
+        self.calc_component_heat(component_heats, temp_grid)
+
+        q_stack[0] += self.q_components[0]
+        if self.board.mat_dep > 1:
+            q_stack[-1] += self.q_components[1]
+        return self._grid_to_vec(self.s_air * self.simulation.ambient + q_stack)
+
+    def steps(self, t_end, dt, current_profiles=None, heat_profiles=None, t_start_vec=None):
+        # generator of (time, temperature grid [layer, row, col]), only the current step is kept in memory
+        # profiles are dicts of load name / component name -> function of time [s] returning current / heat
+        if current_profiles is None:
+            current_profiles = dict()
+        if heat_profiles is None:
+            heat_profiles = dict()
+        if self.c_vec is None:
+            self.prepare_transient()
+
+        # board starts at ambient unless another starting temperature is given
+        if t_start_vec is None:
+            t_start_vec = np.ones(self.g_dim) * self.simulation.ambient
+        t_vec = np.asarray(t_start_vec, dtype=float)
+
+        step_solver = self.get_step_solver(dt)
+        time_s = 0.0
+        s_now = self.find_step_sources(time_s, current_profiles, heat_profiles, self._vec_to_grid(t_vec))
+        yield [time_s, self._vec_to_grid(t_vec)]
+
+        n_steps = int(ceil(t_end / dt - 1e-9))
+        for step in range(1, n_steps + 1):
+            time_s = step * dt
+            # component heat split uses the last known temperatures
+            s_next = self.find_step_sources(time_s, current_profiles, heat_profiles, self._vec_to_grid(t_vec))
+            rhs = self.c_vec / dt * t_vec + self.theta * s_next + (1 - self.theta) * s_now
+            if self.theta < 1:
+                rhs -= (1 - self.theta) * (self.g_mat @ t_vec)
+            t_vec = step_solver.solve(rhs, t_vec)
+            s_now = s_next
+            yield [time_s, self._vec_to_grid(t_vec)]
+
+        self.t_vec = t_vec
+        self.temp_mat = self._vec_to_temp_mat(t_vec)
+
+    def run(self, t_end, dt, current_profiles=None, heat_profiles=None, probes=None, field_file=None,
+            save_every=1):
+        # probes: dict of name -> [layer, x, y] board location in mil, their temperature history is returned
+        # field_file: .npy file the temperature grid of every save_every step is streamed to
+        if probes is None:
+            probes = dict()
+        probe_cells = dict()
+        for probe_name in probes:
+            [probe_layer, probe_x, probe_y] = probes[probe_name]
+            probe_cells[probe_name] = (probe_layer, int(probe_x / self.simulation.resolution),
+                                       int(probe_y / self.simulation.resolution))
+
+        n_frames = int(ceil(t_end / dt - 1e-9)) // save_every + 1
+        field_out = None
+        if field_file is not None:
+            field_out = np.lib.format.open_memmap(field_file, mode='w+', dtype=float,
+                                                  shape=tuple(int(dim) for dim in np.append(n_frames, self.grid_dims)))
+
+        history = {'time': list(), 'max_temp': list()}
+        for probe_name in probes:
+            history[probe_name] = list()
+
+        for step, [time_s, temp_grid] in enumerate(self.steps(t_end, dt, current_profiles, heat_profiles)):
+            history['time'].append(time_s)
+            history['max_temp'].append(np.max(temp_grid))
+            for probe_name in probe_cells:
+                history[probe_name].append(temp_grid[probe_cells[probe_name]])
+            if field_out is not None and step % save_every == 0:
+                field_out[step // save_every] = temp_grid
+            if self.simulation.show_process:
+                print("Time: " + str(time_s) + " s, max temp: " + str(np.max(temp_grid)))
+
+        if field_out is not None:
+            field_out.flush()
+
+        for history_name in history:
+            history[history_name] = np.asarray(history[history_name])
+        return history
@@ -1,9 +1,16 @@
+import os
 import numpy as np
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import current_density
 import current_tracing
+import res_cache
 import tracer
 
 mm_to_mil = 1000 / 25.4
+# cells around a network's bounding box kept in its region, the path end clipping looks up to two cells past the ends
+NETWORK_MARGIN = 2
 
 
 def get_board_dims(keep_out_lines):
@@ -83,6 +90,65 @@ def find_sig_digit(keep_out_lines):
             break
     return sig_dig
 
+def find_load_res_map(loss_model, path_start, path_end, network_map, thickness, cond_material, short_path,
+                      smooth_radius):
+    # resistance map of one load on its network region, a module function so it can run in a worker process
+    # pass in filtered matrix (map), start, end into current tracing for res_mat
+    # for a network with a load, use current tracing to find resistance of each cell.
+    if loss_model == 'path':
+        return current_tracing.set_res_values(path_start, path_end, network_map, thickness, cond_material, short_path,
+                                              smooth_radius)
+    return current_density.find_potential_res_map(path_start, path_end, network_map, thickness, cond_material)
+
+
+def run_loss_jobs(loss_jobs, n_workers=1, show_process=False, cache_dir=None):
+    # resistance maps of the loss jobs in job order, cached maps are used as they are, with n_workers > 1 (None for
+    # all cores) the other jobs run in a process pool and only the job arguments (network region, ends and path) are
+    # sent to the workers, new maps are added to the cache (and cache_dir if given)
+    region_res_mats = [cached_map for [electric_load, network_region, job_args, cache_key, cached_map] in loss_jobs]
+    run_jobs = [which_job for which_job in range(0, len(loss_jobs)) if region_res_mats[which_job] is None]
+    if show_process:
+        for which_job in range(0, len(loss_jobs)):
+            if region_res_mats[which_job] is not None:
+                print("Losses for load: " + loss_jobs[which_job][0].name + " (cached)")
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    n_workers = max(min(n_workers, len(run_jobs)), 1)
+    if n_workers == 1:
+        for which_job in run_jobs:
+            if show_process:
+                print("Losses for load: " + loss_jobs[which_job][0].name)
+            region_res_mats[which_job] = find_load_res_map(*loss_jobs[which_job][2])
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            job_futures = {executor.submit(find_load_res_map, *loss_jobs[which_job][2]): which_job
+                           for which_job in run_jobs}
+            for n_done, job_future in enumerate(as_completed(job_futures), 1):
+                which_job = job_futures[job_future]
+                region_res_mats[which_job] = job_future.result()
+                if show_process:
+                    print("Losses for load: " + loss_jobs[which_job][0].name + " (" + str(n_done) + " of " +
+                          str(len(run_jobs)) + ")")
+
+    for which_job in run_jobs:
+        region_res_mats[which_job] = res_cache.RES_MAP_CACHE.put(loss_jobs[which_job][3], region_res_mats[which_job],
+                                                                 cache_dir)
+    return region_res_mats
+
+
+def find_board_cond_loss(layers, n_workers=1, show_process=False, cache_dir=None):
+    # conduction losses of the loads of all the layers in one pool, results are applied in load order so they don't
+    # depend on the number of workers
+    layer_jobs = [this_layer.find_loss_jobs(cache_dir) for this_layer in layers]
+    region_res_mats = run_loss_jobs([loss_job for loss_jobs in layer_jobs for loss_job in loss_jobs], n_workers,
+                                    show_process, cache_dir)
+    first_job = 0
+    for [this_layer, loss_jobs] in zip(layers, layer_jobs):
+        this_layer.set_load_losses(loss_jobs, region_res_mats[first_job:first_job + len(loss_jobs)])
+        first_job = first_job + len(loss_jobs)
+
+
 class Layer:
     def __init__(self, name, layer_type, lines, cond_material, thickness_val, thickness_type, dims, simulation, loads):
         self.name = name
@@ -98,6 +164,9 @@ class Layer:
         self.res_mat = np.zeros(np.shape(self.cond_mat), dtype=float)
         self.Q_mat = np.zeros(np.shape(self.cond_mat), dtype=float)
         self.loads = loads
+        self.load_res_maps = dict()
+        # networks as they were before drilling, losses are always found on this geometry (None until drilled)
+        self.loss_cond_mat = None
 
         if not isinstance(lines, type(None)):
             self.sig_dig = find_sig_digit(lines)
@@ -245,6 +314,8 @@ class Layer:
         return thickness_rtn
 
     def find_networks(self):
+        # losses follow the newly found networks
+        self.loss_cond_mat = None
         # starting network ID is 1
         new_network_id = 1
         [n_rows, n_cols] = self.cond_mat.shape
@@ -292,12 +363,18 @@ class Layer:
                             net_add = 7
 
     def find_cond_loss(self):
-        cond_q_maps = []
-
+        loss_jobs = self.find_loss_jobs(self.simulation.res_cache_dir)
+        self.set_load_losses(loss_jobs, run_loss_jobs(loss_jobs, self.simulation.loss_workers,
+                                                      self.simulation.show_process, self.simulation.res_cache_dir))
+
+    def find_loss_jobs(self, cache_dir=None):
+        # [load, network region, find_load_res_map arguments, cache key, cached map or None] of every load whose ends
+        # are on the same network, paths are only searched for loads without a cached map
+        # the networks before any drilling, so the cache keys of a drilled layer match those of its first run
+        loss_cond_mat = self.cond_mat if self.loss_cond_mat is None else self.loss_cond_mat
         # for each load, find associated network
+        network_loads = dict()
         for electric_load in self.loads:
-            if self.simulation.show_process:
-                print("Losses for load: " + electric_load.name)
             # convert start and end locations to matrix coord
             path_start = [int(electric_load.path_start[0] / self.sim_res),
                           int(electric_load.path_start[1] / self.sim_res)]
@@ -305,24 +382,105 @@ class Layer:
                         int(electric_load.path_end[1] / self.sim_res)]
 
             # find which network is at start
-            this_network = self.cond_mat[path_start[0], path_start[1]]
+            this_network = loss_cond_mat[path_start[0], path_start[1]]
             # check that end is same network
-            end_network_check = self.cond_mat[path_end[0], path_end[1]]
+            end_network_check = loss_cond_mat[path_end[0], path_end[1]]
             if this_network == end_network_check:
-                # filter cond_mat to a matrix which only contains this network
-                network_map = np.where(self.cond_mat == this_network, 1, 0)
-                # pass in filtered matrix (map), start, end into current tracing for res_mat
-                # for a network with a load, use current tracing to find resistance of each cell.
-                # multiply the resistance by the current squared to get Q for cell
-                this_network_q_mat = electric_load.current * electric_load.current \
-                                     * current_tracing.set_res_values(path_start, path_end, network_map,
-                                                                      self.thickness, self.cond_material)
-                cond_q_maps.append(this_network_q_mat)
-
-        for this_q_map in cond_q_maps:
-            self.Q_mat = np.add(self.Q_mat, this_q_map)
+                network_loads.setdefault(this_network, []).append([electric_load, path_start, path_end])
+
+        if self.simulation.loss_model not in ['path', 'potential']:
+            raise ValueError("Unknown conduction loss model: " + str(self.simulation.loss_model))
+
+        # bounding box (with a small margin for the path end clipping) of every loaded network, in one pass over
+        # the layer, everything per network then works on its region only
+        network_ids = list(network_loads.keys())
+        [net_rows, net_cols] = np.nonzero(np.isin(loss_cond_mat, network_ids))
+        net_vals = loss_cond_mat[net_rows, net_cols]
+        network_regions = dict()
+        network_maps = dict()
+        for this_network in network_ids:
+            in_network = net_vals == this_network
+            network_regions[this_network] = self.find_network_region(net_rows[in_network], net_cols[in_network])
+            # filter cond_mat to a matrix which only contains this network
+            network_maps[this_network] = (loss_cond_mat[network_regions[this_network]] == this_network).astype(np.int8)
+
+        # the shortest paths of all loads on a network are found in one search, in region coordinates
+        load_paths = dict()
+        for this_network, this_network_loads in network_loads.items():
+            [row_region, col_region] = network_regions[this_network]
+            region_ends = [[[path_start[0] - row_region.start, path_start[1] - col_region.start],
+                            [path_end[0] - row_region.start, path_end[1] - col_region.start]]
+                           for [electric_load, path_start, path_end] in this_network_loads]
+            cache_keys = [res_cache.find_res_map_key(self.simulation.loss_model, region_start, region_end,
+                                                     network_maps[this_network], self.thickness, self.cond_material,
+                                                     self.simulation.smooth_radius)
+                          for [region_start, region_end] in region_ends]
+            cached_maps = [res_cache.RES_MAP_CACHE.get(cache_key, cache_dir) for cache_key in cache_keys]
+            search_loads = [which_load for which_load in range(0, len(this_network_loads))
+                            if cached_maps[which_load] is None]
+            short_paths = [None] * len(this_network_loads)
+            if self.simulation.loss_model == 'path' and len(search_loads) > 0:
+                search_paths = current_tracing.find_current_paths([region_ends[which_load] for which_load in
+                                                                   search_loads], network_maps[this_network])
+                for [which_load, short_path] in zip(search_loads, search_paths):
+                    short_paths[which_load] = short_path
+            for which_load, [electric_load, path_start, path_end] in enumerate(this_network_loads):
+                load_paths[id(electric_load)] = [this_network, region_ends[which_load][0], region_ends[which_load][1],
+                                                 short_paths[which_load], cache_keys[which_load],
+                                                 cached_maps[which_load]]
+
+        # only the region of the network and the path is shipped with each load
+        loss_jobs = list()
+        for electric_load in self.loads:
+            if id(electric_load) in load_paths:
+                [this_network, path_start, path_end, short_path, cache_key, cached_map] = \
+                    load_paths[id(electric_load)]
+                job_args = [self.simulation.loss_model, path_start, path_end, network_maps[this_network],
+                            self.thickness, self.cond_material, short_path, self.simulation.smooth_radius]
+                loss_jobs.append([electric_load, network_regions[this_network], job_args, cache_key, cached_map])
+        return loss_jobs
+
+    def set_load_losses(self, loss_jobs, region_res_mats):
+        # losses are rebuilt from scratch, e.g. when the load currents change
+        self.Q_mat = np.zeros(np.shape(self.cond_mat), dtype=float)
+        for [[electric_load, network_region, job_args, cache_key, cached_map], region_res_mat] in \
+                zip(loss_jobs, region_res_mats):
+            # resistance map doesn't depend on the current, kept for rescaling (e.g. transient loads) as
+            # [network region, map of the region] so Q_mat is only ever indexed by the region
+            self.load_res_maps[electric_load.name] = [network_region, region_res_mat]
+            self.Q_mat[network_region] += electric_load.current * electric_load.current * region_res_mat
+
+    def find_network_region(self, network_rows, network_cols):
+        # [row slice, col slice] of the network cells plus NETWORK_MARGIN cells, within the layer
+        [n_rows, n_cols] = np.shape(self.cond_mat)
+        row_region = slice(max(int(np.min(network_rows)) - NETWORK_MARGIN, 0),
+                           min(int(np.max(network_rows)) + 1 + NETWORK_MARGIN, n_rows))
+        col_region = slice(max(int(np.min(network_cols)) - NETWORK_MARGIN, 0),
+                           min(int(np.max(network_cols)) + 1 + NETWORK_MARGIN, n_cols))
+        return (row_region, col_region)
+
+    def scale_cond_loss(self):
+        # losses at the present load currents from the kept resistance maps, no path finding or re-tracing
+        self.Q_mat = np.zeros(np.shape(self.cond_mat), dtype=float)
+        for electric_load in self.loads:
+            if electric_load.name in self.load_res_maps:
+                [network_region, region_res_mat] = self.load_res_maps[electric_load.name]
+                self.Q_mat[network_region] += electric_load.current * electric_load.current * region_res_mat
+
+    def find_temp_cond_loss(self, temp_mat):
+        # losses with the resistivity of every cell at its temperature ([row, col] like Q_mat), from the kept
+        # resistance maps so no path finding is repeated
+        rho_scale = current_tracing.find_rho_scale(temp_mat, self.cond_material)
+        self.Q_mat = np.zeros(np.shape(self.cond_mat), dtype=float)
+        for electric_load in self.loads:
+            if electric_load.name in self.load_res_maps:
+                [network_region, region_res_mat] = self.load_res_maps[electric_load.name]
+                self.Q_mat[network_region] += electric_load.current * electric_load.current * region_res_mat * \
+                    rho_scale[network_region]
 
     def drill_holes(self, drill_layer):
+        if self.loss_cond_mat is None:
+            self.loss_cond_mat = np.copy(self.cond_mat)
         hole_cells = np.argwhere(drill_layer.hole_mat == tracer.Cell.AIR.value)
         plated_cells = np.argwhere(drill_layer.hole_mat == tracer.Cell.CONDUCTOR.value)
         for hole_cell in hole_cells:
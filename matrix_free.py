@@ -0,0 +1,102 @@
+import copy
+import time
+import numpy as np
+
+from scipy.sparse.linalg import LinearOperator
+
+import heat_transfer
+import thermal_solvers
+
+
+class StencilOperator(LinearOperator):
+    # the 7 point G operator applied from the face conductances with array slicing, no matrix is stored
+    # vectors are in G node order, row + col * mat_wid + layer * mat_wid * mat_ht, i.e. a [layer, col, row] array
+    def __init__(self, g_diag, faces):
+        # g_diag [layer, row, col] grid, faces [k faces, i faces, j faces] as from find_face_conductances
+        self.node_dims = (np.shape(g_diag)[0], np.shape(g_diag)[2], np.shape(g_diag)[1])
+        self.g_diag = np.ascontiguousarray(np.transpose(g_diag, (0, 2, 1)))
+        self.faces = [np.ascontiguousarray(np.transpose(face, (0, 2, 1))) for face in faces]
+        g_dim = int(np.prod(self.node_dims))
+        super().__init__(dtype=float, shape=(g_dim, g_dim))
+
+    def _matvec(self, x_vec):
+        t_arr = np.reshape(x_vec, self.node_dims)
+        y_arr = self.g_diag * t_arr
+        [face_k, face_i, face_j] = self.faces
+        # thru-plane (layer), in-plane rows (last axis), in-plane cols
+        y_arr[:-1] -= face_k * t_arr[1:]
+        y_arr[1:] -= face_k * t_arr[:-1]
+        y_arr[:, :, :-1] -= face_i * t_arr[:, :, 1:]
+        y_arr[:, :, 1:] -= face_i * t_arr[:, :, :-1]
+        y_arr[:, :-1, :] -= face_j * t_arr[:, 1:, :]
+        y_arr[:, 1:, :] -= face_j * t_arr[:, :-1, :]
+        return y_arr.reshape(np.shape(x_vec))
+
+    def _rmatvec(self, x_vec):
+        # G is symmetric
+        return self._matvec(x_vec)
+
+    def diagonal(self):
+        return self.g_diag.ravel()
+
+    def with_diagonal(self, g_diag):
+        # same faces (shared, not copied) with a new [layer, row, col] diagonal
+        new_op = copy.copy(self)
+        new_op.g_diag = np.ascontiguousarray(np.transpose(g_diag, (0, 2, 1)))
+        return new_op
+
+    def find_nbytes(self):
+        return self.g_diag.nbytes + sum(face.nbytes for face in self.faces)
+
+
+def build_layer_preconditioner(g_op):
+    # Jacobi plus a coarse correction with one constant per layer, G alone is close to singular in the mean
+    # temperature of each layer which Jacobi does not reduce, M^-1 = D^-1 + R^T (R G R^T)^-1 R
+    inv_diag = 1 / g_op.diagonal()
+    [face_k, face_i, face_j] = g_op.faces
+    n_layers = g_op.node_dims[0]
+    # R G R^T sums the block of G of every layer pair
+    coarse_mat = np.diag(np.sum(g_op.g_diag, axis=(1, 2)) - 2 * np.sum(face_i, axis=(1, 2)) -
+                         2 * np.sum(face_j, axis=(1, 2)))
+    layer_link = np.sum(face_k, axis=(1, 2))
+    coarse_mat[np.arange(n_layers - 1), np.arange(1, n_layers)] = -layer_link
+    coarse_mat[np.arange(1, n_layers), np.arange(n_layers - 1)] = -layer_link
+    coarse_inv = np.linalg.inv(coarse_mat)
+
+    def apply_two_level(r_vec):
+        r_arr = np.reshape(r_vec, (n_layers, -1))
+        coarse_corr = coarse_inv @ np.sum(r_arr, axis=1)
+        return (inv_diag.reshape(n_layers, -1) * r_arr + coarse_corr.reshape(-1, 1)).reshape(np.shape(r_vec))
+    return LinearOperator(g_op.shape, matvec=apply_two_level, dtype=float)
+
+
+class MatrixFreeSimultaneous(heat_transfer.Simultaneous):
+    # same model as Simultaneous, G is kept as its face conductances and applied inside CG (see StencilOperator)
+    # so memory is a few times the temperature field, only Krylov solvers can be used
+    def __init__(self, board, solver=None, htc_model=None):
+        if solver is None:
+            solver = thermal_solvers.ConjugateGradientSolver(preconditioner=build_layer_preconditioner)
+        super().__init__(board, solver, htc_model)
+
+    def prepare_sparse_matrices(self):
+        start_time = time.perf_counter()
+        faces = self.find_face_conductances()
+        self.air_temp_grid = self.temp_mat
+        s_air = self.find_air_stack(self.air_temp_grid)
+
+        self.g_diag_cond = np.zeros(self.grid_dims)
+        for neighbor_dir in heat_transfer.NEIGHBOR_DIRS:
+            self.g_diag_cond[self._interior_slice(neighbor_dir)] += faces[self._dir_axis(neighbor_dir)]
+        self.g_mat = StencilOperator(self.g_diag_cond + s_air, faces)
+        self.s_air = s_air
+        self.s_vec = self._grid_to_vec(s_air * self.simulation.ambient + self.find_q_stack())
+
+        if self.simulation.show_process:
+            print("Operator prep time: " + str(time.perf_counter() - start_time) + ", operator memory: " +
+                  str(self.g_mat.find_nbytes()))
+
+    def update_air_conductances(self, temp_grid):
+        self.s_air = self.find_air_stack(temp_grid)
+        self.air_temp_grid = temp_grid
+        self.g_mat = self.g_mat.with_diagonal(self.g_diag_cond + self.s_air)
+        self.s_vec = self._grid_to_vec(self.s_air * self.simulation.ambient + self.find_q_stack())
@@ -17,6 +17,24 @@ def get_k_values(material):
     return switch.get(material)
 
 
+def get_heat_capacity(material):
+    # volumetric heat capacity (density * specific heat) in J/(in^3 C)
+    switch = {
+        'Copper': 56.5,
+        'Aluminum': 39.7,
+        'Gold': 40.8,
+        'Silver': 40.5,
+        'Nickel': 64.7,
+        'Solder': 27.9,
+        'Epoxy': 25.6,
+        'Fr-4': 33.4,
+        'Polyamide': 25.4,
+        'ThermalCompound': 32.8
+    }
+
+    return switch.get(material)
+
+
 class Board:
     def __init__(self, layers, components, simulation, cond_material, diel_material):
         self.layers = layers
@@ -29,3 +47,6 @@ class Board:
         self.cond_k = get_k_values(self.cond_material)
         self.diel_k = get_k_values(self.diel_material)
         self.sold_k = get_k_values('Solder')
+        self.cond_cp = get_heat_capacity(self.cond_material)
+        self.diel_cp = get_heat_capacity(self.diel_material)
+        self.sold_cp = get_heat_capacity('Solder')
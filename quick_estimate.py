@@ -0,0 +1,96 @@
+import time
+
+from scipy.optimize import brentq
+
+import air_properties
+
+# smallest board temperature rise [C] considered, the radiation correction is singular at zero rise
+MIN_DELTA_TEMP = 1e-3
+
+
+def find_general_board_dims(board_width, board_height, board_thickness, orientation):
+    # board [width, height, thickness] in mils to [L, W, H] in inches with H the vertical side
+    board_L = board_height
+    board_W = board_width
+    board_H = board_thickness
+
+    if orientation == [0, 0]:
+        L = board_L / 1000
+        W = board_W / 1000
+        H = board_H / 1000
+
+    elif orientation == [1, 0] or orientation == [-1, 0]:
+        L = board_H / 1000
+        W = board_W / 1000
+        H = board_L / 1000
+
+    elif orientation == [0, 1] or orientation == [0, -1]:
+        L = board_L / 1000
+        W = board_H / 1000
+        H = board_W / 1000
+
+    else:
+        raise ValueError("Unknown board orientation: " + str(orientation))
+
+    return [L, W, H]
+
+
+def find_board_heat_out(general_dims, delta_temp, ambient, conv_coef, rad_coef, rad_pow, htc_model):
+    # heat [W] leaving the whole board at a uniform temperature rise, by convection and radiation
+    [L, W, H] = general_dims
+    [h_top, h_side, h_btm] = [htc / conv_coef for htc in htc_model.find_htc(general_dims, delta_temp, ambient)]
+    q_conv = h_top * (L * W) * delta_temp + \
+        h_side * (2 * W * H) * delta_temp + \
+        h_side * (2 * L * H) * delta_temp + \
+        h_btm * (L * W) * delta_temp
+
+    Tsk = ambient + delta_temp + air_properties.C_TO_K
+    Tak = ambient + air_properties.C_TO_K
+    rad_correction = rad_coef * (Tsk - Tak) ** rad_pow
+    Cr = 2 * air_properties.EPSILON * air_properties.SIGMA * (W * L + H * L + H * W) / rad_correction
+    q_rad = Cr * (Tsk ** 4 - Tak ** 4)
+
+    return [q_conv, q_rad, [h_top, h_side, h_btm]]
+
+
+def estimate_board_temp(general_dims, q_total, ambient, conv_coef=1.0, rad_coef=1.0, rad_pow=0.0, htc_model=None,
+                        temp_tol=1e-4):
+    # lumped board energy balance, the mean board temperature rise is bracketed between no rise and the top of the
+    # air property table then found with Brent's method, returns the mean temperature and the board level htc's
+    start_time = time.perf_counter()
+    if htc_model is None:
+        htc_model = air_properties.NaturalConvection()
+
+    def find_q_error(delta_temp):
+        [q_conv, q_rad, htc] = find_board_heat_out(general_dims, delta_temp, ambient, conv_coef, rad_coef, rad_pow,
+                                                   htc_model)
+        return float(q_total - q_conv - q_rad)
+
+    # film temperature limit of the air property table
+    max_delta_temp = 2 * (air_properties.TEMP_TABLE[-1] - ambient)
+    iterations = 0
+    if find_q_error(MIN_DELTA_TEMP) <= 0:
+        delta_temp = MIN_DELTA_TEMP
+    elif find_q_error(max_delta_temp) > 0:
+        raise ValueError("Board losses of " + str(q_total) + " W need a board temperature beyond the air property "
+                         "table, max temperature: " + str(ambient + max_delta_temp))
+    else:
+        [delta_temp, root_info] = brentq(find_q_error, MIN_DELTA_TEMP, max_delta_temp, xtol=temp_tol,
+                                         full_output=True)
+        iterations = root_info.iterations
+
+    [q_conv, q_rad, htc] = find_board_heat_out(general_dims, delta_temp, ambient, conv_coef, rad_coef, rad_pow,
+                                               htc_model)
+    return {'mean_temp': ambient + delta_temp, 'delta_temp': delta_temp,
+            'htc': [float(this_htc) for this_htc in htc], 'q_conv': float(q_conv), 'q_rad': float(q_rad),
+            'iterations': iterations, 'time': time.perf_counter() - start_time}
+
+
+def estimate_board_temps(board_dims_list, q_totals, ambient, orientation, conv_coef=1.0, rad_coef=1.0, rad_pow=0.0,
+                         htc_model=None):
+    # screen many configurations, board_dims_list is [width, height, thickness] in mils per configuration
+    estimates = list()
+    for [board_dims, q_total] in zip(board_dims_list, q_totals):
+        general_dims = find_general_board_dims(board_dims[0], board_dims[1], board_dims[2], orientation)
+        estimates.append(estimate_board_temp(general_dims, q_total, ambient, conv_coef, rad_coef, rad_pow, htc_model))
+    return estimates
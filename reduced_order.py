@@ -0,0 +1,200 @@
+import time
+import numpy as np
+
+
+class ReducedOrderModel:
+    # affine thermal model about a solved board, T = V C [1, p - p0] with parameters p = [load current^2 ...,
+    # component heat ..., ambient], V is an orthonormal (POD) basis of the board temperature fields, needs no Gerbers
+    def __init__(self, basis, coeffs, error_gram, param_ref, grid_dims, load_keys, component_names):
+        self.basis = basis
+        self.coeffs = coeffs
+        self.error_gram = error_gram
+        self.param_ref = param_ref
+        self.grid_dims = grid_dims
+        # [layer name, load name] of every load, then component names, then ambient
+        self.load_keys = [list(load_key) for load_key in load_keys]
+        self.component_names = list(component_names)
+
+    def find_params(self, currents=None, heats=None, ambient=None):
+        # currents: dict of (layer name, load name) -> current [A], heats: dict of component name -> heat [W],
+        # anything not given stays at the value the model was built at
+        params = np.copy(self.param_ref)
+        n_loads = len(self.load_keys)
+        if currents is not None:
+            for which_load, [layer_name, load_name] in enumerate(self.load_keys):
+                if (layer_name, load_name) in currents:
+                    params[which_load] = currents[(layer_name, load_name)] ** 2
+        if heats is not None:
+            for which_component, component_name in enumerate(self.component_names):
+                if component_name in heats:
+                    params[n_loads + which_component] = heats[component_name]
+        if ambient is not None:
+            params[-1] = ambient
+        return np.append(1, params - self.param_ref)
+
+    def evaluate(self, currents=None, heats=None, ambient=None):
+        # full field, same layout as Simultaneous.temp_mat
+        temp_grid = (self.basis @ (self.coeffs @ self.find_params(currents, heats, ambient))).reshape(self.grid_dims)
+        return np.rot90(np.transpose(temp_grid, (0, 2, 1)), k=3, axes=(1, 2))
+
+    def evaluate_cells(self, cells, currents=None, heats=None, ambient=None):
+        # temperatures of [layer, row, col] cells only, no full field is formed
+        cells = np.asarray(cells, dtype=int).reshape(-1, 3)
+        cell_nums = np.ravel_multi_index((cells[:, 0], cells[:, 1], cells[:, 2]), self.grid_dims)
+        return self.basis[cell_nums] @ (self.coeffs @ self.find_params(currents, heats, ambient))
+
+    def truncation_error(self, currents=None, heats=None, ambient=None):
+        # 2-norm of the POD truncation error over all cells, against the affine fields the model was built from
+        # only, the model error itself (the component heat split is frozen at the build solution) is not in it,
+        # see find_full_model_error for the error against the full model
+        params = self.find_params(currents, heats, ambient)
+        return np.sqrt(max(params @ self.error_gram @ params, 0))
+
+    def save(self, file_name):
+        np.savez_compressed(file_name, basis=self.basis, coeffs=self.coeffs, error_gram=self.error_gram,
+                            param_ref=self.param_ref, grid_dims=np.asarray(self.grid_dims),
+                            load_keys=np.asarray(self.load_keys, dtype=str).reshape(-1, 2),
+                            component_names=np.asarray(self.component_names, dtype=str))
+
+
+def load_reduced_model(file_name):
+    with np.load(file_name, allow_pickle=False) as model_data:
+        return ReducedOrderModel(model_data['basis'], model_data['coeffs'], model_data['error_gram'],
+                                 model_data['param_ref'], tuple(int(dim) for dim in model_data['grid_dims']),
+                                 model_data['load_keys'].tolist(), model_data['component_names'].tolist())
+
+
+def find_full_model_error(heat_transfer_analysis, model, currents=None, heats=None, ambient=None):
+    # error field of the model against the full model at the parameters (same layout as temp_mat), one full
+    # solve with the prepared G of the sources at the model solution, S(T_rom), less the model solution, so the
+    # component heat split is re-evaluated like solve_sources, the board and simulation are restored afterwards
+    if heat_transfer_analysis.t_vec is None:
+        heat_transfer_analysis.solve()
+    board = heat_transfer_analysis.board
+    simulation = heat_transfer_analysis.simulation
+    loads = [electric_load for this_layer in board.layers for electric_load in this_layer.loads]
+    load_currents = [electric_load.current for electric_load in loads]
+    q_mats = [this_layer.Q_mat for this_layer in board.layers]
+    component_heats = [component.heat for component in board.components]
+    simulation_ambient = simulation.ambient
+    try:
+        for this_layer in board.layers:
+            for electric_load in this_layer.loads:
+                if currents is not None and (this_layer.name, electric_load.name) in currents:
+                    electric_load.current = currents[(this_layer.name, electric_load.name)]
+            this_layer.scale_cond_loss()
+        for component in board.components:
+            if heats is not None and component.name in heats:
+                component.heat = heats[component.name]
+        if ambient is not None:
+            simulation.ambient = ambient
+
+        temp_grid = (model.basis @ (model.coeffs @ model.find_params(currents, heats, ambient))).reshape(
+            model.grid_dims)
+        heat_transfer_analysis.update_sources(temp_grid)
+        t_vec = heat_transfer_analysis.solver.solve_modified(heat_transfer_analysis.g_mat,
+                                                             heat_transfer_analysis.s_vec, None)
+        error_grid = heat_transfer_analysis._vec_to_grid(t_vec) - temp_grid
+        return np.rot90(np.transpose(error_grid, (0, 2, 1)), k=3, axes=(1, 2))
+    finally:
+        for [which_load, electric_load] in enumerate(loads):
+            electric_load.current = load_currents[which_load]
+        for [which_layer, this_layer] in enumerate(board.layers):
+            this_layer.Q_mat = q_mats[which_layer]
+        for [which_component, component] in enumerate(board.components):
+            component.heat = component_heats[which_component]
+        simulation.ambient = simulation_ambient
+        heat_transfer_analysis.update_sources()
+
+
+def build_reduced_model(heat_transfer_analysis, rank_tol=1e-10):
+    # one solve per parameter with the prepared G (T is affine in the sources), the solved field and these
+    # parameter fields are then compressed by POD (thin SVD), rank_tol is relative to the largest singular value
+    start_time = time.perf_counter()
+    if heat_transfer_analysis.t_vec is None:
+        heat_transfer_analysis.solve()
+    board = heat_transfer_analysis.board
+    simulation = heat_transfer_analysis.simulation
+
+    load_keys = list()
+    param_ref = list()
+    for this_layer in board.layers:
+        for electric_load in this_layer.loads:
+            if electric_load.name in this_layer.load_res_maps:
+                load_keys.append([this_layer.name, electric_load.name])
+                param_ref.append(electric_load.current ** 2)
+    component_names = [component.name for component in board.components]
+    param_ref.extend([component.heat for component in board.components])
+    param_ref.append(simulation.ambient)
+
+    # parameter fields are solves of the change in S per unit parameter, with the prepared G
+    q_mats = [this_layer.Q_mat for this_layer in board.layers]
+    component_heats = [component.heat for component in board.components]
+    fields = [heat_transfer_analysis._vec_to_grid(heat_transfer_analysis.t_vec).ravel()]
+
+    def solve_source_change(s_from):
+        heat_transfer_analysis.update_sources()
+        t_vec = heat_transfer_analysis.solver.solve_modified(heat_transfer_analysis.g_mat,
+                                                             heat_transfer_analysis.s_vec - s_from, None)
+        return heat_transfer_analysis._vec_to_grid(t_vec).ravel()
+
+    def set_sources(layer_q_mats, heats):
+        for [which_layer, this_layer] in enumerate(board.layers):
+            this_layer.Q_mat = layer_q_mats[which_layer]
+        for [which_component, component] in enumerate(board.components):
+            component.heat = heats[which_component]
+
+    ambient = simulation.ambient
+    try:
+        no_q_mats = [np.zeros_like(q_mat) for q_mat in q_mats]
+        no_heats = [0] * len(board.components)
+        set_sources(no_q_mats, no_heats)
+        heat_transfer_analysis.update_sources()
+        s_zero = heat_transfer_analysis.s_vec
+
+        # loads, Q = I^2 res_map
+        for [layer_name, load_name] in load_keys:
+            load_q_mats = list()
+            for this_layer in board.layers:
+                load_q_mat = np.zeros_like(this_layer.Q_mat)
+                if this_layer.name == layer_name:
+                    [network_region, region_res_mat] = this_layer.load_res_maps[load_name]
+                    load_q_mat[network_region] = region_res_mat
+                load_q_mats.append(load_q_mat)
+            set_sources(load_q_mats, no_heats)
+            fields.append(solve_source_change(s_zero))
+
+        # component heats, the heat split into the board is linear in the heat
+        for which_component in range(0, len(board.components)):
+            unit_heats = list(no_heats)
+            unit_heats[which_component] = 1
+            set_sources(no_q_mats, unit_heats)
+            fields.append(solve_source_change(s_zero))
+
+        # ambient, about the solved state
+        set_sources(q_mats, component_heats)
+        heat_transfer_analysis.update_sources()
+        s_ref = heat_transfer_analysis.s_vec
+        simulation.ambient = ambient + 1
+        fields.append(solve_source_change(s_ref))
+    finally:
+        # the board sources and ambient are restored even if a solve fails
+        set_sources(q_mats, component_heats)
+        simulation.ambient = ambient
+        heat_transfer_analysis.update_sources()
+
+    # affine model T = A [1, p - p0], so the solved field is the first column
+    field_mat = np.asarray(fields).T
+    [basis, sing_vals, right_vecs] = np.linalg.svd(field_mat, full_matrices=False)
+    rank = max(int(np.count_nonzero(sing_vals > rank_tol * sing_vals[0])), 1)
+    basis = basis[:, :rank]
+    coeffs = sing_vals[:rank].reshape(-1, 1) * right_vecs[:rank]
+    trunc_error = field_mat - basis @ coeffs
+    error_gram = trunc_error.T @ trunc_error
+
+    if simulation.show_process:
+        print("Reduced model: rank " + str(rank) + " of " + str(len(fields)) + " fields, time: " +
+              str(time.perf_counter() - start_time))
+
+    return ReducedOrderModel(basis, coeffs, error_gram, np.asarray(param_ref, dtype=float),
+                             tuple(int(dim) for dim in heat_transfer_analysis.grid_dims), load_keys, component_names)
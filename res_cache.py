@@ -0,0 +1,68 @@
+import hashlib
+import os
+import numpy as np
+
+from collections import OrderedDict
+
+# resistance maps kept in memory, the least recently used is dropped first
+MAX_MEMORY_MAPS = 256
+
+
+def find_res_map_key(loss_model, path_start, path_end, network_map, thickness, cond_material, smooth_radius):
+    # hash of everything a load resistance map depends on, the network region geometry, the load ends in region
+    # coordinates and the layer / simulation settings, the load current is not part of it
+    key_hash = hashlib.sha256()
+    key_hash.update(np.ascontiguousarray(np.asarray(network_map) == 1).tobytes())
+    key_hash.update(repr([list(np.shape(network_map)), str(loss_model), [int(path_start[0]), int(path_start[1])],
+                          [int(path_end[0]), int(path_end[1])], float(thickness), str(cond_material),
+                          int(smooth_radius)]).encode())
+    return key_hash.hexdigest()
+
+
+class ResMapCache:
+    # unscaled (per current squared) load resistance maps by key, in memory and in cache_dir when one is given
+    def __init__(self, max_maps=MAX_MEMORY_MAPS):
+        self.max_maps = max_maps
+        self.maps = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, cache_dir=None):
+        if key in self.maps:
+            self.maps.move_to_end(key)
+            self.hits = self.hits + 1
+            return self.maps[key]
+        if cache_dir is not None:
+            map_file = os.path.join(cache_dir, key + '.npy')
+            if os.path.isfile(map_file):
+                self.hits = self.hits + 1
+                return self.add_map(key, np.load(map_file, allow_pickle=False))
+        self.misses = self.misses + 1
+        return None
+
+    def put(self, key, res_map, cache_dir=None):
+        res_map = self.add_map(key, np.array(res_map, dtype=float))
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # written under a temporary name first so a partly written file is never loaded
+            temp_file = os.path.join(cache_dir, key + '.' + str(os.getpid()) + '.tmp.npy')
+            np.save(temp_file, res_map, allow_pickle=False)
+            os.replace(temp_file, os.path.join(cache_dir, key + '.npy'))
+        return res_map
+
+    def add_map(self, key, res_map):
+        # cached maps are shared, so they are made read only
+        res_map.flags.writeable = False
+        self.maps[key] = res_map
+        self.maps.move_to_end(key)
+        while len(self.maps) > self.max_maps:
+            self.maps.popitem(last=False)
+        return res_map
+
+    def clear(self):
+        self.maps.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+RES_MAP_CACHE = ResMapCache()
@@ -0,0 +1,158 @@
+import copy
+import time
+import numpy as np
+
+from scipy.sparse import diags
+
+import heat_transfer
+
+
+def find_lumpable_layers(board):
+    # inner layers without traced copper or losses, only dielectric (and drilled / plated holes)
+    lumpable = list()
+    for which_layer in range(1, board.mat_dep - 1):
+        this_layer = board.layers[which_layer]
+        if this_layer.layer_type != 'Conductor' and not np.any(this_layer.Q_mat):
+            lumpable.append(which_layer)
+    return lumpable
+
+
+class LumpedStackSimultaneous(heat_transfer.Simultaneous):
+    # homogeneous inner dielectric layers keep only their thru-plane conduction (in-plane is negligible next to the
+    # copper layers), their cells are then eliminated so the layers become thru-plane links between their neighbors
+    def __init__(self, board, solver=None, lump_layers=None, htc_model=None):
+        super().__init__(board, solver, htc_model)
+        if lump_layers is None:
+            lump_layers = find_lumpable_layers(board)
+        self.lump_layers = list(lump_layers)
+        self.reduced_dim = self.g_dim
+        self.g_full = None
+        self.s_full = None
+        self.kept_nodes = np.arange(self.g_dim)
+        self.elim_steps = list()
+
+        if self.simulation.show_process:
+            print("Lumped layers: " + str([self.board.layers[which].name for which in self.lump_layers]))
+
+    def find_face_conductances(self):
+        faces = super().find_face_conductances()
+        for which_layer in self.lump_layers:
+            faces[1][which_layer] = 0
+            faces[2][which_layer] = 0
+        return faces
+
+    def prepare_sparse_matrices(self):
+        super().prepare_sparse_matrices()
+        self.g_full = self.g_mat
+        self.s_full = self.s_vec
+        self.reduce_system()
+
+    def reduce_system(self):
+        # eliminate one lumped layer at a time, a layer's cells only connect thru-plane so its block of G is diagonal
+        start_time = time.perf_counter()
+        layer_cells = self.board.mat_wid * self.board.mat_ht
+        g_mat = self.g_full.tocsr()
+        g_mat.eliminate_zeros()
+        current_nodes = np.arange(self.g_dim)
+        self.elim_steps = list()
+
+        for which_layer in self.lump_layers:
+            in_layer = current_nodes // layer_cells == which_layer
+            keep = np.flatnonzero(np.logical_not(in_layer))
+            elim = np.flatnonzero(in_layer)
+
+            g_ke = g_mat[keep][:, elim]
+            d_inv = 1 / g_mat.diagonal()[elim]
+            g_mat = (g_mat[keep][:, keep] - g_ke @ diags(d_inv) @ g_ke.T).tocsr()
+
+            self.elim_steps.append({'keep': keep, 'elim': elim, 'g_ke': g_ke, 'd_inv': d_inv})
+            current_nodes = current_nodes[keep]
+
+        self.kept_nodes = current_nodes
+        self.g_mat = g_mat
+        self.reduced_dim = len(current_nodes)
+        self.s_vec = self.reduce_sources(self.s_full)
+
+        if self.simulation.show_process:
+            print("Stack reduction: " + str(self.reduced_dim) + " of " + str(self.g_dim) + " unknowns, time: " +
+                  str(time.perf_counter() - start_time))
+
+    def reduce_sources(self, s_vec):
+        [s_vec, elim_sources] = self.reduce_vec(s_vec)
+        for [elim_step, s_elim] in zip(self.elim_steps, elim_sources):
+            elim_step['s_elim'] = s_elim
+        return s_vec
+
+    def reduce_vec(self, s_vec):
+        # full stack right hand side to the reduced one, and the eliminated layer parts of every step
+        elim_sources = list()
+        for elim_step in self.elim_steps:
+            s_elim = s_vec[elim_step['elim']]
+            elim_sources.append(s_elim)
+            s_vec = s_vec[elim_step['keep']] - elim_step['g_ke'] @ (elim_step['d_inv'] * s_elim)
+        return [s_vec, elim_sources]
+
+    def expand_solution(self, t_vec):
+        return self.expand_vec(t_vec, [elim_step['s_elim'] for elim_step in self.elim_steps])
+
+    def expand_vec(self, t_vec, elim_sources):
+        # back-substitute the lumped layer temperatures, last eliminated first
+        for [elim_step, s_elim] in zip(reversed(self.elim_steps), reversed(elim_sources)):
+            t_prev = np.zeros(len(elim_step['keep']) + len(elim_step['elim']))
+            t_prev[elim_step['keep']] = t_vec
+            t_prev[elim_step['elim']] = elim_step['d_inv'] * (s_elim - elim_step['g_ke'].T @ t_vec)
+            t_vec = t_prev
+        return t_vec
+
+    def solve_adjoint(self, weight_vec):
+        # the full stack G (find_system) with the reduced solve, the solution's eliminated parts are kept
+        [weight_red, elim_sources] = self.reduce_vec(weight_vec)
+        return self.expand_vec(self.solver.solve_modified(self.g_mat, weight_red, None), elim_sources)
+
+    def _adjoint_to_grid(self, adjoint_vec):
+        # the adjoint is over the full stack already
+        return heat_transfer.Simultaneous._vec_to_grid(self, adjoint_vec)
+
+    def _system_t_vec(self):
+        return self.expand_solution(self.t_vec)
+
+    def update_air_conductances(self, temp_grid):
+        self.g_mat = self.g_full
+        super().update_air_conductances(temp_grid)
+        self.g_full = self.g_mat
+        self.s_full = self.s_vec
+        self.reduce_system()
+
+    def update_sources(self, temp_grid=None):
+        super().update_sources(temp_grid)
+        self.s_full = self.s_vec
+        self.s_vec = self.reduce_sources(self.s_full)
+
+    def initial_guess(self):
+        return super().initial_guess()[self.kept_nodes]
+
+    def _vec_to_grid(self, vec):
+        return super()._vec_to_grid(self.expand_solution(vec))
+
+    def _vec_to_temp_mat(self, t_vec):
+        return super()._vec_to_temp_mat(self.expand_solution(t_vec))
+
+    def report_against_full(self):
+        # solve the full stack with the same solver settings and compare, a copy of the solver so its own
+        # factorization / preconditioner of the lumped G is kept
+        if self.t_vec is None:
+            self.solve()
+        full_model = heat_transfer.Simultaneous(self.board, copy.copy(self.solver), self.htc_model)
+        full_start = time.perf_counter()
+        full_model.solve()
+        full_time = time.perf_counter() - full_start
+
+        temp_diff = self.temp_mat - full_model.temp_mat
+        report = {'lumped_layers': [self.board.layers[which].name for which in self.lump_layers],
+                  'unknowns': self.reduced_dim, 'full_unknowns': full_model.g_dim,
+                  'max_temp': np.max(self.temp_mat), 'full_max_temp': np.max(full_model.temp_mat),
+                  'max_abs_diff': np.max(np.abs(temp_diff)), 'mean_abs_diff': np.mean(np.abs(temp_diff)),
+                  'full_solve_time': full_time}
+        if self.simulation.show_process:
+            print("Lumped vs full model: " + str(report))
+        return report
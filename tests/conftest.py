@@ -0,0 +1,67 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# the modules are at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import current_tracing
+import layer
+import pcb_board
+import res_cache
+import tracer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def build_test_board(n_layers=3, orientation=(0, 0)):
+    # 600 x 400 mil board at 10 mil cells, conductor layers with one load along a trace with a branch and a pad,
+    # dielectric layers in between, a hole thru every layer and a component on each side
+    simulation = tracer.Simulation(10, 25.0, list(orientation), False, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 0.0, 1.0)
+    layers = list()
+    for which_layer in range(0, n_layers):
+        layer_type = 'Conductor' if which_layer % 2 == 0 else 'Dielectric'
+        loads = list()
+        if layer_type == 'Conductor':
+            loads = [current_tracing.ElectricLoad('L' + str(which_layer), 5.0 + which_layer, [55, 105], [505, 105])]
+        this_layer = layer.Layer('layer' + str(which_layer), layer_type, None, 'Copper',
+                                 1.4 if layer_type == 'Conductor' else 10.0, 'mil', [600, 400], simulation, loads)
+        if layer_type == 'Conductor':
+            tracer.trace_line(this_layer.cond_mat, 50, 100, 520, 100, 15, 10, tracer.Cell.CONDUCTOR.value)
+            tracer.trace_line(this_layer.cond_mat, 300, 100, 300, 330, 25, 10, tracer.Cell.CONDUCTOR.value)
+            tracer.trace_rectangle(this_layer.cond_mat, 450, 300, 100, 60, 10, tracer.Cell.CONDUCTOR.value)
+            this_layer.find_networks()
+            this_layer.find_cond_loss()
+        this_layer.cond_mat[20:22, 30:32] = tracer.Cell.AIR.value
+        layers.append(this_layer)
+    components = [tracer.Component('U1', [60, 40], [450, 300], 0.5, 'Top'),
+                  tracer.Component('U2', [40, 40], [300, 250], 0.2, 'Bottom')]
+    return pcb_board.Board(layers, components, simulation, 'Copper', 'Fr-4')
+
+
+def drill_board(board):
+    # a plated hole thru the trace of every layer
+    class Drill:
+        pass
+    drill = Drill()
+    drill.hole_mat = np.zeros_like(board.layers[0].cond_mat)
+    drill.hole_mat[20:23, 8:11] = tracer.Cell.CONDUCTOR.value
+    drill.hole_mat[21, 9] = tracer.Cell.AIR.value
+    for this_layer in board.layers:
+        this_layer.drill_holes(drill)
+
+
+@pytest.fixture
+def board():
+    res_cache.RES_MAP_CACHE.clear()
+    return build_test_board()
+
+
+@pytest.fixture(scope='session')
+def baseline():
+    # temp_mat, layer Q_mat and cond_mat of build_test_board solved with the original (loop based) assembly
+    # and path tracing, before any of the optimized paths
+    with np.load(os.path.join(DATA_DIR, 'baseline_board.npz')) as baseline_data:
+        return {name: baseline_data[name] for name in baseline_data.files}
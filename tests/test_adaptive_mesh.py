@@ -0,0 +1,37 @@
+import numpy as np
+
+import adaptive_mesh
+import heat_transfer
+
+
+def test_single_cell_blocks_match_uniform_grid(board):
+    uniform_analysis = heat_transfer.Simultaneous(board)
+    uniform_analysis.solve()
+    analysis = adaptive_mesh.AdaptiveSimultaneous(board, max_block=1)
+    assert analysis.g_dim == uniform_analysis.g_dim
+    analysis.solve()
+    np.testing.assert_allclose(analysis.temp_mat, uniform_analysis.temp_mat, rtol=1e-10, atol=0)
+
+
+def test_blocks_reduce_unknowns_and_stay_close(board):
+    uniform_analysis = heat_transfer.Simultaneous(board)
+    uniform_analysis.solve()
+    analysis = adaptive_mesh.AdaptiveSimultaneous(board)
+    assert analysis.g_dim < uniform_analysis.g_dim / 2
+    analysis.solve()
+    temp_rise = np.max(uniform_analysis.temp_mat) - board.simulation.ambient
+    assert np.max(np.abs(analysis.temp_mat - uniform_analysis.temp_mat)) < 0.02 * temp_rise
+
+
+def test_quadtree_covers_every_cell_once():
+    class_stack = np.zeros([2, 10, 12], dtype=int)
+    class_stack[0, 2:4, 5:9] = 1
+    refine = np.zeros([10, 12], dtype=bool)
+    refine[7, 1] = True
+    [leaf_label, leaves] = adaptive_mesh.build_quadtree(class_stack, refine, 4)
+    assert np.sum(leaves[:, 2] ** 2) == 10 * 12
+    for [which_leaf, [row, col, size]] in enumerate(leaves):
+        assert np.all(leaf_label[row:row + size, col:col + size] == which_leaf)
+        # a block is one material in every layer
+        assert np.ptp(class_stack[:, row:row + size, col:col + size], axis=(1, 2)).max() == 0
+    assert leaves[leaf_label[7, 1], 2] == 1
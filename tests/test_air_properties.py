@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import air_properties
+
+BOARD_DIMS = [6.0, 4.0, 0.5]
+
+
+def test_table_lookup_matches_table_and_interpolates():
+    np.testing.assert_array_equal(air_properties.lookup_k_air(air_properties.TEMP_TABLE), air_properties.K_AIR_TABLE)
+    k_mid = air_properties.lookup_k_air(30.0)
+    assert k_mid == pytest.approx((air_properties.K_AIR_TABLE[1] + air_properties.K_AIR_TABLE[2]) / 2)
+    with pytest.raises(ValueError):
+        air_properties.lookup_g_v2(250.0)
+
+
+@pytest.mark.parametrize('htc_model', [air_properties.NaturalConvection(), air_properties.ForcedConvection(2.0)])
+def test_htc_arrays_match_scalars(htc_model):
+    delta_temps = np.asarray([0.5, 5.0, 40.0, 120.0])
+    htc_arrays = htc_model.find_htc(BOARD_DIMS, delta_temps, 25.0)
+    for [which_temp, delta_temp] in enumerate(delta_temps):
+        htc_scalars = htc_model.find_htc(BOARD_DIMS, delta_temp, 25.0)
+        for [htc_array, htc_scalar] in zip(htc_arrays, htc_scalars):
+            assert np.ndim(htc_scalar) == 0
+            assert np.broadcast_to(htc_array, np.shape(delta_temps))[which_temp] == pytest.approx(htc_scalar)
+
+
+def test_natural_convection_grows_with_temperature_rise():
+    [h_top, h_side, h_btm] = air_properties.NaturalConvection().find_htc(BOARD_DIMS, np.asarray([5.0, 50.0]), 25.0)
+    for htc in [h_top, h_side, h_btm]:
+        assert htc[1] > htc[0]
+    # heated plate facing up convects more than facing down
+    assert np.all(h_top > h_btm)
+
+
+def test_forced_convection_grows_with_velocity():
+    htc_slow = air_properties.ForcedConvection(0.5).find_htc(BOARD_DIMS, 20.0, 25.0)
+    htc_fast = air_properties.ForcedConvection(5.0).find_htc(BOARD_DIMS, 20.0, 25.0)
+    assert htc_fast[0] > htc_slow[0]
+    # laminar flat plate, h goes with the square root of the velocity
+    assert htc_fast[0] / htc_slow[0] == pytest.approx(np.sqrt(10.0))
+    assert htc_slow[0] > air_properties.NaturalConvection().find_htc(BOARD_DIMS, 20.0, 25.0)[0]
+
+
+def test_unknown_htc_model_raises():
+    assert air_properties.get_htc_model('forced', velocity=1.0).velocity == 1.0
+    with pytest.raises(ValueError):
+        air_properties.get_htc_model('unknown')
@@ -0,0 +1,53 @@
+import numpy as np
+
+import board_setup
+import heat_transfer
+from conftest import drill_board
+
+
+class LoadSetting:
+    def __init__(self, layer_name, name, current):
+        self.layer = layer_name
+        self.name = name
+        self.current = current
+
+
+class CaseSettings:
+    def __init__(self, loads):
+        self.loads = loads
+        self.component_heats = list()
+
+
+def test_load_case_scales_losses(board):
+    analysis = heat_transfer.Simultaneous(board)
+    analysis.solve()
+    drill_board(board)
+    q_mats = [np.copy(this_layer.Q_mat) for this_layer in board.layers]
+    loads = [LoadSetting(this_layer.name, electric_load.name, electric_load.current)
+             for this_layer in board.layers for electric_load in this_layer.loads]
+
+    board_setup.run_load_case(analysis, CaseSettings(loads))
+    for [which_layer, this_layer] in enumerate(board.layers):
+        np.testing.assert_allclose(this_layer.Q_mat, q_mats[which_layer], rtol=1e-12, atol=0)
+
+    for load_setting in loads:
+        load_setting.current = 2 * load_setting.current
+    board_setup.run_load_case(analysis, CaseSettings(loads))
+    for [which_layer, this_layer] in enumerate(board.layers):
+        np.testing.assert_allclose(this_layer.Q_mat, 4 * q_mats[which_layer], rtol=1e-12, atol=0)
+
+
+def test_load_case_reuses_factorization(board):
+    analysis = heat_transfer.Simultaneous(board)
+    fresh_analysis = heat_transfer.Simultaneous(board)
+    analysis.solve()
+    fresh_analysis.t_vec = analysis.t_vec
+    g_lu = analysis.solver.g_lu
+    loads = [LoadSetting(this_layer.name, electric_load.name, 2 * electric_load.current)
+             for this_layer in board.layers for electric_load in this_layer.loads]
+    board_setup.run_load_case(analysis, CaseSettings(loads))
+    assert analysis.solver.g_lu is g_lu
+
+    # same G and component heat split (found before the load change), solved from scratch
+    fresh_analysis.solve()
+    np.testing.assert_allclose(analysis.temp_mat, fresh_analysis.temp_mat, rtol=0, atol=1e-9)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import component_nodes
+
+
+def test_junction_to_case_carries_component_heat(board):
+    board.components[1].r_jc = 2.0
+    analysis = component_nodes.ComponentNodeSimultaneous(board, r_jc=1.0, r_cb=0.5)
+    analysis.solve()
+    component_temps = analysis.find_component_temps()
+    for [component, r_jc] in zip(board.components, [1.0, 2.0]):
+        [junction_temp, case_temp] = component_temps[component.name]
+        assert junction_temp - case_temp == pytest.approx(component.heat * r_jc, rel=1e-8)
+        assert case_temp > board.simulation.ambient
+
+
+def test_heat_leaves_thru_air(board):
+    analysis = component_nodes.ComponentNodeSimultaneous(board)
+    analysis.solve()
+    t_rise = analysis.t_vec - board.simulation.ambient
+    board_air_c = analysis._grid_to_vec(analysis.s_air)
+    q_out = np.sum(board_air_c * t_rise[:analysis.board_dim]) + np.sum(analysis.case_air_c *
+                                                                       t_rise[analysis.case_nodes])
+    q_in = sum(np.sum(this_layer.Q_mat) for this_layer in board.layers) + sum(component.heat
+                                                                              for component in board.components)
+    assert q_out == pytest.approx(q_in, rel=1e-8)
+
+
+def test_footprint_cells_match_component_extents(board):
+    [comp_num, rows, cols] = component_nodes.find_footprint_cells(board.components, board.simulation.resolution,
+                                                                  np.shape(board.layers[0].cond_mat))
+    for [which_component, component] in enumerate(board.components):
+        in_component = comp_num == which_component
+        n_rows = int(component.width / board.simulation.resolution)
+        n_cols = int(component.length / board.simulation.resolution)
+        assert np.sum(in_component) == n_rows * n_cols
+        assert np.ptp(rows[in_component]) == n_rows - 1
+        assert np.ptp(cols[in_component]) == n_cols - 1
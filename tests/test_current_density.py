@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import current_density
+import current_tracing
+import tracer
+from conftest import build_test_board
+
+THICKNESS = 1.4
+
+
+def find_square_res():
+    # resistance of one square cell to cell step
+    return current_tracing.material_rho_lookup('Copper') / THICKNESS
+
+
+def test_straight_line_resistance():
+    mat_network = np.zeros([5, 30])
+    mat_network[2, 2:27] = 1
+    res_mat = current_density.find_potential_res_map([2, 2], [2, 26], mat_network, THICKNESS, 'Copper')
+    # pads of two cells at the ends, 22 steps between them
+    assert np.sum(res_mat) == pytest.approx(22 * find_square_res(), rel=1e-10)
+    assert np.all(res_mat[mat_network == 0] == 0)
+
+
+def test_diagonal_line_resistance():
+    mat_network = np.eye(12)
+    res_mat = current_density.find_potential_res_map([0, 0], [11, 11], mat_network, THICKNESS, 'Copper')
+    # cells only touch at their corners, one cell pads and 11 diagonal steps
+    assert np.sum(res_mat) == pytest.approx(11 * np.sqrt(2) * find_square_res(), rel=1e-10)
+    assert np.all(np.diag(res_mat) > 0)
+
+
+def test_corner_joint_carries_current():
+    mat_network = np.zeros([12, 12])
+    mat_network[1, 1:6] = 1
+    mat_network[2:10, 6] = 1
+    res_mat = current_density.find_potential_res_map([1, 1], [9, 6], mat_network, THICKNESS, 'Copper')
+    assert res_mat[1, 5] > 0
+    assert res_mat[2, 6] > 0
+    assert np.sum(res_mat) == pytest.approx((3 + np.sqrt(2) + 6) * find_square_res(), rel=1e-10)
+
+
+def test_board_losses_on_load_networks():
+    potential_board = build_test_board()
+    potential_board.simulation.loss_model = 'potential'
+    for this_layer in potential_board.layers:
+        if this_layer.loads:
+            this_layer.find_cond_loss()
+            assert np.sum(this_layer.Q_mat) > 0
+            assert np.all(this_layer.Q_mat[this_layer.cond_mat <= tracer.Cell.INSULATOR.value] == 0)
@@ -0,0 +1,109 @@
+import numpy as np
+
+import heat_transfer
+
+
+def test_temperatures_match_baseline(board, baseline):
+    analysis = heat_transfer.Simultaneous(board)
+    analysis.solve()
+    np.testing.assert_allclose(analysis.temp_mat, baseline['temp_mat'], rtol=0, atol=1e-9)
+
+
+def test_assembly_is_symmetric_with_positive_diagonal(board):
+    analysis = heat_transfer.Simultaneous(board)
+    analysis.prepare_sparse_matrices()
+    g_mat = analysis.g_mat.tocsr()
+    assert abs(g_mat - g_mat.T).max() == 0
+    assert np.all(g_mat.diagonal() > 0)
+    # a row sums to the node's conductance to air, the conduction 'C's cancel
+    np.testing.assert_allclose(np.asarray(g_mat.sum(axis=1)).ravel(), analysis._grid_to_vec(analysis.s_air),
+                               rtol=0, atol=1e-12 * np.max(g_mat.diagonal()))
+
+
+def test_nonlinear_solve_is_a_fixed_point(board):
+    analysis = heat_transfer.Simultaneous(board)
+    report = analysis.solve_nonlinear(temp_tol=1e-6)
+    assert report[-1]['max_change'] <= 1e-6
+
+    # the air 'C's at the solved temperatures give back the same temperatures
+    t_vec = analysis.t_vec
+    analysis.update_air_conductances(analysis._vec_to_grid(t_vec))
+    t_check = analysis.solver.solve_modified(analysis.g_mat, analysis.s_vec, t_vec)
+    np.testing.assert_allclose(t_check, t_vec, rtol=0, atol=1e-5)
+
+
+def test_nonlinear_convection_follows_surface_temperature(board):
+    analysis = heat_transfer.Simultaneous(board)
+    analysis.solve_nonlinear()
+    top_temps = analysis._vec_to_grid(analysis.t_vec)[0]
+    top_htc = analysis.get_htc('horizontal top', board.simulation.ambient, top_temps)
+    # free convection grows with the temperature rise, so the hottest surface cell has the largest htc
+    assert np.ptp(top_htc) > 0
+    assert top_htc.flat[np.argmax(top_temps)] == np.max(top_htc)
+
+
+def test_source_resolve_matches_full_solve(board):
+    # created before the change with the solution of the re-solved analysis, so its board level htc's (G) and
+    # component heat split are the same
+    analysis = heat_transfer.Simultaneous(board)
+    fresh_analysis = heat_transfer.Simultaneous(board)
+    analysis.solve()
+    fresh_analysis.t_vec = analysis.t_vec
+    board.components[0].heat = 1.5
+    analysis.solve_sources()
+
+    fresh_analysis.solve()
+    np.testing.assert_allclose(analysis.temp_mat, fresh_analysis.temp_mat, rtol=0, atol=1e-9)
+
+
+def test_transient_reaches_steady_state(board, tmp_path):
+    steady_analysis = heat_transfer.Simultaneous(board)
+    steady_analysis.solve()
+    # the component heat split follows the solution, as it does from step to step
+    for _ in range(0, 10):
+        steady_analysis.solve_sources()
+
+    transient_analysis = heat_transfer.Transient(board)
+    field_file = str(tmp_path / 'field.npy')
+    history = transient_analysis.run(2e7, 1e6, field_file=field_file)
+    np.testing.assert_allclose(transient_analysis.temp_mat, steady_analysis.temp_mat, rtol=0, atol=1e-6)
+
+    field = np.load(field_file)
+    assert np.shape(field) == (len(history['time']),) + tuple(transient_analysis.grid_dims)
+    np.testing.assert_allclose(field[-1], transient_analysis._vec_to_grid(transient_analysis.t_vec), rtol=0, atol=0)
+
+
+def test_transient_methods_agree_on_small_steps(board):
+    max_temps = list()
+    for method in ['backward_euler', 'crank_nicolson']:
+        transient_analysis = heat_transfer.Transient(board, method)
+        max_temps.append(transient_analysis.run(5.0, 0.05)['max_temp'])
+    temp_rise = max_temps[1][-1] - board.simulation.ambient
+    assert temp_rise > 0
+    assert np.max(np.abs(max_temps[0] - max_temps[1])) < 0.01 * temp_rise
+
+
+def test_electrothermal_losses_follow_temperature(board):
+    cold_losses = sum(np.sum(this_layer.Q_mat) for this_layer in board.layers)
+    analysis = heat_transfer.Simultaneous(board)
+    report = analysis.solve_electrothermal(temp_tol=1e-6)
+    assert report[-1]['max_change'] <= 1e-6
+    # copper above the reference temperature, the losses and temperatures grow until they settle
+    assert report[-1]['cond_loss'] > cold_losses
+    assert np.all(np.diff([iteration['max_temp'] for iteration in report]) > -1e-6)
+
+    temp_grid = analysis._vec_to_grid(analysis.t_vec)
+    for [which_layer, this_layer] in enumerate(board.layers):
+        q_mat = np.copy(this_layer.Q_mat)
+        this_layer.find_temp_cond_loss(temp_grid[which_layer])
+        np.testing.assert_allclose(this_layer.Q_mat, q_mat, rtol=1e-6, atol=0)
+
+
+def test_electrothermal_with_air_update_converges(board):
+    analysis = heat_transfer.Simultaneous(board)
+    report = analysis.solve_electrothermal(update_air=True)
+    assert report[-1]['max_change'] <= 0.01
+    linear_analysis = heat_transfer.Simultaneous(board)
+    linear_analysis.solve_electrothermal()
+    # free convection at the local temperature rise carries more heat than the board level htc's
+    assert np.max(analysis.temp_mat) < np.max(linear_analysis.temp_mat)
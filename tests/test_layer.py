@@ -0,0 +1,62 @@
+import numpy as np
+
+import current_tracing
+import layer
+import res_cache
+from conftest import drill_board
+
+
+def test_losses_match_baseline(board, baseline):
+    q_mats = np.asarray([this_layer.Q_mat for this_layer in board.layers])
+    np.testing.assert_allclose(q_mats, baseline['q_mats'], rtol=1e-9, atol=1e-15)
+    np.testing.assert_array_equal(np.asarray([this_layer.cond_mat for this_layer in board.layers]),
+                                  baseline['cond_mats'])
+
+
+def test_process_pool_matches_serial_losses(board):
+    # a second load on the branch of the top layer, so a layer has more than one job too
+    board.layers[0].loads.append(current_tracing.ElectricLoad('L0b', 3.0, [305, 105], [305, 325]))
+    layer.find_board_cond_loss(board.layers, n_workers=1)
+    q_mats = [np.copy(this_layer.Q_mat) for this_layer in board.layers]
+
+    res_cache.RES_MAP_CACHE.clear()
+    layer.find_board_cond_loss(board.layers, n_workers=2)
+    assert res_cache.RES_MAP_CACHE.misses == 3
+    for [which_layer, this_layer] in enumerate(board.layers):
+        np.testing.assert_array_equal(this_layer.Q_mat, q_mats[which_layer])
+
+    # the layer's own losses with the workers of its simulation
+    res_cache.RES_MAP_CACHE.clear()
+    board.simulation.loss_workers = 2
+    board.layers[0].find_cond_loss()
+    np.testing.assert_array_equal(board.layers[0].Q_mat, q_mats[0])
+    assert res_cache.RES_MAP_CACHE.misses == 2
+
+
+def test_losses_kept_after_drilling(board):
+    q_mats = [np.copy(this_layer.Q_mat) for this_layer in board.layers]
+    drill_board(board)
+    misses = res_cache.RES_MAP_CACHE.misses
+    for this_layer in board.layers:
+        if this_layer.loads:
+            this_layer.find_cond_loss()
+    # the maps are found on the geometry before drilling, so they come from the cache unchanged
+    assert res_cache.RES_MAP_CACHE.misses == misses
+    for [which_layer, this_layer] in enumerate(board.layers):
+        np.testing.assert_array_equal(this_layer.Q_mat, q_mats[which_layer])
+
+
+def test_maps_cached_on_disk(board, tmp_path):
+    q_mat = np.copy(board.layers[0].Q_mat)
+    board.simulation.res_cache_dir = str(tmp_path)
+    res_cache.RES_MAP_CACHE.clear()
+    board.layers[0].find_cond_loss()
+    assert res_cache.RES_MAP_CACHE.misses == 1
+    assert len(list(tmp_path.glob('*.npy'))) == 1
+
+    # a new session (empty memory cache) loads the map from the folder
+    res_cache.RES_MAP_CACHE.clear()
+    board.layers[0].loads[0].current = 2 * board.layers[0].loads[0].current
+    board.layers[0].find_cond_loss()
+    assert [res_cache.RES_MAP_CACHE.hits, res_cache.RES_MAP_CACHE.misses] == [1, 0]
+    np.testing.assert_allclose(board.layers[0].Q_mat, 4 * q_mat, rtol=1e-12, atol=0)
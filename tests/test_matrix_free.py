@@ -0,0 +1,30 @@
+import numpy as np
+
+import heat_transfer
+import matrix_free
+
+
+def test_stencil_applies_assembled_g(board):
+    analysis = heat_transfer.Simultaneous(board)
+    analysis.prepare_sparse_matrices()
+    free_analysis = matrix_free.MatrixFreeSimultaneous(board)
+    free_analysis.prepare_sparse_matrices()
+
+    x_vec = np.random.default_rng(0).standard_normal(analysis.g_dim)
+    np.testing.assert_allclose(free_analysis.g_mat @ x_vec, analysis.g_mat @ x_vec, rtol=1e-12,
+                               atol=1e-12 * np.max(np.abs(analysis.g_mat @ x_vec)))
+    np.testing.assert_allclose(free_analysis.g_mat.diagonal(), analysis.g_mat.diagonal(), rtol=1e-12, atol=0)
+    assert free_analysis.g_mat.find_nbytes() < analysis.g_mat.data.nbytes
+
+
+def test_matches_direct_solve(board):
+    analysis = heat_transfer.Simultaneous(board)
+    analysis.solve()
+    free_analysis = matrix_free.MatrixFreeSimultaneous(board)
+    free_analysis.solve()
+    assert free_analysis.solver.info['converged']
+    np.testing.assert_allclose(free_analysis.temp_mat, analysis.temp_mat, rtol=0, atol=1e-5)
+
+    analysis.solve_nonlinear()
+    free_analysis.solve_nonlinear()
+    np.testing.assert_allclose(free_analysis.temp_mat, analysis.temp_mat, rtol=0, atol=1e-4)
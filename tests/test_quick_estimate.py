@@ -0,0 +1,43 @@
+import pytest
+
+import heat_transfer
+import quick_estimate
+
+
+def test_estimate_balances_board_losses():
+    general_dims = quick_estimate.find_general_board_dims(6000, 4000, 62, [0, 0])
+    estimate = quick_estimate.estimate_board_temp(general_dims, 5.0, 25.0)
+    assert estimate['q_conv'] + estimate['q_rad'] == pytest.approx(5.0, rel=1e-4)
+    assert estimate['mean_temp'] == pytest.approx(25.0 + estimate['delta_temp'])
+
+    hotter_estimate = quick_estimate.estimate_board_temp(general_dims, 10.0, 25.0)
+    assert hotter_estimate['delta_temp'] > estimate['delta_temp']
+    with pytest.raises(ValueError):
+        quick_estimate.estimate_board_temp(general_dims, 1e4, 25.0)
+
+
+def test_estimate_matches_simulation_mean_temperature(board):
+    analysis = heat_transfer.Simultaneous(board)
+    simulation = board.simulation
+    estimate = quick_estimate.estimate_board_temp(analysis.get_general_board_dims(), analysis.find_total_board_q(),
+                                                  simulation.ambient, simulation.conv_coef, simulation.rad_coef,
+                                                  simulation.rad_pow)
+    # the simulation's fixed step search climbs to the same root and stops once the heat balance is within 10%
+    search_temp = analysis.calc_ave_board_temp()
+    assert search_temp <= estimate['mean_temp']
+    [q_conv, q_rad, htc] = quick_estimate.find_board_heat_out(analysis.get_general_board_dims(),
+                                                              search_temp - simulation.ambient, simulation.ambient,
+                                                              simulation.conv_coef, simulation.rad_coef,
+                                                              simulation.rad_pow, analysis.htc_model)
+    assert q_conv + q_rad == pytest.approx(analysis.find_total_board_q(), rel=0.1)
+
+
+def test_screening_matches_single_estimates():
+    board_dims_list = [[6000, 4000, 62], [3000, 2000, 31], [1000, 8000, 93]]
+    q_totals = [5.0, 2.0, 0.0]
+    estimates = quick_estimate.estimate_board_temps(board_dims_list, q_totals, 25.0, [1, 0])
+    for [board_dims, q_total, estimate] in zip(board_dims_list, q_totals, estimates):
+        general_dims = quick_estimate.find_general_board_dims(board_dims[0], board_dims[1], board_dims[2], [1, 0])
+        single_estimate = quick_estimate.estimate_board_temp(general_dims, q_total, 25.0)
+        assert estimate['mean_temp'] == single_estimate['mean_temp']
+    assert estimates[2]['delta_temp'] == quick_estimate.MIN_DELTA_TEMP
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import heat_transfer
+import reduced_order
+
+
+@pytest.fixture
+def solved_model(board):
+    analysis = heat_transfer.Simultaneous(board)
+    analysis.solve()
+    # temperatures the solution's component heat split was found at
+    split_grid = analysis.component_temp_grid
+    return [analysis, reduced_order.build_reduced_model(analysis), split_grid]
+
+
+def test_reproduces_solved_field(solved_model):
+    [analysis, model, split_grid] = solved_model
+    np.testing.assert_allclose(model.evaluate(), analysis.temp_mat, rtol=0, atol=1e-8)
+    cells = [[0, 5, 7], [2, 45, 30]]
+    temp_grid = analysis._vec_to_grid(analysis.t_vec)
+    np.testing.assert_allclose(model.evaluate_cells(cells), [temp_grid[0, 5, 7], temp_grid[2, 45, 30]], rtol=0,
+                               atol=1e-8)
+
+
+def test_matches_solve_at_new_loads(board, solved_model):
+    [analysis, model, split_grid] = solved_model
+    currents = {('layer0', 'L0'): 8.0}
+    heats = {'U1': 1.5}
+    model_temps = model.evaluate(currents, heats)
+
+    # the component heat split is frozen at the one of the solution
+    board.layers[0].loads[0].current = 8.0
+    board.layers[0].scale_cond_loss()
+    board.components[0].heat = 1.5
+    analysis.update_sources(split_grid)
+    t_vec = analysis.solver.solve(analysis.s_vec)
+    np.testing.assert_allclose(model_temps, analysis._vec_to_temp_mat(t_vec), rtol=0, atol=1e-8)
+    assert model.truncation_error(currents, heats) < 1e-6
+
+
+def test_full_model_error_restores_board(board, solved_model):
+    [analysis, model, split_grid] = solved_model
+    q_mats = [np.copy(this_layer.Q_mat) for this_layer in board.layers]
+    s_vec = np.copy(analysis.s_vec)
+    error_mat = reduced_order.find_full_model_error(analysis, model, {('layer0', 'L0'): 8.0}, {'U1': 1.5}, 30.0)
+    temp_rise = np.max(analysis.temp_mat) - board.simulation.ambient
+    assert np.shape(error_mat) == np.shape(analysis.temp_mat)
+    assert 0 < np.max(np.abs(error_mat)) < 0.05 * temp_rise
+
+    assert board.layers[0].loads[0].current == 5.0
+    assert board.components[0].heat == 0.5
+    assert board.simulation.ambient == 25.0
+    for [which_layer, this_layer] in enumerate(board.layers):
+        np.testing.assert_array_equal(this_layer.Q_mat, q_mats[which_layer])
+    np.testing.assert_allclose(analysis.s_vec, s_vec, rtol=1e-12, atol=0)
+
+
+def test_save_and_load(solved_model, tmp_path):
+    [analysis, model, split_grid] = solved_model
+    file_name = str(tmp_path / 'model.npz')
+    model.save(file_name)
+    loaded_model = reduced_order.load_reduced_model(file_name)
+    assert loaded_model.load_keys == model.load_keys
+    assert loaded_model.component_names == model.component_names
+    heats = {'U2': 0.8}
+    np.testing.assert_array_equal(loaded_model.evaluate(heats=heats, ambient=35.0),
+                                  model.evaluate(heats=heats, ambient=35.0))
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+import adaptive_mesh
+import component_nodes
+import heat_transfer
+import matrix_free
+import stack_reduction
+
+from scipy.sparse.linalg import spsolve
+
+
+def solve_held(analysis):
+    # re-solve with the air 'C's and component heat split held where the sensitivities were found
+    [g_mat, s_vec] = analysis.find_system()
+    return spsolve(g_mat.tocsc(), s_vec)
+
+
+def find_target(analysis, weight_grid, t_system):
+    if isinstance(analysis, stack_reduction.LumpedStackSimultaneous):
+        return np.sum(weight_grid * heat_transfer.Simultaneous._vec_to_grid(analysis, t_system))
+    return np.sum(weight_grid * analysis._vec_to_grid(t_system))
+
+
+@pytest.mark.parametrize('model', [heat_transfer.Simultaneous, adaptive_mesh.AdaptiveSimultaneous,
+                                   stack_reduction.LumpedStackSimultaneous,
+                                   component_nodes.ComponentNodeSimultaneous, matrix_free.MatrixFreeSimultaneous])
+def test_adjoint_matches_finite_difference(board, model):
+    analysis = model(board)
+    analysis.solve()
+    sens = analysis.find_sensitivities()
+    weight_grid = analysis.find_target_weights()
+
+    def find_diff(set_value, value, step):
+        set_value(value + step)
+        target_up = find_target(analysis, weight_grid, solve_held(analysis))
+        set_value(value - step)
+        target_down = find_target(analysis, weight_grid, solve_held(analysis))
+        set_value(value)
+        return (target_up - target_down) / (2 * step)
+
+    component = board.components[0]
+
+    def set_heat(heat):
+        component.heat = heat
+    d_heat = find_diff(set_heat, component.heat, 0.1)
+    assert sens['components'][component.name]['d_heat'] == pytest.approx(d_heat, rel=1e-5)
+
+    this_layer = board.layers[0]
+    electric_load = this_layer.loads[0]
+
+    def set_current(current):
+        electric_load.current = current
+        this_layer.scale_cond_loss()
+    d_current = find_diff(set_current, electric_load.current, 0.1)
+    assert sens['loads'][this_layer.name][electric_load.name]['d_current'] == pytest.approx(d_current, rel=1e-5)
+
+
+def test_tuning_sensitivity_matches_finite_difference(board):
+    analysis = heat_transfer.Simultaneous(board)
+    analysis.solve()
+    sens = analysis.find_sensitivities()
+    weight_grid = analysis.find_target_weights()
+    # the air side coefficients, the conduction ones have a small effect on this board and are round-off limited
+    for coef_name in ['conv_coef', 'rad_coef']:
+        coef_val = analysis._get_tuning_coef(coef_name)
+        step = 1e-2 * coef_val
+        analysis._set_tuning_coef(coef_name, coef_val + step)
+        target_up = find_target(analysis, weight_grid, solve_held(analysis))
+        analysis._set_tuning_coef(coef_name, coef_val - step)
+        target_down = find_target(analysis, weight_grid, solve_held(analysis))
+        analysis._set_tuning_coef(coef_name, coef_val)
+        assert sens['tuning'][coef_name] == pytest.approx((target_up - target_down) / (2 * step), rel=1e-3)
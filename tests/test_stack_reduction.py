@@ -0,0 +1,38 @@
+import numpy as np
+
+import heat_transfer
+import stack_reduction
+
+
+class NoInplaneSimultaneous(heat_transfer.Simultaneous):
+    # the full stack with the same model of the lumped layers (thru-plane conduction only)
+    def __init__(self, board, lump_layers):
+        self.lump_layers = lump_layers
+        super().__init__(board)
+
+    def find_face_conductances(self):
+        faces = super().find_face_conductances()
+        for which_layer in self.lump_layers:
+            faces[1][which_layer] = 0
+            faces[2][which_layer] = 0
+        return faces
+
+
+def test_finds_inner_dielectric_layers(board):
+    assert stack_reduction.find_lumpable_layers(board) == [1]
+
+
+def test_elimination_is_exact(board):
+    analysis = stack_reduction.LumpedStackSimultaneous(board)
+    analysis.solve()
+    assert analysis.reduced_dim == analysis.g_dim * 2 // 3
+    full_analysis = NoInplaneSimultaneous(board, analysis.lump_layers)
+    full_analysis.solve()
+    np.testing.assert_allclose(analysis.temp_mat, full_analysis.temp_mat, rtol=1e-8, atol=0)
+
+
+def test_lumped_close_to_full_stack(board):
+    analysis = stack_reduction.LumpedStackSimultaneous(board)
+    report = analysis.report_against_full()
+    assert report['unknowns'] < report['full_unknowns']
+    assert report['max_abs_diff'] < 0.01 * (report['full_max_temp'] - board.simulation.ambient)
@@ -0,0 +1,74 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import heat_transfer
+import thermal_solvers
+
+
+@pytest.fixture
+def direct_analysis(board):
+    analysis = heat_transfer.Simultaneous(board)
+    analysis.solve()
+    return analysis
+
+
+@pytest.mark.parametrize('name, options', [
+    ('cg', {'preconditioner': 'jacobi'}),
+    ('cg', {'preconditioner': 'ssor'}),
+    ('cg', {'preconditioner': 'ilu'}),
+    ('symmetric', {'ordering': 'nd'}),
+    ('symmetric', {'ordering': 'rcm'}),
+    ('symmetric', {'ordering': 'amd'}),
+    ('symmetric', {'ordering': 'auto'}),
+    ('dd', {'n_workers': 2}),
+])
+def test_solver_matches_direct(board, direct_analysis, name, options):
+    # closed on exit, stops the worker processes of the solver if it has any
+    with heat_transfer.Simultaneous(board, thermal_solvers.get_solver(name, **options)) as analysis:
+        analysis.solve()
+        assert analysis.solver.info.get('converged') is not False
+        np.testing.assert_allclose(analysis.temp_mat, direct_analysis.temp_mat, rtol=0, atol=1e-5)
+
+
+def test_ilu_uses_gmres_and_converges(board):
+    solver = thermal_solvers.ConjugateGradientSolver(preconditioner='ilu')
+    analysis = heat_transfer.Simultaneous(board, solver)
+    analysis.solve()
+    assert solver.info['krylov'] == 'gmres'
+    assert solver.info['converged']
+    assert solver.info['iterations'] < solver.max_iter
+
+
+def test_domain_decomposition_workers_stop_on_close(board, direct_analysis):
+    with thermal_solvers.DomainDecompositionSolver(n_workers=2) as solver:
+        analysis = heat_transfer.Simultaneous(board, solver)
+        analysis.solve()
+        assert len(multiprocessing.active_children()) == 2
+        # a source re-solve goes to the workers holding the layer factors
+        board.components[0].heat = 1.5
+        analysis.solve_sources()
+        direct_analysis.solve_sources()
+        np.testing.assert_allclose(analysis.temp_mat, direct_analysis.temp_mat, rtol=0, atol=1e-5)
+    assert solver.executors is None
+    assert len(multiprocessing.active_children()) == 0
+
+
+def test_column_counts_match_factor(direct_analysis):
+    g_mat = direct_analysis.g_mat
+    for report in thermal_solvers.compare_orderings(g_mat):
+        solver = thermal_solvers.SymmetricDirectSolver(report['ordering'])
+        solver.prepare(g_mat)
+        assert report['factor_nnz'] == solver.info['factor_nnz']
+    least_fill = min(thermal_solvers.compare_orderings(g_mat), key=lambda report: report['factor_nnz'])
+    assert thermal_solvers.choose_ordering(g_mat) == least_fill['ordering']
+
+    g_sub = g_mat.tocsr()[:300][:, :300]
+    l_mat = np.linalg.cholesky(g_sub.toarray())
+    np.testing.assert_array_equal(thermal_solvers.find_column_counts(g_sub), np.count_nonzero(l_mat, axis=0))
+
+
+def test_unknown_solver_raises():
+    with pytest.raises(ValueError):
+        thermal_solvers.get_solver('unknown')
@@ -0,0 +1,556 @@
+import os
+import time
+import weakref
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+from scipy.sparse import csr_matrix, diags, tril, triu
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+from scipy.sparse.linalg import splu, spilu, spsolve_triangular, cg, gmres, LinearOperator
+
+# iteration limit of the Krylov solves when none is given
+MAX_ITER = 2000
+
+try:
+    import pyamg
+except ImportError:
+    pyamg = None
+
+try:
+    from sksparse.cholmod import cholesky, analyze as cholesky_analyze
+except ImportError:
+    cholesky = None
+    cholesky_analyze = None
+
+
+class DirectSolver:
+    # sparse LU (SuperLU) solve of G T = S
+    def __init__(self, tol=1e-10, max_iter=MAX_ITER):
+        self.name = 'direct'
+        # used when solving a modified G with the prepared factors as preconditioner
+        self.tol = tol
+        self.max_iter = max_iter
+        self.g_mat = None
+        self.g_lu = None
+        self.info = dict()
+
+    def prepare(self, g_mat):
+        # factorize once, every solve with this G is then only a back-substitution
+        prep_start = time.perf_counter()
+        self.g_mat = g_mat
+        self.g_lu = splu(g_mat.tocsc())
+        self.info = {'solver': self.name, 'factor_nnz': self.g_lu.L.nnz + self.g_lu.U.nnz,
+                     'prepare_time': time.perf_counter() - prep_start}
+
+    def solve(self, s_vec, t_guess=None):
+        solve_start = time.perf_counter()
+        t_vec = self.g_lu.solve(s_vec)
+        self.info['solve_time'] = time.perf_counter() - solve_start
+        return t_vec
+
+    def solve_modified(self, g_mat, s_vec, t_guess=None):
+        # G has changed slightly since prepare (e.g. air cells on the boundary), the LU factors of the prepared G
+        # are kept and used to precondition CG on the modified G
+        m_op = LinearOperator(self.g_mat.shape, matvec=self.g_lu.solve, dtype=float)
+        [t_vec, solve_info] = run_cg(g_mat, s_vec, t_guess, m_op, self.tol, self.max_iter)
+        self.info.update(solve_info)
+        return t_vec
+
+
+class SymmetricDirectSolver:
+    # direct solve of the symmetric G with a fill reducing ordering, Cholesky (CHOLMOD) if scikit-sparse is
+    # installed, otherwise SuperLU in symmetric mode without pivoting (LDU = LDL^T, G is positive definite)
+    def __init__(self, ordering='amd', grid_dims=None, leaf_cells=8, tol=1e-10, max_iter=MAX_ITER):
+        self.name = 'symmetric'
+        # 'nd': nested dissection on the board grid, 'rcm': reverse Cuthill-McKee, 'amd': SuperLU minimum degree
+        # on G, 'natural': node numbering as is, 'auto': the one of 'nd', 'rcm', 'amd' with the least fill
+        self.ordering = ordering
+        # [layers, rows, cols] of the board grid for 'nd', found from the bands of G if not given
+        self.grid_dims = grid_dims
+        self.leaf_cells = leaf_cells
+        self.tol = tol
+        self.max_iter = max_iter
+        self.g_mat = None
+        self.perm = None
+        self.g_factor = None
+        self.solve_perm = None
+        self.info = dict()
+
+    def prepare(self, g_mat):
+        prep_start = time.perf_counter()
+        self.g_mat = g_mat
+        ordering = self.ordering
+        if ordering == 'auto':
+            # symbolic analysis only, just the chosen ordering is factored
+            ordering = choose_ordering(g_mat, grid_dims=self.grid_dims, leaf_cells=self.leaf_cells)
+        [self.perm, ordering] = find_ordering(g_mat, ordering, self.grid_dims, self.leaf_cells)
+        order_time = time.perf_counter() - prep_start
+
+        g_perm = g_mat.tocsr()[self.perm][:, self.perm].tocsc()
+        if cholesky is not None:
+            self.g_factor = cholesky(g_perm, ordering_method='amd' if ordering == 'amd' else 'natural')
+            factor_nnz = self.g_factor.L().nnz
+            factor_bytes = factor_nnz * (8 + 4)
+            self.solve_perm = self.g_factor
+        else:
+            permc_spec = 'MMD_AT_PLUS_A' if ordering == 'amd' else 'NATURAL'
+            self.g_factor = splu(g_perm, permc_spec=permc_spec, diag_pivot_thresh=0.0,
+                                 options={'SymmetricMode': True})
+            # L and U are both stored, U is D L^T
+            factor_nnz = self.g_factor.L.nnz
+            factor_bytes = (self.g_factor.L.nnz + self.g_factor.U.nnz) * (8 + 4)
+            self.solve_perm = self.g_factor.solve
+
+        lower_nnz = (g_mat.nnz + g_mat.shape[0]) // 2
+        self.info = {'solver': self.name, 'ordering': ordering, 'factorization': 'cholmod' if cholesky is not None
+                     else 'superlu_symmetric', 'g_nnz': g_mat.nnz, 'factor_nnz': factor_nnz,
+                     'fill_ratio': factor_nnz / lower_nnz, 'factor_mb': factor_bytes / 1e6,
+                     'order_time': order_time, 'prepare_time': time.perf_counter() - prep_start}
+
+    def solve(self, s_vec, t_guess=None):
+        solve_start = time.perf_counter()
+        t_vec = np.zeros(len(s_vec))
+        t_vec[self.perm] = self.solve_perm(s_vec[self.perm])
+        self.info['solve_time'] = time.perf_counter() - solve_start
+        return t_vec
+
+    def solve_modified(self, g_mat, s_vec, t_guess=None):
+        # the prepared factors precondition CG on the modified G
+        def apply_factor(r_vec):
+            z_vec = np.zeros(len(r_vec))
+            z_vec[self.perm] = self.solve_perm(np.ravel(r_vec)[self.perm])
+            return z_vec
+        m_op = LinearOperator(self.g_mat.shape, matvec=apply_factor, dtype=float)
+        [t_vec, solve_info] = run_cg(g_mat, s_vec, t_guess, m_op, self.tol, self.max_iter)
+        self.info.update(solve_info)
+        return t_vec
+
+
+def find_grid_dims(g_mat):
+    # [layers, rows, cols] from the bands of a board G (node = row + col * rows + layer * rows * cols), None if G
+    # is not a plain board grid (e.g. an adaptive mesh or extra component nodes)
+    g_coo = g_mat.tocoo()
+    offsets = np.unique(g_coo.col - g_coo.row)
+    offsets = offsets[offsets > 0]
+    g_dim = g_mat.shape[0]
+    if len(offsets) == 0 or len(offsets) > 3 or offsets[0] != 1:
+        return None
+    n_rows = int(offsets[1]) if len(offsets) > 1 else g_dim
+    layer_nodes = int(offsets[2]) if len(offsets) > 2 else g_dim
+    if layer_nodes % n_rows != 0 or g_dim % layer_nodes != 0:
+        return None
+    return [g_dim // layer_nodes, n_rows, layer_nodes // n_rows]
+
+
+def nested_dissection_order(grid_dims, leaf_cells=8):
+    # geometric nested dissection of the board, in-plane boxes are split across their longer side by a line of
+    # cells thru every layer (the layers are tightly coupled so separators span the stack), separators last
+    [n_layers, n_rows, n_cols] = grid_dims
+    layer_offsets = (np.arange(n_layers) * n_rows * n_cols).reshape(-1, 1, 1)
+
+    def box_nodes(row_start, row_end, col_start, col_end):
+        rows = np.arange(row_start, row_end).reshape(1, 1, -1)
+        cols = np.arange(col_start, col_end).reshape(1, -1, 1)
+        return (rows + cols * n_rows + layer_offsets).ravel()
+
+    order = list()
+
+    def dissect(row_start, row_end, col_start, col_end):
+        box_rows = row_end - row_start
+        box_cols = col_end - col_start
+        if box_rows <= 0 or box_cols <= 0:
+            return
+        if box_rows * box_cols <= leaf_cells or (box_rows < 3 and box_cols < 3):
+            order.append(box_nodes(row_start, row_end, col_start, col_end))
+        elif box_rows >= box_cols:
+            row_mid = row_start + box_rows // 2
+            dissect(row_start, row_mid, col_start, col_end)
+            dissect(row_mid + 1, row_end, col_start, col_end)
+            order.append(box_nodes(row_mid, row_mid + 1, col_start, col_end))
+        else:
+            col_mid = col_start + box_cols // 2
+            dissect(row_start, row_end, col_start, col_mid)
+            dissect(row_start, row_end, col_mid + 1, col_end)
+            order.append(box_nodes(row_start, row_end, col_mid, col_mid + 1))
+
+    dissect(0, n_rows, 0, n_cols)
+    return np.concatenate(order)
+
+
+def find_ordering(g_mat, ordering, grid_dims=None, leaf_cells=8):
+    # symmetric permutation of the nodes and the ordering used ('nd' falls back to 'amd' if G is not a grid)
+    g_dim = g_mat.shape[0]
+    if ordering == 'nd':
+        if grid_dims is None:
+            grid_dims = find_grid_dims(g_mat)
+        if grid_dims is not None and int(np.prod(grid_dims)) == g_dim:
+            return [nested_dissection_order(grid_dims, leaf_cells), 'nd']
+        ordering = 'amd'
+    if ordering == 'rcm':
+        return [np.asarray(reverse_cuthill_mckee(g_mat.tocsr(), symmetric_mode=True), dtype=int), 'rcm']
+    elif ordering == 'amd' or ordering == 'natural':
+        # minimum degree is applied by the factorization itself
+        return [np.arange(g_dim), ordering]
+
+    raise ValueError("Unknown ordering: " + str(ordering))
+
+
+def find_elimination_tree(g_mat):
+    # parent of every node in the elimination tree of the symmetric G (-1 for a root), Liu's algorithm with path
+    # compression on the upper triangle
+    g_upper = triu(g_mat, format='csc')
+    [col_starts, row_ids] = [g_upper.indptr, g_upper.indices]
+    g_dim = g_mat.shape[0]
+    parent = np.full(g_dim, -1)
+    ancestor = np.full(g_dim, -1)
+    for col in range(0, g_dim):
+        for row in row_ids[col_starts[col]:col_starts[col + 1]]:
+            while row != -1 and row < col:
+                row_next = ancestor[row]
+                ancestor[row] = col
+                if row_next == -1:
+                    parent[row] = col
+                row = row_next
+    return parent
+
+
+def find_column_counts(g_mat):
+    # nonzeros of every column of the Cholesky factor L of the symmetric G (diagonal included) from its pattern
+    # only, no factoring (Gilbert, Ng and Peyton, the skeleton leaves of each row subtree)
+    g_dim = g_mat.shape[0]
+    parent = find_elimination_tree(g_mat)
+    # postorder of the tree, children are numbered before their parent
+    children = [list() for _ in range(0, g_dim)]
+    for node in range(g_dim - 1, -1, -1):
+        if parent[node] != -1:
+            children[parent[node]].append(node)
+    post = list()
+    for root in np.flatnonzero(parent == -1):
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            post.append(node)
+            stack.extend(children[node])
+    post = post[::-1]
+
+    # first descendant (in postorder) of every node, a leaf of a row subtree adds one to its column
+    first = np.full(g_dim, -1)
+    delta = np.zeros(g_dim, dtype=int)
+    for [post_num, node] in enumerate(post):
+        delta[node] = 1 if first[node] == -1 else 0
+        while node != -1 and first[node] == -1:
+            first[node] = post_num
+            node = parent[node]
+
+    g_csc = g_mat.tocsc()
+    [col_starts, row_ids] = [g_csc.indptr, g_csc.indices]
+    max_first = np.full(g_dim, -1)
+    prev_leaf = np.full(g_dim, -1)
+    ancestor = np.arange(g_dim)
+    for node in post:
+        if parent[node] != -1:
+            delta[parent[node]] -= 1
+        for row in row_ids[col_starts[node]:col_starts[node + 1]]:
+            if row <= node or first[node] <= max_first[row]:
+                continue
+            max_first[row] = first[node]
+            [last_leaf, prev_leaf[row]] = [prev_leaf[row], node]
+            delta[node] += 1
+            if last_leaf != -1:
+                # the least common ancestor of this and the previous leaf of the row subtree
+                lca = last_leaf
+                while lca != ancestor[lca]:
+                    lca = ancestor[lca]
+                while last_leaf != lca:
+                    [last_leaf, ancestor[last_leaf]] = [ancestor[last_leaf], lca]
+                delta[lca] -= 1
+        if parent[node] != -1:
+            ancestor[node] = parent[node]
+
+    # parents are numbered after their children, so the counts are summed up the tree in node order
+    col_counts = delta
+    for node in range(0, g_dim):
+        if parent[node] != -1:
+            col_counts[parent[node]] += col_counts[node]
+    return col_counts
+
+
+def find_analysis_perm(g_mat, ordering, grid_dims=None, leaf_cells=8):
+    # explicit permutation of an ordering, for 'amd' the minimum degree order of CHOLMOD, or else of SuperLU
+    # from an incomplete factorization that keeps no fill (the order is found before any factoring)
+    [perm, ordering] = find_ordering(g_mat, ordering, grid_dims, leaf_cells)
+    if ordering == 'amd':
+        if cholesky_analyze is not None:
+            perm = cholesky_analyze(g_mat.tocsc(), ordering_method='amd').P()
+        else:
+            perm = spilu(g_mat.tocsc(), drop_tol=1.0, fill_factor=1, permc_spec='MMD_AT_PLUS_A',
+                         diag_pivot_thresh=0.0, options={'SymmetricMode': True}).perm_c
+            # SuperLU gives the column order as the position of every node, its inverse is the node order
+            perm = np.argsort(perm)
+    return [np.asarray(perm, dtype=int), ordering]
+
+
+def compare_orderings(g_mat, orderings=('nd', 'rcm', 'amd'), grid_dims=None, leaf_cells=8):
+    # symbolic analysis of G with every ordering, nnz, fill, factor memory and flops of its Cholesky factor are
+    # found from the column counts of the permuted G without factoring, to choose one before a large run
+    reports = list()
+    lower_nnz = (g_mat.nnz + g_mat.shape[0]) // 2
+    for ordering in orderings:
+        analyze_start = time.perf_counter()
+        [perm, used_ordering] = find_analysis_perm(g_mat, ordering, grid_dims, leaf_cells)
+        g_perm = g_mat.tocsr()[perm][:, perm]
+        col_counts = find_column_counts(g_perm)
+        factor_nnz = int(np.sum(col_counts))
+        reports.append({'ordering': used_ordering, 'g_nnz': g_mat.nnz, 'factor_nnz': factor_nnz,
+                        'fill_ratio': factor_nnz / lower_nnz, 'factor_mb': factor_nnz * (8 + 4) / 1e6,
+                        'factor_flops': float(np.sum(col_counts.astype(float) ** 2)),
+                        'analyze_time': time.perf_counter() - analyze_start})
+    return reports
+
+
+def choose_ordering(g_mat, orderings=('nd', 'rcm', 'amd'), grid_dims=None, leaf_cells=8):
+    # the ordering with the fewest factor nonzeros, only analyzed, the solver then factors this one only
+    reports = compare_orderings(g_mat, orderings, grid_dims, leaf_cells)
+    return min(reports, key=lambda report: report['factor_nnz'])['ordering']
+
+
+class ConjugateGradientSolver:
+    # preconditioned conjugate gradient, G is symmetric positive definite (conduction + air to ambient)
+    def __init__(self, preconditioner='jacobi', tol=1e-8, max_iter=MAX_ITER, drop_tol=1e-4, fill_factor=20):
+        self.name = 'cg'
+        self.preconditioner = preconditioner
+        # an incomplete LU is not symmetric, so GMRES is used with it instead of CG
+        self.krylov = 'gmres' if preconditioner == 'ilu' else 'cg'
+        self.tol = tol
+        self.max_iter = max_iter
+        self.drop_tol = drop_tol
+        self.fill_factor = fill_factor
+        self.g_mat = None
+        self.m_op = None
+        self.info = dict()
+
+    def prepare(self, g_mat):
+        prep_start = time.perf_counter()
+        self.g_mat = g_mat
+        self.m_op = build_preconditioner(g_mat, self.preconditioner, self.drop_tol, self.fill_factor)
+        self.info = {'solver': self.name, 'preconditioner': self.preconditioner, 'krylov': self.krylov,
+                     'prepare_time': time.perf_counter() - prep_start}
+
+    def solve(self, s_vec, t_guess=None):
+        return self.solve_modified(self.g_mat, s_vec, t_guess)
+
+    def solve_modified(self, g_mat, s_vec, t_guess=None):
+        # the prepared preconditioner is kept, G may have changed slightly since prepare
+        [t_vec, solve_info] = run_cg(g_mat, s_vec, t_guess, self.m_op, self.tol, self.max_iter, self.krylov)
+        self.info.update(solve_info)
+        return t_vec
+
+
+class DomainDecompositionSolver:
+    # CG preconditioned by two level additive Schwarz on layer blocks, each block of G is factorized (and solved)
+    # in a worker process, the coarse level is one constant per block which carries the near singular (mean
+    # temperature) mode, node numbers are layer major so a layer is a contiguous block of nodes
+    def __init__(self, block_size=None, n_workers=None, tol=1e-8, max_iter=MAX_ITER):
+        self.name = 'dd'
+        # nodes per block, found from the thru-plane band of G (the widest band) if not given
+        self.block_size = block_size
+        self.n_workers = n_workers
+        self.tol = tol
+        self.max_iter = max_iter
+        self.g_mat = None
+        self.m_op = None
+        self.executors = None
+        self.worker_blocks = list()
+        self.block_starts = None
+        self.factor_key = None
+        # shuts the workers down when the solver is dropped without close()
+        self.finalizer = None
+        self.info = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def prepare(self, g_mat):
+        prep_start = time.perf_counter()
+        self.g_mat = g_mat.tocsr()
+        g_dim = self.g_mat.shape[0]
+        block_size = self.block_size
+        if block_size is None:
+            g_coo = self.g_mat.tocoo()
+            block_size = max(int(np.max(np.abs(g_coo.col - g_coo.row))), 1)
+        self.block_starts = np.arange(0, g_dim, block_size)
+        block_ends = np.append(self.block_starts[1:], g_dim)
+        n_blocks = len(self.block_starts)
+
+        if self.executors is None:
+            n_workers = self.n_workers
+            if n_workers is None:
+                n_workers = os.cpu_count()
+            n_workers = max(min(n_workers, n_blocks), 1)
+            # one process per executor so every block is always solved by the worker holding its factors
+            self.executors = [ProcessPoolExecutor(max_workers=1) for _ in range(0, n_workers)]
+            self.finalizer = weakref.finalize(self, shutdown_executors, self.executors)
+        n_workers = len(self.executors)
+        self.worker_blocks = [list(range(which_worker, n_blocks, n_workers)) for which_worker in range(0, n_workers)]
+        # copies of this solver (e.g. transient step solvers) share the workers but keep their own factors
+        self.factor_key = (id(self), next(FACTOR_KEYS))
+
+        factor_jobs = list()
+        for [which_worker, executor] in enumerate(self.executors):
+            blocks = [[which_block, self.g_mat[self.block_starts[which_block]:block_ends[which_block],
+                                               self.block_starts[which_block]:block_ends[which_block]]]
+                      for which_block in self.worker_blocks[which_worker]]
+            factor_jobs.append(executor.submit(factor_blocks, self.factor_key, blocks))
+        factor_nnz = sum(factor_job.result() for factor_job in factor_jobs)
+
+        # coarse level, R has a one for every node of a block
+        block_of_node = np.repeat(np.arange(n_blocks), block_ends - self.block_starts)
+        restrict = csr_matrix((np.ones(g_dim), (block_of_node, np.arange(g_dim))), shape=(n_blocks, g_dim))
+        coarse_inv = np.linalg.inv((restrict @ self.g_mat @ restrict.T).toarray())
+
+        def apply_schwarz(r_vec):
+            r_vec = np.ravel(r_vec)
+            z_vec = restrict.T @ (coarse_inv @ (restrict @ r_vec))
+            solve_jobs = list()
+            for [which_worker, executor] in enumerate(self.executors):
+                rhs_blocks = [[which_block, r_vec[self.block_starts[which_block]:block_ends[which_block]]]
+                              for which_block in self.worker_blocks[which_worker]]
+                solve_jobs.append(executor.submit(solve_blocks, self.factor_key, rhs_blocks))
+            for solve_job in solve_jobs:
+                for [which_block, block_sol] in solve_job.result():
+                    z_vec[self.block_starts[which_block]:block_ends[which_block]] += block_sol
+            return z_vec
+        self.m_op = LinearOperator(self.g_mat.shape, matvec=apply_schwarz, dtype=float)
+        self.info = {'solver': self.name, 'blocks': n_blocks, 'workers': n_workers, 'factor_nnz': factor_nnz,
+                     'prepare_time': time.perf_counter() - prep_start}
+
+    def solve(self, s_vec, t_guess=None):
+        return self.solve_modified(self.g_mat, s_vec, t_guess)
+
+    def solve_modified(self, g_mat, s_vec, t_guess=None):
+        [t_vec, solve_info] = run_cg(g_mat, s_vec, t_guess, self.m_op, self.tol, self.max_iter)
+        self.info.update(solve_info)
+        return t_vec
+
+    def close(self):
+        # stop the worker processes, prepare starts new ones, copies of this solver share the workers so they are
+        # stopped for the copies too
+        if self.finalizer is not None:
+            self.finalizer()
+        self.finalizer = None
+        self.executors = None
+
+
+def shutdown_executors(executors):
+    for executor in executors:
+        executor.shutdown()
+
+
+# block factors held by each worker process, by (factor key, block)
+WORKER_FACTORS = dict()
+FACTOR_KEYS = count()
+
+
+def factor_blocks(factor_key, blocks):
+    # runs in a worker, factors of an older prepare of the same solver are dropped
+    for old_key in [key for key in WORKER_FACTORS if key[0][0] == factor_key[0] and key[0] != factor_key]:
+        del WORKER_FACTORS[old_key]
+    factor_nnz = 0
+    for [which_block, block_mat] in blocks:
+        block_lu = splu(block_mat.tocsc())
+        WORKER_FACTORS[(factor_key, which_block)] = block_lu
+        factor_nnz += block_lu.L.nnz + block_lu.U.nnz
+    return factor_nnz
+
+
+def solve_blocks(factor_key, rhs_blocks):
+    return [[which_block, WORKER_FACTORS[(factor_key, which_block)].solve(block_rhs)]
+            for [which_block, block_rhs] in rhs_blocks]
+
+
+def run_cg(g_mat, s_vec, t_guess, m_op, tol, max_iter, krylov='cg'):
+    # preconditioned CG (or restarted GMRES for a non-symmetric preconditioner), convergence is reported in the
+    # returned info only, the caller decides whether to show it
+    solve_start = time.perf_counter()
+    iterations = [0]
+    if max_iter is None:
+        max_iter = MAX_ITER
+
+    def count_iteration(xk):
+        iterations[0] += 1
+
+    if krylov == 'cg':
+        [t_vec, exit_code] = cg(g_mat, s_vec, x0=t_guess, rtol=tol, atol=0, maxiter=max_iter, M=m_op,
+                                callback=count_iteration)
+    elif krylov == 'gmres':
+        # max_iter counts inner iterations, as for CG
+        [t_vec, exit_code] = gmres(g_mat, s_vec, x0=t_guess, rtol=tol, atol=0, restart=50,
+                                   maxiter=max(int(np.ceil(max_iter / 50)), 1), M=m_op, callback=count_iteration,
+                                   callback_type='pr_norm')
+    else:
+        raise ValueError("Unknown Krylov method: " + str(krylov))
+    residual = np.linalg.norm(s_vec - g_mat @ t_vec) / max(np.linalg.norm(s_vec), np.finfo(float).tiny)
+
+    return [t_vec, {'iterations': iterations[0], 'residual': residual, 'converged': exit_code == 0,
+                    'warm_start': t_guess is not None, 'solve_time': time.perf_counter() - solve_start}]
+
+
+def build_preconditioner(g_mat, preconditioner, drop_tol=1e-4, fill_factor=20):
+    if preconditioner is None or preconditioner == 'none':
+        return None
+
+    elif callable(preconditioner):
+        # a function building the preconditioner from G (e.g. for an operator without a stored matrix)
+        return preconditioner(g_mat)
+
+    elif preconditioner == 'jacobi':
+        inv_diag = 1 / g_mat.diagonal()
+        return LinearOperator(g_mat.shape, matvec=lambda x: inv_diag * x, dtype=float)
+
+    elif preconditioner == 'ssor':
+        # symmetric Gauss-Seidel, M = (D + L) D^-1 (D + U), keeps the preconditioned system symmetric for CG
+        g_lower = tril(g_mat, format='csr')
+        g_upper = triu(g_mat, format='csr')
+        g_diag = g_mat.diagonal()
+
+        def apply_ssor(r_vec):
+            y_vec = spsolve_triangular(g_lower, r_vec, lower=True)
+            return spsolve_triangular(g_upper, g_diag * y_vec, lower=False)
+        return LinearOperator(g_mat.shape, matvec=apply_ssor, dtype=float)
+
+    elif preconditioner == 'ilu':
+        # SuperLU incomplete LU of the diagonally scaled G (unit diagonal, so the drop tolerance is relative to the
+        # cell conductances), in symmetric mode without pivoting, G is close to singular (only the air cells tie it
+        # to ambient) so too small a fill_factor gives a useless factor, it is not symmetric so it is used with GMRES
+        diag_scale = 1 / np.sqrt(g_mat.diagonal())
+        g_scaled = (diags(diag_scale) @ g_mat @ diags(diag_scale)).tocsc()
+        g_ilu = spilu(g_scaled, drop_tol=drop_tol, fill_factor=fill_factor, diag_pivot_thresh=0.0,
+                      permc_spec='MMD_AT_PLUS_A', options={'SymmetricMode': True})
+        return LinearOperator(g_mat.shape, matvec=lambda r_vec: diag_scale * g_ilu.solve(diag_scale * r_vec),
+                              dtype=float)
+
+    elif preconditioner == 'amg':
+        if pyamg is None:
+            raise ImportError("The 'amg' preconditioner requires the pyamg package")
+        amg_hierarchy = pyamg.smoothed_aggregation_solver(g_mat.tocsr(), symmetry='symmetric')
+        return amg_hierarchy.aspreconditioner(cycle='V')
+
+    raise ValueError("Unknown preconditioner: " + str(preconditioner))
+
+
+def get_solver(name, **options):
+    # select a solver backend by name, options are passed on to the backend
+    if name == 'direct':
+        return DirectSolver(**options)
+    elif name == 'cg':
+        return ConjugateGradientSolver(**options)
+    elif name == 'dd':
+        return DomainDecompositionSolver(**options)
+    elif name == 'symmetric':
+        return SymmetricDirectSolver(**options)
+
+    raise ValueError("Unknown solver: " + str(name))
@@ -2,15 +2,22 @@ import numpy as np
 from enum import Enum
 from shapely.geometry import Polygon, Point
 from math import ceil, floor, sqrt
+from functools import lru_cache
+
+# disk stamps kept (least recently used dropped first), flashes, line steps and drill hits repeat few sub-cell offsets
+STAMP_CACHE_SIZE = 4096
 
 
 class Component:
-    def __init__(self, name, dims, location, heat_generated, side):
+    def __init__(self, name, dims, location, heat_generated, side, r_jc=None, r_cb=None):
         self.name = name
         [self.width, self.length] = dims
         [self.x, self.y] = location
         self.heat = heat_generated
         self.side = side
+        # junction to case and case to board thermal resistances [C/W], used by component node models
+        self.r_jc = r_jc
+        self.r_cb = r_cb
 
 
 class Circle:
@@ -51,7 +58,9 @@ class Pour:
 
 class Simulation:
     def __init__(self, resolution, ambient_c, board_orientation, show_process, cond_in_plane_k, cond_thru_plane_k,
-                 diel_in_plane_k, diel_thru_plane_k, conv_coef, rad_coef, rad_pow, comp_htc_coef):
+                 diel_in_plane_k, diel_thru_plane_k, conv_coef, rad_coef, rad_pow, comp_htc_coef, loss_model='path',
+                 smooth_radius=10, loss_workers=1,
+                 res_cache_dir=None):
         self.resolution = resolution
         self.ambient = ambient_c
         self.board_orientation = board_orientation
@@ -62,6 +71,14 @@ class Simulation:
         self.rad_coef = rad_coef
         self.rad_pow = rad_pow
         self.comp_htc_coef = comp_htc_coef
+        # conduction loss engine, 'path' (current path and trace width) or 'potential' (network potential solve)
+        self.loss_model = loss_model
+        # half width [cells] of the window the 'path' resistances are averaged over
+        self.smooth_radius = smooth_radius
+        # processes for the load conduction losses, 1 computes them in this process and None uses all cores
+        self.loss_workers = loss_workers
+        # folder the load resistance maps are also cached in (they are always cached in memory), None for no folder
+        self.res_cache_dir = res_cache_dir
 
 
 class Cell(Enum):
@@ -72,36 +89,72 @@ class Cell(Enum):
 
 def trace_circle(cond_mat, x_center, y_center, radius, res, cell_value):
     # https://www.redblobgames.com/grids/circle-drawing/
+    [left, top, stamp] = find_circle_stamp(x_center, y_center, radius, res)
+    apply_stamp(cond_mat, left, top, stamp, cell_value)
+
+
+def find_circle_stamp(x_center, y_center, radius, res):
+    # [first x cell, first y cell, mask] of the cells of the disk, the mask only depends on the center within its cell
+    # and the window around it so it comes from the stamp cache
     top = floor((y_center - radius) / res)
     bottom = ceil((y_center + radius) / res)
     left = floor((x_center - radius) / res)
     right = ceil((x_center + radius) / res)
 
-    for y in range(top, bottom):
-        for x in range(left, right):
-            dx = (x_center / res) - x
-            dy = (y_center / res) - y
-            dist_sq = dx*dx + dy*dy
-            if dist_sq <= ((radius*radius) / res / res):
-                cond_mat[x, y] = cell_value
+    # x_center / res - x is the same float as x_frac - (x - x_cell) (both round the same exact value)
+    x_cell = floor(x_center / res)
+    y_cell = floor(y_center / res)
+    stamp = find_disk_stamp(x_center / res - x_cell, y_center / res - y_cell, (radius*radius) / res / res,
+                            left - x_cell, right - x_cell, top - y_cell, bottom - y_cell)
+    return [left, top, stamp]
+
+
+@lru_cache(maxsize=STAMP_CACHE_SIZE)
+def find_disk_stamp(x_frac, y_frac, dist_sq_max, x_first, x_end, y_first, y_end):
+    # cells [x_first, x_end) x [y_first, y_end) (from the center cell) within the disk, shared so read only
+    dx = x_frac - np.arange(x_first, x_end)
+    dy = y_frac - np.arange(y_first, y_end)
+    stamp = (dx*dx)[:, np.newaxis] + (dy*dy)[np.newaxis, :] <= dist_sq_max
+    stamp.flags.writeable = False
+    return stamp
+
+
+def apply_stamp(cond_mat, left, top, stamp, cell_value):
+    # set the stamp cells with one masked slice assignment, cells off the matrix are dropped
+    [n_x, n_y] = np.shape(cond_mat)
+    [x_first, y_first] = [max(left, 0), max(top, 0)]
+    [x_end, y_end] = [min(left + np.shape(stamp)[0], n_x), min(top + np.shape(stamp)[1], n_y)]
+    if x_end <= x_first or y_end <= y_first:
+        return
+    cond_mat[x_first:x_end, y_first:y_end][stamp[x_first - left:x_end - left, y_first - top:y_end - top]] = cell_value
 
 
 def trace_line(cond_mat, x_start, y_start, x_end, y_end, radius, res, cell_value):
-    # draw circles from start to end with some increment
+    # draw circles from start to end with some increment, the circles are merged into one obround stamp
     dx = x_end - x_start
     dy = y_end - y_start
-    x_trace = x_start
-    y_trace = y_start
-    x_trace_prev = 0
-    y_trace_prev = 0
     leng = sqrt(dx*dx + dy*dy)
-    for p in range(0, floor(leng)):
-        if floor(x_trace_prev) != floor(x_trace) or floor(y_trace_prev) != floor(y_trace):
-            trace_circle(cond_mat, floor(x_trace), floor(y_trace), radius, res, cell_value)
-        x_trace_prev = x_trace
-        y_trace_prev = y_trace
-        x_trace = x_trace + dx/leng
-        y_trace = y_trace + dy/leng
+    n_steps = floor(leng)
+    if n_steps <= 0:
+        return
+    # same running sums as stepping along the line, a circle is drawn each time the floored location changes
+    x_traces = np.floor(np.cumsum(np.append(float(x_start), np.full(n_steps - 1, dx/leng))))
+    y_traces = np.floor(np.cumsum(np.append(float(y_start), np.full(n_steps - 1, dy/leng))))
+    is_new = (x_traces != np.append(0, x_traces[:-1])) | (y_traces != np.append(0, y_traces[:-1]))
+
+    circle_stamps = [find_circle_stamp(x_trace, y_trace, radius, res) for [x_trace, y_trace] in
+                     zip(x_traces[is_new].tolist(), y_traces[is_new].tolist())]
+    if len(circle_stamps) == 0:
+        return
+    left = min([circle_left for [circle_left, circle_top, stamp] in circle_stamps])
+    top = min([circle_top for [circle_left, circle_top, stamp] in circle_stamps])
+    right = max([circle_left + np.shape(stamp)[0] for [circle_left, circle_top, stamp] in circle_stamps])
+    bottom = max([circle_top + np.shape(stamp)[1] for [circle_left, circle_top, stamp] in circle_stamps])
+    line_stamp = np.zeros([max(right - left, 0), max(bottom - top, 0)], dtype=bool)
+    for [circle_left, circle_top, stamp] in circle_stamps:
+        line_stamp[circle_left - left:circle_left - left + np.shape(stamp)[0],
+                   circle_top - top:circle_top - top + np.shape(stamp)[1]] |= stamp
+    apply_stamp(cond_mat, left, top, line_stamp, cell_value)
 
 
 def trace_rectangle(cond_mat, x_center, y_center, width, height, res, cell_value):
@@ -110,9 +163,7 @@ def trace_rectangle(cond_mat, x_center, y_center, width, height, res, cell_value
     left = floor((x_center - width/2) / res)
     right = ceil((x_center + width/2) / res)
 
-    for y in range(top, bottom):
-        for x in range(left, right):
-            cond_mat[x, y] = cell_value
+    apply_stamp(cond_mat, left, top, np.ones([max(right - left, 0), max(bottom - top, 0)], dtype=bool), cell_value)
 
 
 def trace_oval(cond_mat, x_center, y_center, width, height, res, cell_value):